@@ -1,12 +1,16 @@
 from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Callable, Dict, List, Optional
+import json
 import logging
+import threading
 
 from app.models.database import SessionLocal
 from app.repositories.model_repository import ModelRepository
 from app.repositories.sample_repository import SampleRepository
-from app.service.model_service import ModelService
+from app.repositories.training_job_repository import TrainingJobRepository
+from app.service.shadow_traffic import shadow_traffic
+from app.service.training_jobs import training_job_runner, job_to_dict
 from app.schemas.model_schemas import (
     TrainRequest,
     ModelVersionResponse,
@@ -26,6 +30,7 @@ def get_db():
 
 def train_model_background(db: Session, train_request: TrainRequest, created_by: str):
     """Background task to train model"""
+    from app.service.model_service import ModelService
     try:
         service = ModelService(db=db, created_by=created_by)
         result = service.train_model(train_request)
@@ -36,22 +41,95 @@ def train_model_background(db: Session, train_request: TrainRequest, created_by:
         db.close()
 
 
+def create_model_service():
+    # model_service kéo theo torch/transformers: chỉ import khi request đầu tiên cần tới
+    from app.service.model_service import ModelService
+    return ModelService(ModelRepository(SessionLocal()), SampleRepository(SessionLocal()))
+
+
 class ModelController:
-    def __init__(self, model_service: ModelService):
-        self.model_service = model_service
+    def __init__(self, model_service_factory: Callable[[], "ModelService"], job_repository: TrainingJobRepository):
+        self._model_service_factory = model_service_factory
+        self._model_service = None
+        self._lock = threading.Lock()
+        self.job_repository = job_repository
+
+    @property
+    def model_service(self) -> "ModelService":
+        if self._model_service is None:
+            with self._lock:
+                if self._model_service is None:
+                    self._model_service = self._model_service_factory()
+        return self._model_service
 
     def get_all_models(self) -> List[ModelVersionResponse]:
         return self.model_service.get_models()
 
-    def train_model(self, request: TrainRequest) -> ModelVersionResponse:
-        res = self.model_service.train_model(request)
-        return res
+    def train_model(self, request: TrainRequest) -> Dict:
+        """Đưa yêu cầu train vào hàng đợi, trả về job ngay; kết quả lấy qua /model/status."""
+        model_id = request.id if request.is_retrain else request.base_model_id
+        job = self.job_repository.create(json.dumps(request.dict(), ensure_ascii=False), model_id=model_id or None)
+        training_job_runner.notify()
+        return job_to_dict(job)
+
+    def get_status(self, job_or_model_id: str) -> Dict:
+        """Trạng thái theo job id; với model id thì trả job train gần nhất của model đó."""
+        job = self.job_repository.get(job_or_model_id) or self.job_repository.get_latest_by_model(job_or_model_id)
+        if job:
+            return job_to_dict(job)
+        model = self.model_service.repository.get_by_id(job_or_model_id)
+        if not model:
+            raise ValueError(f"No training job or model with ID {job_or_model_id}.")
+        return {"model_id": model.id, "status": model.status, "progress": 1.0, "message": None}
+
+    def list_jobs(self, limit: int = 50) -> List[Dict]:
+        return [job_to_dict(job) for job in self.job_repository.list(limit)]
+
+    def retry_job(self, job_id: str) -> Dict:
+        """Chạy lại job failed; train resume từ checkpoint mới nhất của job nếu có."""
+        if not self.job_repository.requeue_failed(job_id):
+            job = self.job_repository.get(job_id)
+            if job is None:
+                raise ValueError(f"Training job {job_id} not found.")
+            raise ValueError(f"Training job {job_id} is {job.status}, only failed jobs can be retried.")
+        training_job_runner.notify()
+        return job_to_dict(self.job_repository.get(job_id))
 
     def activate_model(self, model_id: str) -> bool:
         return self.model_service.activate_model(model_id)
 
     def save_model(self, model_data: dict) -> bool:
         return self.model_service.save_model(model_data)
+
+    def quantize_model(self, model_id: str) -> Dict:
+        return self.model_service.quantize_model(model_id)
+
+    def export_onnx(self, model_id: str) -> Dict:
+        return self.model_service.export_onnx(model_id)
+
+    def set_backend(self, model_id: str, backend: str) -> bool:
+        return self.model_service.set_backend(model_id, backend)
+
+    def start_shadow(self, model_id: str, fraction: float) -> Dict:
+        return self.model_service.start_shadow(model_id, fraction)
+
+    def stop_shadow(self) -> Dict:
+        shadow_traffic.disable()
+        return shadow_traffic.stats()
+
+    def shadow_report(self) -> Dict:
+        return shadow_traffic.stats()
+
+    def storage_report(self) -> Dict:
+        return self.model_service.storage_report()
+
+    def apply_retention(self, dry_run: bool, keep_recent: Optional[int], mode: Optional[str]) -> Dict:
+        kwargs = {"dry_run": dry_run}
+        if keep_recent is not None:
+            kwargs["keep_recent"] = keep_recent
+        if mode is not None:
+            kwargs["mode"] = mode
+        return self.model_service.apply_retention(**kwargs)
     
-model_controller = ModelController(ModelService(ModelRepository(SessionLocal()), SampleRepository(SessionLocal())))
+model_controller = ModelController(create_model_service, TrainingJobRepository(SessionLocal()))
 
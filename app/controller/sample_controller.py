@@ -59,13 +59,22 @@ def list_samples(
     db: Session = Depends(get_db), 
     _=Depends(require_login),
     limit: int = Query(10, ge=1, le=100),
-    page: int = Query(1, ge=1),
+    cursor: Optional[str] = Query(None, description="`next_cursor` của trang trước"),
+    page: int = Query(1, ge=1, description="Phân trang OFFSET cũ, chỉ dùng khi không có cursor"),
 ):
-    list = sample_repository.list(db, dataset_id=dataset_id, limit=limit, skip=(page - 1) * limit)
+    next_cursor = None
+    if cursor or page == 1:
+        try:
+            list, next_cursor = sample_repository.list_page(db, dataset_id=dataset_id, cursor=cursor, limit=limit)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        list = sample_repository.list(db, dataset_id=dataset_id, limit=limit, skip=(page - 1) * limit)
     total = sample_repository.count(db, dataset_id=dataset_id)
     return {
         "samples": list,
-        "total": total
+        "total": total,
+        "next_cursor": next_cursor,
     }
 
 @router.post("", response_model=SampleOut, status_code=201)
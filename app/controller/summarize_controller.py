@@ -1,30 +1,269 @@
-from fastapi import APIRouter
+import asyncio
+import codecs
+import json
+import tempfile
+import threading
+import time
+from fastapi import APIRouter, Request, UploadFile
 from pydantic import BaseModel
-from typing import Dict
+from starlette.concurrency import iterate_in_threadpool
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional, Tuple
 
 from app.models import SessionLocal
 from app.repositories.model_repository import ModelRepository
-from app.service.summarize_service import SummarizeService
+from app.service.inference_executor import (
+    inference_executor,
+    InferenceRejectedError,
+    PRIORITY_INTERACTIVE,
+)
+from app.service.decoding_profiles import get_profile
+from constant.constants import BULK_WINDOW_SIZE, INFERENCE_DEFAULT_DEADLINE_MS
 
 # Request/Response models
 class SummarizeRequest(BaseModel):
     text: str
+    deadline_ms: Optional[int] = None
+    long_document: bool = False
+    # fast, balanced, quality; không truyền thì dùng profile mặc định của deployment
+    profile: Optional[str] = None
+    latency_budget_ms: Optional[int] = None
+    # Chọn version để serve (id và/hoặc version); version trùng giữa nhiều model thì phải truyền model_id,
+    # không truyền gì thì dùng model active
+    model_id: Optional[str] = None
+    version: Optional[str] = None
 
 class SummarizeResponse(BaseModel):
     title: str
     summary: str
     model_version: str
+    long_document: Optional[Dict[str, Any]] = None
+    decoding: Optional[Dict[str, Any]] = None
+
+async def spool_request_body(req: Request) -> UploadFile:
+    """
+    Ghi body ra SpooledTemporaryFile (tràn xuống đĩa khi lớn) trước khi trả response.
+
+    Không đọc `req.stream()` bên trong StreamingResponse được vì Starlette đồng thời
+    lắng nghe disconnect trên cùng kênh receive.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    async for chunk in req.stream():
+        spool.write(chunk)
+    spool.seek(0)
+    return UploadFile(file=spool)
+
+
+async def iter_upload_chunks(file: UploadFile, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    try:
+        while True:
+            chunk = await file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        await file.close()
+
+
+class InvalidLine:
+    """Dòng NDJSON không parse được; item tương ứng nhận lỗi riêng, các dòng sau vẫn được xử lý."""
+
+    def __init__(self, error: str):
+        self.error = error
+
+
+def _parse_line(line: str) -> Any:
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError as e:
+        return InvalidLine(str(e))
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """Parse NDJSON/JSONL theo từng dòng mà không đọc toàn bộ body vào bộ nhớ."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            if line.strip():
+                yield _parse_line(line)
+    buffer += decoder.decode(b"", final=True)
+    if buffer.strip():
+        yield _parse_line(buffer)
+
+
+async def iter_json_array(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """Parse tăng dần một JSON array, yield từng phần tử ngay khi đọc đủ."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    json_decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    started = False
+    chunks = chunks.__aiter__()
+    exhausted = False
+
+    while True:
+        # Bỏ qua khoảng trắng và dấu phân cách
+        while pos < len(buffer) and (buffer[pos].isspace() or (started and buffer[pos] == ",")):
+            pos += 1
+        if pos < len(buffer):
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("Request body must be a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                value, end = json_decoder.raw_decode(buffer, pos)
+                # Số ở cuối buffer có thể chưa đọc hết, chờ thêm dữ liệu
+                if end < len(buffer) or exhausted:
+                    yield value
+                    buffer, pos = buffer[end:], 0
+                    continue
+            except json.JSONDecodeError:
+                if exhausted:
+                    raise
+        elif exhausted:
+            raise ValueError("Unexpected end of JSON array")
+
+        try:
+            buffer += decoder.decode(await chunks.__anext__())
+        except StopAsyncIteration:
+            buffer += decoder.decode(b"", final=True)
+            exhausted = True
+
+
+def create_summarize_service():
+    # summarize_service kéo theo transformers và model registry: chỉ import khi cần tới
+    from app.service.summarize_service import SummarizeService
+    return SummarizeService(ModelRepository(SessionLocal()))
+
 
 class SummarizeController:
-    def __init__(self, summarize_service: SummarizeService):
-        self.summarize_service = summarize_service
+    def __init__(self, summarize_service_factory: Callable[[], "SummarizeService"]):
+        self._summarize_service_factory = summarize_service_factory
+        self._summarize_service = None
+        self._lock = threading.Lock()
+
+    @property
+    def summarize_service(self) -> "SummarizeService":
+        if self._summarize_service is None:
+            with self._lock:
+                if self._summarize_service is None:
+                    self._summarize_service = self._summarize_service_factory()
+        return self._summarize_service
 
-    def summarize_text(self, text: str) -> Dict[str, str]:
-        result = self.summarize_service.summarize(text)
+    async def summarize_text(self, text: str, deadline_ms: Optional[int] = None,
+                             long_document: bool = False, profile: Optional[str] = None,
+                             latency_budget_ms: Optional[int] = None, model_id: Optional[str] = None,
+                             version: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Các lần generate chạy trên inference executor (qua batch scheduler); request chỉ chờ
+        kết quả trong threadpool nên không giữ slot của executor trong lúc chờ batch.
+        Hết deadline thì `cancel_event` bỏ phần chưa chạy và dừng generate của batch
+        không còn request nào chờ, trả lại slot cho lane.
+        """
+        # Profile sai thì báo lỗi trước khi chiếm chỗ trong hàng đợi
+        get_profile(profile)
+        timeout = (deadline_ms or INFERENCE_DEFAULT_DEADLINE_MS) / 1000
+        deadline = time.monotonic() + timeout
+        # Fail fast với 429/503 + Retry-After khi lane interactive đầy hoặc không kịp deadline
+        inference_executor.check_admission(PRIORITY_INTERACTIVE, deadline)
+        cancel_event = threading.Event()
+        future = asyncio.to_thread(
+            lambda: self.summarize_service.summarize(
+                text,
+                long_document=long_document,
+                profile=profile,
+                latency_budget_ms=latency_budget_ms,
+                model_id=model_id,
+                version=version,
+                priority=PRIORITY_INTERACTIVE,
+                deadline=deadline,
+                cancel_event=cancel_event,
+            )
+        )
+        try:
+            result = await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            raise InferenceRejectedError(503, "Deadline exceeded", inference_executor.estimated_wait())
+        finally:
+            # Hết deadline hoặc client ngắt kết nối: không còn ai chờ kết quả
+            cancel_event.set()
         return {
             "title": result["title"],
             "summary": result["summary"],
-            "model_version": result["model_version"]
+            "model_version": result["model_version"],
+            "long_document": result.get("long_document"),
+            "decoding": result.get("decoding"),
         }
 
-summarize_controller = SummarizeController(SummarizeService(ModelRepository(SessionLocal())))
+    def stream_summary(self, text: str, cancel_event: threading.Event, profile: Optional[str] = None,
+                       latency_budget_ms: Optional[int] = None, model_id: Optional[str] = None,
+                       version: Optional[str] = None) -> Iterator[Tuple[str, Dict]]:
+        return self.summarize_service.stream_summary(
+            text, cancel_event, profile=profile, latency_budget_ms=latency_budget_ms,
+            model_id=model_id, version=version,
+        )
+
+    async def stream_bulk(self, items: AsyncIterator[Any], profile: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Đọc input theo cửa sổ BULK_WINDOW_SIZE item, tóm tắt trong threadpool và
+        trả về NDJSON theo từng batch, mỗi dòng gắn `index`/`id` của item đầu vào.
+        """
+        window = []
+        index = 0
+        input_error = None
+        items = items.__aiter__()
+        while True:
+            # Chỉ bắt lỗi khi đọc input; lỗi trong lúc tóm tắt một cửa sổ được đẩy lên
+            try:
+                item = self._to_bulk_item(index, await items.__anext__())
+            except StopAsyncIteration:
+                break
+            except ValueError as e:
+                # JSON array hỏng cấu trúc (NDJSON lỗi từng dòng đã thành item lỗi): xử lý
+                # nốt phần đã đọc rồi báo lỗi, phần sau không tách được thành item
+                input_error = {"index": index, "id": None, "error": f"Invalid input: {str(e)}"}
+                break
+            index += 1
+            if "error" in item:
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+                continue
+            window.append(item)
+            if len(window) >= BULK_WINDOW_SIZE:
+                async for line in self._summarize_window(window, profile):
+                    yield line
+                window = []
+
+        async for line in self._summarize_window(window, profile):
+            yield line
+        if input_error is not None:
+            yield json.dumps(input_error, ensure_ascii=False) + "\n"
+
+    async def _summarize_window(self, window, profile: Optional[str] = None):
+        if not window:
+            return
+        results_iter = self.summarize_service.summarize_items(window, profile=profile)
+        async for results in iterate_in_threadpool(results_iter):
+            for result in results:
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    @staticmethod
+    def _to_bulk_item(index: int, raw: Any) -> Dict:
+        if isinstance(raw, InvalidLine):
+            return {"index": index, "id": None, "error": f"Invalid JSON: {raw.error}"}
+        if isinstance(raw, str):
+            return {"index": index, "id": None, "text": raw}
+        if isinstance(raw, dict) and isinstance(raw.get("text"), str) and raw["text"].strip():
+            return {"index": index, "id": raw.get("id"), "text": raw["text"]}
+        item_id = raw.get("id") if isinstance(raw, dict) else None
+        return {"index": index, "id": item_id, "error": "Item must be a string or an object with a non-empty 'text'"}
+
+    def get_stats(self) -> Dict:
+        return self.summarize_service.stats()
+
+summarize_controller = SummarizeController(create_summarize_service)
@@ -1,6 +1,6 @@
 """Database models and configuration"""
 
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, Text, Date, ForeignKey, Boolean
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, Text, Date, ForeignKey, Boolean, Index, BigInteger
 from sqlalchemy.orm import sessionmaker, relationship, declarative_base
 from datetime import datetime, timezone
 from ..config.settings import settings
@@ -46,9 +46,13 @@ class Model(Base):
     recall = Column(Float, nullable=True)
     f1_score = Column(Float, nullable=True)
     model_path = Column(String(500), nullable=False)
-    status = Column(String(50), nullable=False, default="training")  # training, completed, failed, active
+    status = Column(String(50), nullable=False, default="training")  # training, completed, failed, active, archived, evicted
     is_active = Column(Boolean, default=False)
     training_duration = Column(Integer, nullable=True)  # seconds
+    eval_seconds = Column(Float, nullable=True)  # thời gian đánh giá trên tập eval
+    eval_examples_per_sec = Column(Float, nullable=True)
+    backend = Column(String(50), nullable=False, default="torch")  # torch, torch_int8, onnx
+    quantization_report = Column(Text, nullable=True)  # JSON: ROUGE delta và latency fp32 vs int8
     base_model_id = Column(String(255), ForeignKey("model.id"), nullable=True)
     created_by = Column(String(255), ForeignKey("admin.id"), nullable=False)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
@@ -71,6 +75,9 @@ class Sample(Base):
     source = Column(String(255), nullable=True)
     dataset_id = Column(String(255), ForeignKey("dataset.id"), nullable=False)
 
+    # Keyset pagination theo id trong từng dataset
+    __table_args__ = (Index("ix_sample_dataset_id_id", "dataset_id", "id"),)
+
     dataset = relationship("Dataset", back_populates="samples")
     # relationship to models through association table ModelSample
     model_associations = relationship("ModelSample", back_populates="sample", cascade="all, delete-orphan")
@@ -88,5 +95,39 @@ class ModelSample(Base):
     sample = relationship("Sample", back_populates="model_associations")
     model = relationship("Model", back_populates="sample_associations")
 
+# Bảng thống kê sample theo dataset, cập nhật tăng dần khi sample được tạo/sửa/xoá
+class DatasetStats(Base):
+    __tablename__ = "dataset_stats"
+    dataset_id = Column(String(255), ForeignKey("dataset.id"), primary_key=True)
+    sample_count = Column(Integer, nullable=False, default=0)
+    # Độ dài tính theo số ký tự
+    input_length_sum = Column(BigInteger, nullable=False, default=0)
+    input_length_min = Column(Integer, nullable=True)
+    input_length_max = Column(Integer, nullable=True)
+    target_length_sum = Column(BigInteger, nullable=False, default=0)
+    target_length_min = Column(Integer, nullable=True)
+    target_length_max = Column(Integer, nullable=True)
+    input_token_histogram = Column(Text, nullable=True)  # JSON: khoảng số token -> số sample
+    target_token_histogram = Column(Text, nullable=True)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+# Bảng job train chạy nền
+class TrainingJob(Base):
+    __tablename__ = "training_job"
+    id = Column(String(255), primary_key=True)
+    status = Column(String(50), nullable=False, default="queued")  # queued, running, completed, failed
+    model_id = Column(String(255), nullable=True)  # model được retrain hoặc model gốc để train tiếp
+    request = Column(Text, nullable=False)  # JSON TrainRequest
+    progress = Column(Float, nullable=False, default=0.0)
+    message = Column(Text, nullable=True)
+    result = Column(Text, nullable=True)  # JSON kết quả train, dùng cho /model/save
+    worker_pid = Column(Integer, nullable=True)
+    # Lease của job đang chạy: máy giữ job và lần cuối process train báo còn sống
+    worker_host = Column(String(255), nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
 # Tạo bảng nếu chưa tồn tại
 Base.metadata.create_all(bind=engine)
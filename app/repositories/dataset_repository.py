@@ -2,6 +2,8 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import func, text
 from ..models import database as models
+from .dataset_stats_repository import create_empty_stats, delete_stats, histogram_from_json, rebuild_dataset_stats
+from .sample_repository import sample_count_cache
 import uuid
 from datetime import datetime
 
@@ -9,8 +11,10 @@ from datetime import datetime
 def get_datasets_with_stats(db: Session):
     """
     Retrieves all datasets with aggregated statistics about their samples.
+
+    Thống kê đọc từ bảng dataset_stats (cập nhật tăng dần khi sample thay đổi), không
+    quét bảng sample; dataset chưa có dòng thống kê được tính một lần rồi lưu lại.
     """
-    # Using a raw SQL query for complex aggregation
     query = text("""
         SELECT
             d.id,
@@ -19,29 +23,31 @@ def get_datasets_with_stats(db: Session):
             d.description,
             d.created_by,
             d.created_at,
-            COUNT(s.id) AS sample_count,
-            MIN(CHAR_LENGTH(s.input_text)) AS min_input_length,
-            MAX(CHAR_LENGTH(s.input_text)) AS max_input_length,
-            ROUND(AVG(CHAR_LENGTH(s.input_text))::numeric, 2) AS avg_input_length,
-            MIN(CHAR_LENGTH(s.target_summary)) AS min_target_length,
-            MAX(CHAR_LENGTH(s.target_summary)) AS max_target_length,
-            ROUND(AVG(CHAR_LENGTH(s.target_summary))::numeric, 2) AS avg_target_length
+            st.dataset_id,
+            st.sample_count,
+            st.input_length_min,
+            st.input_length_max,
+            st.input_length_sum,
+            st.target_length_min,
+            st.target_length_max,
+            st.target_length_sum,
+            st.input_token_histogram,
+            st.target_token_histogram
         FROM dataset d
-        LEFT JOIN sample s ON d.id = s.dataset_id
-        GROUP BY
-            d.id,
-            d.name,
-            d.status,
-            d.description,
-            d.created_by,
-            d.created_at
+        LEFT JOIN dataset_stats st ON d.id = st.dataset_id
         ORDER BY d.created_at DESC;
     """)
     result = db.execute(query).fetchall()
-    
+    missing = [row[0] for row in result if row[6] is None]
+    if missing:
+        rebuild_dataset_stats(db, missing)
+        db.commit()
+        result = db.execute(query).fetchall()
+
     # Convert the raw result to a list of dictionaries
     datasets = []
     for row in result:
+        sample_count = row[7] or 0
         datasets.append({
             "id": row[0],
             "name": row[1],
@@ -49,13 +55,15 @@ def get_datasets_with_stats(db: Session):
             "description": row[3],
             "created_by": row[4],
             "created_at": row[5],
-            "sample_count": row[6],
-            "min_input_length": row[7],
-            "max_input_length": row[8],
-            "avg_input_length": round(row[9] if row[9] else 0, 2),
-            "min_target_length": row[10],
-            "max_target_length": row[11],
-            "avg_target_length": round(row[12] if row[12] else 0, 2),
+            "sample_count": sample_count,
+            "min_input_length": row[8],
+            "max_input_length": row[9],
+            "avg_input_length": round(row[10] / sample_count, 2) if sample_count else 0,
+            "min_target_length": row[11],
+            "max_target_length": row[12],
+            "avg_target_length": round(row[13] / sample_count, 2) if sample_count else 0,
+            "input_token_histogram": histogram_from_json(row[14]),
+            "target_token_histogram": histogram_from_json(row[15]),
         })
     return datasets
 
@@ -71,6 +79,8 @@ def create_dataset(db: Session, dataset_data: dict, admin_id: str):
         created_at=datetime.utcnow()
     )
     db.add(new_dataset)
+    db.flush()
+    create_empty_stats(db, new_dataset.id)
     db.commit()
     db.refresh(new_dataset)
     return new_dataset
@@ -95,8 +105,10 @@ def delete_dataset(db: Session, dataset_id: str):
     """
     dataset = db.query(models.Dataset).filter(models.Dataset.id == dataset_id).first()
     if dataset:
+        delete_stats(db, dataset_id)
         db.delete(dataset)
         db.commit()
+        sample_count_cache.invalidate(dataset_id)
         return True
     return False
 
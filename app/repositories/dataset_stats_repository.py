@@ -0,0 +1,179 @@
+"""Thống kê sample theo dataset (số lượng, độ dài, histogram số token) ở bảng dataset_stats, cập nhật tăng dần"""
+import json
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.database import Dataset, DatasetStats, Sample
+from constant.constants import DATASET_STATS_TOKEN_BUCKETS
+
+_FIELDS = (("input", Sample.input_text), ("target", Sample.target_summary))
+
+
+def token_count(text: str) -> int:
+    """Số token xấp xỉ bằng số từ tách theo khoảng trắng, không cần nạp tokenizer ở đường ghi sample."""
+    return len(text.split())
+
+
+def token_bucket(n_tokens: int) -> str:
+    lower = 0
+    for edge in DATASET_STATS_TOKEN_BUCKETS:
+        if n_tokens < edge:
+            return f"{lower}-{edge - 1}"
+        lower = edge
+    return f"{lower}+"
+
+
+class _FieldDelta:
+    """Thay đổi thống kê của một cột text (input hoặc target) trong một dataset."""
+
+    def __init__(self):
+        self.length_sum = 0
+        self.added_min: Optional[int] = None
+        self.added_max: Optional[int] = None
+        self.removed_lengths: List[int] = []
+        self.histogram: Counter = Counter()
+
+    def add(self, text: str, sign: int):
+        length = len(text)
+        self.length_sum += sign * length
+        self.histogram[token_bucket(token_count(text))] += sign
+        if sign > 0:
+            self.added_min = length if self.added_min is None else min(self.added_min, length)
+            self.added_max = length if self.added_max is None else max(self.added_max, length)
+        else:
+            self.removed_lengths.append(length)
+
+
+class DatasetStatsChanges:
+    """
+    Gom thay đổi sample trong một transaction theo dataset rồi ghi vào dataset_stats
+    (`apply`) trước khi commit, để sample và thống kê được commit cùng nhau.
+    """
+
+    def __init__(self):
+        self._counts: Dict[str, int] = defaultdict(int)
+        self._fields: Dict[str, Dict[str, _FieldDelta]] = defaultdict(
+            lambda: {name: _FieldDelta() for name, _ in _FIELDS}
+        )
+
+    def add(self, dataset_id: str, input_text: str, target_summary: str, sign: int = 1):
+        self._counts[dataset_id] += sign
+        fields = self._fields[dataset_id]
+        fields["input"].add(input_text, sign)
+        fields["target"].add(target_summary, sign)
+
+    def remove(self, dataset_id: str, input_text: str, target_summary: str):
+        self.add(dataset_id, input_text, target_summary, sign=-1)
+
+    def write_totals(self, stats: DatasetStats):
+        """Ghi đè `stats` bằng tổng đã gom (dùng khi tính lại từ đầu)."""
+        stats.sample_count = self._counts.get(stats.dataset_id, 0)
+        fields = self._fields[stats.dataset_id]
+        for name, _ in _FIELDS:
+            delta = fields[name]
+            setattr(stats, f"{name}_length_sum", delta.length_sum)
+            setattr(stats, f"{name}_length_min", delta.added_min)
+            setattr(stats, f"{name}_length_max", delta.added_max)
+            setattr(stats, f"{name}_token_histogram", _dump_histogram(delta.histogram))
+        stats.updated_at = datetime.now(timezone.utc)
+
+    def apply(self, db: Session):
+        for dataset_id, count in self._counts.items():
+            stats = db.query(DatasetStats).filter(DatasetStats.dataset_id == dataset_id).with_for_update().first()
+            if stats is None:
+                # Dataset chưa có thống kê (có từ trước khi có bảng): tính lại từ đầu, đã gồm thay đổi này
+                db.flush()
+                rebuild_dataset_stats(db, [dataset_id])
+                continue
+            stats.sample_count += count
+            stale_bounds = False
+            for name, _ in _FIELDS:
+                stale_bounds |= _apply_field(stats, name, self._fields[dataset_id][name])
+            if stale_bounds:
+                # Sample bị xoá/sửa đang là min hoặc max: tính lại min/max của riêng dataset này
+                db.flush()
+                _recompute_bounds(db, stats)
+            stats.updated_at = datetime.now(timezone.utc)
+
+
+def _apply_field(stats: DatasetStats, name: str, delta: _FieldDelta) -> bool:
+    """Cộng delta vào các cột `<name>_*`; trả về True nếu min/max không còn chắc đúng."""
+    setattr(stats, f"{name}_length_sum", getattr(stats, f"{name}_length_sum") + delta.length_sum)
+
+    current_min = getattr(stats, f"{name}_length_min")
+    current_max = getattr(stats, f"{name}_length_max")
+    stale = any(
+        (current_min is not None and length <= current_min) or (current_max is not None and length >= current_max)
+        for length in delta.removed_lengths
+    )
+    if delta.added_min is not None:
+        setattr(stats, f"{name}_length_min", delta.added_min if current_min is None else min(current_min, delta.added_min))
+        setattr(stats, f"{name}_length_max", delta.added_max if current_max is None else max(current_max, delta.added_max))
+
+    histogram = Counter(json.loads(getattr(stats, f"{name}_token_histogram") or "{}"))
+    histogram.update(delta.histogram)
+    setattr(stats, f"{name}_token_histogram", _dump_histogram(histogram))
+    return stale
+
+
+def _dump_histogram(histogram: Counter) -> str:
+    return json.dumps({bucket: count for bucket, count in histogram.items() if count > 0}, sort_keys=True)
+
+
+def _recompute_bounds(db: Session, stats: DatasetStats):
+    columns = []
+    for _, column in _FIELDS:
+        columns += [func.min(func.length(column)), func.max(func.length(column))]
+    row = db.query(*columns).filter(Sample.dataset_id == stats.dataset_id).one()
+    stats.input_length_min, stats.input_length_max, stats.target_length_min, stats.target_length_max = row
+
+
+def create_empty_stats(db: Session, dataset_id: str):
+    db.add(DatasetStats(dataset_id=dataset_id, sample_count=0, input_length_sum=0, target_length_sum=0,
+                        input_token_histogram="{}", target_token_histogram="{}"))
+
+
+def delete_stats(db: Session, dataset_id: str):
+    db.query(DatasetStats).filter(DatasetStats.dataset_id == dataset_id).delete()
+
+
+def rebuild_dataset_stats(db: Session, dataset_ids: Optional[Iterable[str]] = None, batch_size: int = 1000) -> int:
+    """
+    Tính lại thống kê từ bảng sample (toàn bộ dataset, hoặc chỉ `dataset_ids`) để sửa
+    sai lệch, ví dụ khi sample được ghi ngoài repository. Không commit; trả về số dataset.
+    """
+    query = db.query(Dataset.id)
+    if dataset_ids is not None:
+        query = query.filter(Dataset.id.in_(list(dataset_ids)))
+    targets = [row[0] for row in query.all()]
+    if not targets:
+        return 0
+
+    changes = DatasetStatsChanges()
+    rows = (
+        db.query(Sample.dataset_id, Sample.input_text, Sample.target_summary)
+        .filter(Sample.dataset_id.in_(targets))
+        .execution_options(stream_results=True)
+        .yield_per(batch_size)
+    )
+    for dataset_id, input_text, target_summary in rows:
+        changes.add(dataset_id, input_text, target_summary)
+
+    for dataset_id in targets:
+        stats = db.get(DatasetStats, dataset_id)
+        if stats is None:
+            stats = DatasetStats(dataset_id=dataset_id)
+            db.add(stats)
+        changes.write_totals(stats)
+    db.flush()
+    return len(targets)
+
+
+def histogram_from_json(value: Optional[str]) -> Dict[str, int]:
+    """Histogram theo thứ tự khoảng tăng dần."""
+    histogram = json.loads(value or "{}")
+    return dict(sorted(histogram.items(), key=lambda item: int(item[0].split("-")[0].rstrip("+"))))
@@ -1,4 +1,5 @@
-from typing import List, Optional, Type, cast
+from typing import Callable, List, Optional, Type, cast
+import logging
 from sqlalchemy.orm import Session
 from sqlalchemy import desc, text
 import uuid
@@ -6,13 +7,27 @@ from app.models.database import Model, ModelSample, Sample
 from datetime import date, datetime
 from sqlalchemy import text, insert, delete
 
+logger = logging.getLogger(__name__)
+
+MODEL_COMPLETED = "completed"
+# Retention của kho artifact: thư mục version đã được nén vào archive/ hoặc đã bị xoá
+MODEL_ARCHIVED = "archived"
+MODEL_EVICTED = "evicted"
+
 class ModelRepository:
+    # Callback được gọi sau khi model active thay đổi (ví dụ để xoá cache kết quả)
+    _active_listeners: List[Callable[[Model], None]] = []
+
     def __init__(self, db: Session):
         self.db = db
 
+    @classmethod
+    def add_active_listener(cls, listener: Callable[[Model], None]):
+        cls._active_listeners.append(listener)
+
     def get_all(self):
         query = text("""
-                select m1.id, m1.name, m1.version, m1.status, m1.is_active, m1.created_at, m1.accuracy, m1.precision, m1.recall, m1.f1_score, m2.name
+                select m1.id, m1.name, m1.version, m1.status, m1.is_active, m1.created_at, m1.accuracy, m1.precision, m1.recall, m1.f1_score, m2.name, m1.backend
                 from model m1
                 left join model m2 on m1.base_model_id = m2.id
         """)
@@ -35,6 +50,7 @@ class ModelRepository:
                 "recall": row[8],
                 "f1_score": row[9],
                 "base_model_name": base_model_name,
+                "backend": row[11],
             })
 
         return models
@@ -48,11 +64,28 @@ class ModelRepository:
         model.is_active = True
         self.db.commit()
         self.db.refresh(model)
+
+        for listener in self._active_listeners:
+            try:
+                listener(model)
+            except Exception as e:
+                logger.error(f"Active model listener failed: {str(e)}")
         return model
 
+    def list_versions(self) -> List[Model]:
+        return self.db.query(Model).order_by(desc(Model.created_at)).all()
+
     def get_by_id(self, id: int) -> Optional[Type[Model]]:
         return self.db.query(Model).filter(Model.id == id).first()
 
+    def list_by_version(self, version: str) -> List[Model]:
+        return self.db.query(Model).filter(Model.version == version).all()
+
+    def save(self, model: Model) -> Model:
+        self.db.commit()
+        self.db.refresh(model)
+        return model
+
     def insert(self, model: Model, sample_ids: List[str], is_select_all: bool) -> Model:        
         model.id = f"{str(uuid.uuid4())[:8]}"
         self.db.add(model)
@@ -1,10 +1,66 @@
-from typing import List, Optional, Dict, Any, Type, cast
+from typing import Iterator, List, Optional, Dict, Any, Tuple, Type, cast
+from sqlalchemy import Row
 from sqlalchemy.orm import Session
 from datetime import date
+import base64
+import binascii
+import json
+import threading
+import time
 import uuid
 
 from app.models import SessionLocal
-from app.models.database import Sample, Dataset
+from app.models.database import Sample, Dataset, ModelSample
+from app.repositories.dataset_stats_repository import DatasetStatsChanges
+from constant.constants import SAMPLE_COUNT_CACHE_TTL_SECONDS
+
+
+def encode_cursor(sample_id: str) -> str:
+    """Cursor của trang kế tiếp: khoá sắp xếp (id) của sample cuối trang, client coi như chuỗi opaque."""
+    payload = json.dumps({"id": sample_id}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> str:
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        return str(json.loads(payload)["id"])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+class SampleCountCache:
+    """
+    Cache số sample theo dataset (key None = toàn bộ bảng) để không phải `count(*)` ở mỗi trang.
+
+    Create/update/delete sample đi qua repository xoá key của dataset liên quan; TTL giới
+    hạn độ lệch khi sample được ghi từ process khác hoặc ngoài repository.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._counts: Dict[Optional[str], Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, dataset_id: Optional[str]) -> Optional[int]:
+        with self._lock:
+            entry = self._counts.get(dataset_id)
+        if entry is None or time.monotonic() - entry[1] > self.ttl_seconds:
+            return None
+        return entry[0]
+
+    def set(self, dataset_id: Optional[str], count: int):
+        with self._lock:
+            self._counts[dataset_id] = (count, time.monotonic())
+
+    def invalidate(self, *dataset_ids: Optional[str]):
+        with self._lock:
+            # Tổng toàn bảng đổi theo mọi dataset
+            for dataset_id in (None, *dataset_ids):
+                self._counts.pop(dataset_id, None)
+
+
+sample_count_cache = SampleCountCache(SAMPLE_COUNT_CACHE_TTL_SECONDS)
 
 
 class SampleRepository:
@@ -13,20 +69,49 @@ class SampleRepository:
 
     @staticmethod
     def list(db: Session, dataset_id: Optional[str] = None, skip: int = 0, limit: int = 10) -> List[Sample]:
+        """Phân trang bằng OFFSET (giữ cho client cũ); trang sâu nên dùng `list_page`."""
         query = db.query(Sample)
         if dataset_id:
             query = query.filter(Sample.dataset_id == dataset_id)
 
+        query = query.order_by(Sample.id)
         if limit:
             query = query.limit(limit)
         return query.offset(skip).all()
 
+    @staticmethod
+    def list_page(db: Session, dataset_id: Optional[str] = None, cursor: Optional[str] = None,
+                  limit: int = 10) -> Tuple[List[Sample], Optional[str]]:
+        """
+        Keyset pagination theo `Sample.id`: trang sau bắt đầu ngay sau id cuối của trang
+        trước nên dùng index (dataset_id, id), thời gian không phụ thuộc độ sâu của trang.
+        Trả về (samples, cursor của trang kế tiếp hoặc None nếu là trang cuối).
+        """
+        query = db.query(Sample)
+        if dataset_id:
+            query = query.filter(Sample.dataset_id == dataset_id)
+        if cursor:
+            query = query.filter(Sample.id > decode_cursor(cursor))
+
+        # Lấy dư một dòng để biết còn trang sau hay không
+        samples = query.order_by(Sample.id).limit(limit + 1).all()
+        if len(samples) <= limit:
+            return samples, None
+        samples = samples[:limit]
+        return samples, encode_cursor(samples[-1].id)
+
     @staticmethod
     def count(db: Session, dataset_id: Optional[str] = None) -> int:
+        dataset_id = dataset_id or None
+        cached = sample_count_cache.get(dataset_id)
+        if cached is not None:
+            return cached
         query = db.query(Sample)
         if dataset_id:
             query = query.filter(Sample.dataset_id == dataset_id)
-        return query.count()
+        count = query.count()
+        sample_count_cache.set(dataset_id, count)
+        return count
 
     @staticmethod
     def get_samples_by_dataset(
@@ -52,7 +137,11 @@ class SampleRepository:
         
         db_sample = Sample(**data)
         db.add(db_sample)
+        changes = DatasetStatsChanges()
+        changes.add(db_sample.dataset_id, db_sample.input_text, db_sample.target_summary)
+        changes.apply(db)
         db.commit()
+        sample_count_cache.invalidate(db_sample.dataset_id)
         db.refresh(db_sample)
         return db_sample
 
@@ -61,9 +150,20 @@ class SampleRepository:
         """Cập nhật một sample."""
         db_sample = SampleRepository.get(db, sample_id)
         if db_sample:
+            previous = (db_sample.dataset_id, db_sample.input_text, db_sample.target_summary)
+            previous_dataset_id = db_sample.dataset_id
             for key, value in data.items():
                 setattr(db_sample, key, value)
+            current = (db_sample.dataset_id, db_sample.input_text, db_sample.target_summary)
+            # Chỉ đổi title/category... thì thống kê không đổi
+            if current != previous:
+                changes = DatasetStatsChanges()
+                changes.remove(*previous)
+                changes.add(*current)
+                changes.apply(db)
             db.commit()
+            if db_sample.dataset_id != previous_dataset_id:
+                sample_count_cache.invalidate(previous_dataset_id, db_sample.dataset_id)
             db.refresh(db_sample)
         return db_sample
 
@@ -72,8 +172,13 @@ class SampleRepository:
         """Xóa một sample."""
         db_sample = SampleRepository.get(db, sample_id)
         if db_sample:
+            dataset_id = db_sample.dataset_id
+            changes = DatasetStatsChanges()
+            changes.remove(dataset_id, db_sample.input_text, db_sample.target_summary)
             db.delete(db_sample)
+            changes.apply(db)
             db.commit()
+            sample_count_cache.invalidate(dataset_id)
             return True
         return False
 
@@ -87,6 +192,33 @@ class SampleRepository:
 
     def get_if_not_in_ids(self, exclude_ids: List[str]) -> List[Sample]:
         query = self.db.query(Sample).filter(~Sample.id.in_(exclude_ids))
-        return cast(list[Sample], query.all())  
+        return cast(list[Sample], query.all())
+
+    def iter_training_rows(self, sample_ids: List[str], is_select_all: bool, batch_size: int = 1000) -> Iterator[Row]:
+        """
+        Stream các cột cần cho train (id, input_text, title, target_summary) bằng
+        server-side cursor, mỗi lần chỉ giữ `batch_size` dòng trong bộ nhớ.
+        """
+        query = self.db.query(Sample.id, Sample.input_text, Sample.title, Sample.target_summary)
+        if is_select_all:
+            query = query.filter(~Sample.id.in_(sample_ids))
+        else:
+            query = query.filter(Sample.id.in_(sample_ids))
+        # Thứ tự theo khoá chính để chia train/eval lặp lại được giữa các lần chạy
+        query = query.order_by(Sample.id)
+        yield from query.execution_options(stream_results=True).yield_per(batch_size)
+
+    def get_by_model(self, model_id: str, limit: Optional[int] = None) -> List[Sample]:
+        """Lấy các sample đã dùng để train một model version."""
+        query = (
+            self.db.query(Sample)
+            .join(ModelSample, ModelSample.sample_id == Sample.id)
+            .filter(ModelSample.model_id == model_id)
+            .order_by(Sample.id)
+        )
+        if limit:
+            query = query.limit(limit)
+        return cast(list[Sample], query.all())
+
 sample_repository = SampleRepository(SessionLocal)
 
@@ -0,0 +1,144 @@
+from typing import List, Optional
+from datetime import datetime, timezone
+import socket
+import uuid
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.models.database import TrainingJob
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+
+class TrainingJobRepository:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def create(self, request_json: str, model_id: Optional[str] = None) -> TrainingJob:
+        job = TrainingJob(
+            id=f"job_{str(uuid.uuid4())[:8]}",
+            status=JOB_QUEUED,
+            model_id=model_id,
+            request=request_json,
+            progress=0.0,
+            message="Queued",
+        )
+        self.db.add(job)
+        self.db.commit()
+        self.db.refresh(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[TrainingJob]:
+        job = self.db.query(TrainingJob).filter(TrainingJob.id == job_id).first()
+        if job:
+            # Job được process train cập nhật, luôn đọc lại từ DB
+            self.db.refresh(job)
+        return job
+
+    def get_latest_by_model(self, model_id: str) -> Optional[TrainingJob]:
+        return (
+            self.db.query(TrainingJob)
+            .filter(TrainingJob.model_id == model_id)
+            .order_by(TrainingJob.created_at.desc())
+            .populate_existing()
+            .first()
+        )
+
+    def list(self, limit: int = 50) -> List[TrainingJob]:
+        # populate_existing: trạng thái do process train ghi, không dùng bản cũ trong session
+        return self.db.query(TrainingJob).order_by(TrainingJob.created_at.desc()).limit(limit).populate_existing().all()
+
+    def next_queued(self) -> Optional[TrainingJob]:
+        return (
+            self.db.query(TrainingJob)
+            .filter(TrainingJob.status == JOB_QUEUED)
+            .order_by(TrainingJob.created_at)
+            .first()
+        )
+
+    def get_by_status(self, status: str) -> List[TrainingJob]:
+        return self.db.query(TrainingJob).filter(TrainingJob.status == status).all()
+
+    def claim(self, job_id: str, worker_host: Optional[str] = None) -> bool:
+        """
+        Chuyển queued -> running một cách nguyên tử và nhận lease của job;
+        False nếu process khác đã nhận job.
+        """
+        now = datetime.now(timezone.utc)
+        updated = (
+            self.db.query(TrainingJob)
+            .filter(TrainingJob.id == job_id, TrainingJob.status == JOB_QUEUED)
+            .update({
+                TrainingJob.status: JOB_RUNNING,
+                TrainingJob.started_at: now,
+                TrainingJob.worker_host: worker_host or socket.gethostname(),
+                TrainingJob.heartbeat_at: now,
+                TrainingJob.message: "Starting",
+            }, synchronize_session=False)
+        )
+        self.db.commit()
+        return updated == 1
+
+    def heartbeat(self, job_id: str) -> bool:
+        """Gia hạn lease của job đang chạy; False nếu job không còn running."""
+        updated = (
+            self.db.query(TrainingJob)
+            .filter(TrainingJob.id == job_id, TrainingJob.status == JOB_RUNNING)
+            .update({TrainingJob.heartbeat_at: datetime.now(timezone.utc)}, synchronize_session=False)
+        )
+        self.db.commit()
+        return updated == 1
+
+    def requeue_expired(self, expired_before: datetime) -> List[str]:
+        """
+        Đưa job running có heartbeat cuối trước `expired_before` về queued. Mỗi job được
+        cập nhật có điều kiện nên nhiều server cùng quét cũng chỉ một server requeue.
+        """
+        expired = or_(TrainingJob.heartbeat_at.is_(None), TrainingJob.heartbeat_at < expired_before)
+        requeued = []
+        job_ids = [row[0] for row in self.db.query(TrainingJob.id).filter(TrainingJob.status == JOB_RUNNING, expired).all()]
+        for job_id in job_ids:
+            updated = (
+                self.db.query(TrainingJob)
+                .filter(TrainingJob.id == job_id, TrainingJob.status == JOB_RUNNING, expired)
+                .update({
+                    TrainingJob.status: JOB_QUEUED,
+                    TrainingJob.progress: 0.0,
+                    TrainingJob.worker_pid: None,
+                    TrainingJob.worker_host: None,
+                    TrainingJob.heartbeat_at: None,
+                    TrainingJob.message: "Requeued after its worker stopped sending heartbeats",
+                }, synchronize_session=False)
+            )
+            self.db.commit()
+            if updated == 1:
+                requeued.append(job_id)
+        return requeued
+
+    def requeue_failed(self, job_id: str) -> bool:
+        """Đưa job failed về queued (giữ checkpoint để resume); False nếu job không ở trạng thái failed."""
+        updated = (
+            self.db.query(TrainingJob)
+            .filter(TrainingJob.id == job_id, TrainingJob.status == JOB_FAILED)
+            .update({
+                TrainingJob.status: JOB_QUEUED,
+                TrainingJob.worker_pid: None,
+                TrainingJob.worker_host: None,
+                TrainingJob.heartbeat_at: None,
+                TrainingJob.finished_at: None,
+                TrainingJob.message: "Requeued for retry",
+            }, synchronize_session=False)
+        )
+        self.db.commit()
+        return updated == 1
+
+    def update(self, job_id: str, **fields) -> None:
+        self.db.query(TrainingJob).filter(TrainingJob.id == job_id).update(
+            {getattr(TrainingJob, key): value for key, value in fields.items()},
+            synchronize_session=False,
+        )
+        self.db.commit()
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Request
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request
 
 from app.controller.model_controller import model_controller
-from app.schemas import TrainRequest
+from app.schemas import TrainRequest, SetBackendRequest, ShadowRequest
 
 router = APIRouter(prefix="/model", tags=["model"])
 
@@ -10,22 +12,102 @@ def get_all_models():
     models = model_controller.get_all_models()
     return {"models": models}
 
-@router.post("/train")
+@router.post("/train", status_code=202)
 def train_model(req: Request, body: TrainRequest):
+    """Tạo job train chạy nền, trả về `job_id` để theo dõi qua /model/status/{job_id}."""
     data = model_controller.train_model(body)
     return {"data": data}
 
 @router.get("/status/{model_id}")
 def get_model_status(model_id: str):
-    return {"message": f"Trạng thái của mô hình tóm tắt với ID {model_id}"}
+    """Nhận job id hoặc model id (trả job train gần nhất của model)."""
+    try:
+        data = model_controller.get_status(model_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"data": data}
+
+@router.get("/jobs")
+def list_training_jobs(limit: int = 50):
+    return {"data": model_controller.list_jobs(limit)}
+
+@router.post("/jobs/{job_id}/retry", status_code=202)
+def retry_training_job(job_id: str):
+    """Chạy lại job train bị lỗi, tiếp tục từ checkpoint mới nhất của job."""
+    try:
+        data = model_controller.retry_job(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"data": data}
 
 @router.post("/activate/{model_id}")
 def activate_model(model_id: str):
-    model_controller.activate_model(model_id)
+    try:
+        model_controller.activate_model(model_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return True
 
 @router.post("/save")
 def save_model(model_data: dict):
-    model_controller.save_model(model_data)
+    try:
+        model_controller.save_model(model_data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return True
 
+@router.post("/quantize/{model_id}")
+def quantize_model(model_id: str):
+    try:
+        report = model_controller.quantize_model(model_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"data": report}
+
+@router.post("/export-onnx/{model_id}")
+def export_onnx(model_id: str):
+    try:
+        result = model_controller.export_onnx(model_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"data": result}
+
+@router.post("/backend/{model_id}")
+def set_model_backend(model_id: str, body: SetBackendRequest):
+    try:
+        model_controller.set_backend(model_id, body.backend)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return True
+
+@router.get("/shadow")
+def get_shadow_report():
+    """So sánh latency p50/p99, độ dài output và độ khớp của version ứng viên với model active."""
+    return {"data": model_controller.shadow_report()}
+
+@router.put("/shadow")
+def start_shadow(body: ShadowRequest):
+    """Mirror một phần request /summarize sang version ứng viên, chạy nền sau response chính."""
+    try:
+        data = model_controller.start_shadow(body.model_id, body.fraction)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"data": data}
+
+@router.delete("/shadow")
+def stop_shadow():
+    return {"data": model_controller.stop_shadow()}
+
+@router.get("/storage")
+def get_model_storage():
+    """Dung lượng từng version trong kho artifact (dedup) và thời gian nạp gần nhất."""
+    return {"data": model_controller.storage_report()}
+
+@router.post("/storage/retention")
+def apply_model_retention(dry_run: bool = False, keep_recent: Optional[int] = None, mode: Optional[str] = None):
+    """Nén hoặc xoá version cũ không active, không làm gốc; `dry_run` chỉ trả về kế hoạch."""
+    try:
+        data = model_controller.apply_retention(dry_run, keep_recent, mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"data": data}
@@ -1,10 +1,102 @@
-from fastapi import APIRouter
+import json
+import threading
+from typing import Optional
 
-from app.controller.summarize_controller import SummarizeResponse, SummarizeRequest, summarize_controller
+from fastapi import APIRouter, File, HTTPException, Request, UploadFile
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
+
+from app.controller.summarize_controller import (
+    SummarizeResponse,
+    SummarizeRequest,
+    summarize_controller,
+    iter_json_array,
+    iter_ndjson,
+    iter_upload_chunks,
+    spool_request_body,
+)
+from app.service.decoding_profiles import get_profile
+from app.service.inference_executor import inference_executor, PRIORITY_INTERACTIVE, PRIORITY_BULK
 
 router = APIRouter(prefix="/summarize", tags=["summarize"])
 
 @router.post("", response_model=SummarizeResponse)
-def summarize(request: SummarizeRequest):
-    result = summarize_controller.summarize_text(request.text)
+async def summarize(request: SummarizeRequest):
+    try:
+        result = await summarize_controller.summarize_text(
+            request.text,
+            request.deadline_ms,
+            long_document=request.long_document,
+            profile=request.profile,
+            latency_budget_ms=request.latency_budget_ms,
+            model_id=request.model_id,
+            version=request.version,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return SummarizeResponse(**result)
+
+
+def _validate_profile(profile: Optional[str]):
+    try:
+        get_profile(profile)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/stream")
+async def summarize_stream(req: Request, body: SummarizeRequest):
+    """Server-sent events: các event `title`, `summary` theo từng đoạn, kết thúc bằng `done`."""
+    # Từ chối trước khi trả header 200 nếu đang quá tải
+    _validate_profile(body.profile)
+    inference_executor.check_admission(PRIORITY_INTERACTIVE)
+    cancel_event = threading.Event()
+
+    async def event_stream():
+        try:
+            events = summarize_controller.stream_summary(
+                body.text, cancel_event, profile=body.profile, latency_budget_ms=body.latency_budget_ms,
+                model_id=body.model_id, version=body.version,
+            )
+            async for event, data in iterate_in_threadpool(events):
+                if await req.is_disconnected():
+                    break
+                yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)}, ensure_ascii=False)}\n\n"
+        finally:
+            cancel_event.set()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/bulk")
+async def summarize_bulk(req: Request, profile: Optional[str] = None):
+    """
+    Body là JSON array hoặc NDJSON (Content-Type: application/x-ndjson), mỗi phần tử là
+    chuỗi hoặc `{"id": ..., "text": ...}`. Kết quả trả về dạng NDJSON theo từng batch.
+    """
+    _validate_profile(profile)
+    inference_executor.check_admission(PRIORITY_BULK)
+    content_type = req.headers.get("content-type", "")
+    body = iter_upload_chunks(await spool_request_body(req))
+    if "ndjson" in content_type or "jsonl" in content_type:
+        items = iter_ndjson(body)
+    else:
+        items = iter_json_array(body)
+    return StreamingResponse(summarize_controller.stream_bulk(items, profile), media_type="application/x-ndjson")
+
+@router.post("/bulk/upload")
+async def summarize_bulk_upload(file: UploadFile = File(...), profile: Optional[str] = None):
+    """Upload file JSONL, mỗi dòng là chuỗi hoặc `{"id": ..., "text": ...}`."""
+    _validate_profile(profile)
+    inference_executor.check_admission(PRIORITY_BULK)
+    items = iter_ndjson(iter_upload_chunks(file))
+    return StreamingResponse(summarize_controller.stream_bulk(items, profile), media_type="application/x-ndjson")
+
+
+@router.get("/stats")
+def summarize_stats():
+    return summarize_controller.get_stats()
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, Optional
 
 class DatasetBase(BaseModel):
     name: str
@@ -24,6 +24,9 @@ class Dataset(DatasetBase):
     min_target_length: Optional[int]
     max_target_length: Optional[int]
     avg_target_length: Optional[float]
+    # Khoảng số token -> số sample
+    input_token_histogram: Optional[Dict[str, int]] = None
+    target_token_histogram: Optional[Dict[str, int]] = None
 
     class Config:
         from_attributes = True  
@@ -10,6 +10,8 @@ class TrainRequest(BaseModel):
     sample_ids: List[str]
     is_retrain: bool = Field(default=False)
     base_model_id: Optional[str] = Field(default=None)
+    # Chỉ train adapter LoRA trên version gốc, version mới chỉ lưu weights adapter
+    use_lora: bool = Field(default=False)
 
 
 class ModelVersionResponse(BaseModel):
@@ -26,6 +28,9 @@ class ModelVersionResponse(BaseModel):
     sample_ids: Optional[List[str]]
     is_select_all: Optional[bool]
     is_retrain: Optional[bool]
+    eval_seconds: Optional[float] = None
+    eval_examples_per_sec: Optional[float] = None
+    use_lora: Optional[bool] = None
 
 
 class ModelStatusResponse(BaseModel):
@@ -50,6 +55,15 @@ class ActivateModelRequest(BaseModel):
     model_version_id: str = Field(..., description="Model version ID to activate")
 
 
+class SetBackendRequest(BaseModel):
+    backend: str = Field(..., description="Serving backend: torch, torch_int8, onnx")
+
+
+class ShadowRequest(BaseModel):
+    model_id: str
+    fraction: float = Field(default=0.05, ge=0.0, le=1.0, description="Tỉ lệ request /summarize được mirror")
+
+
 class ModelMetrics(BaseModel):
     accuracy: float
     precision: float
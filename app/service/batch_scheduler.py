@@ -0,0 +1,239 @@
+"""Dynamic micro-batching scheduler cho inference"""
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import CancelledError, Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _PendingItem:
+    key: Any
+    payload: Any
+    priority: int = 0
+    # Thời điểm time.monotonic() mà sau đó kết quả không còn giá trị
+    deadline: Optional[float] = None
+    future: Future = field(default_factory=Future)
+    enqueued_at: float = field(default_factory=time.perf_counter)
+    # Người gọi set khi không còn chờ kết quả (hết thời gian chờ, client ngắt kết nối)
+    cancel_event: Optional[threading.Event] = None
+
+    def cancelled(self) -> bool:
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+
+class _BatchCancelEvent:
+    """`is_set()` khi mọi item của batch đã bị huỷ: dừng generate mà không cắt ngang item còn chờ."""
+
+    def __init__(self, batch: List[_PendingItem]):
+        self._batch = batch
+
+    def is_set(self) -> bool:
+        return all(item.cancelled() for item in self._batch)
+
+
+class BatchScheduler:
+    """
+    Gom các request đồng thời trong một cửa sổ (max_batch_size, max_wait_ms) rồi
+    gọi `handler(key, payloads)` một lần cho cả batch.
+
+    Các item chỉ được gộp chung khi có cùng `key` (ví dụ cùng một model đã load và số beam),
+    `handler` phải trả về list kết quả theo đúng thứ tự `payloads`.
+
+    Có `executor` (InferenceExecutor) thì thread của scheduler chỉ gom batch, mỗi batch được
+    đưa vào lane ưu tiên của executor (ưu tiên cao nhất và deadline muộn nhất trong batch),
+    nên giới hạn concurrency của executor áp lên chính các lần generate. Không có executor
+    thì batch chạy ngay trên thread của scheduler.
+
+    Item có `cancel_event` đã set bị bỏ (future nhận CancelledError) nếu batch của nó chưa
+    chạy. Khi batch có item kèm `cancel_event`, handler được gọi thêm `cancel_event=` (set khi
+    mọi item đều đã huỷ) để dừng generate giữa chừng.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Any, List[Any]], List[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 20,
+        stats_window: int = 1000,
+        name: str = "batch-scheduler",
+        executor=None,
+    ):
+        self.handler = handler
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max(0.0, max_wait_ms)
+        self.name = name
+        self.executor = executor
+        self._queue: "queue.Queue[_PendingItem]" = queue.Queue()
+        self._carry: deque = deque()
+        self._worker = None
+        self._start_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = deque(maxlen=stats_window)
+        self._wait_ms = deque(maxlen=stats_window)
+        self._run_ms = deque(maxlen=stats_window)
+        self._total_batches = 0
+        self._total_items = 0
+
+    def submit(self, key: Any, payload: Any, priority: int = 0, deadline: Optional[float] = None,
+               cancel_event: Optional[threading.Event] = None) -> Any:
+        """Đưa một item vào hàng đợi và block cho tới khi có kết quả."""
+        return self.submit_async(key, payload, priority, deadline, cancel_event).result()
+
+    def submit_async(self, key: Any, payload: Any, priority: int = 0, deadline: Optional[float] = None,
+                     cancel_event: Optional[threading.Event] = None) -> Future:
+        self._ensure_worker()
+        item = _PendingItem(key=key, payload=payload, priority=priority, deadline=deadline,
+                            cancel_event=cancel_event)
+        self._queue.put(item)
+        return item.future
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._worker.start()
+
+    def _next_item(self, timeout=None):
+        if self._carry:
+            return self._carry.popleft()
+        if timeout is not None and timeout <= 0:
+            return self._queue.get_nowait()
+        return self._queue.get(timeout=timeout)
+
+    def _drop_if_cancelled(self, item: _PendingItem) -> bool:
+        if item.cancelled():
+            self._fail([item], CancelledError())
+            return True
+        return False
+
+    def _collect(self) -> List[_PendingItem]:
+        first = self._next_item()
+        while self._drop_if_cancelled(first):
+            first = self._next_item()
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            try:
+                item = self._next_item(timeout=deadline - time.perf_counter())
+            except queue.Empty:
+                break
+            if self._drop_if_cancelled(item):
+                continue
+            if item.key != first.key:
+                # Khác model hoặc cấu hình decode, để dành cho batch sau
+                self._carry.append(item)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if self.executor is None:
+                self._run_batch(batch)
+                continue
+            try:
+                task = self.executor.submit(
+                    lambda batch=batch: self._run_batch(batch),
+                    priority=min(item.priority for item in batch),
+                    deadline=self._batch_deadline(batch),
+                )
+            except Exception as e:
+                # Hàng đợi của lane đầy hoặc không kịp deadline: cả batch nhận lỗi đó
+                self._fail(batch, e)
+                continue
+            task.add_done_callback(lambda future, batch=batch: self._on_dispatched(future, batch))
+
+    def _on_dispatched(self, task: Future, batch: List[_PendingItem]):
+        """Batch bị bỏ trong hàng đợi executor (hết deadline, cancel) thì handler không chạy."""
+        if task.cancelled():
+            self._fail(batch, CancelledError())
+        elif task.exception() is not None:
+            self._fail(batch, task.exception())
+
+    @staticmethod
+    def _batch_deadline(batch: List[_PendingItem]) -> Optional[float]:
+        """Batch còn giá trị tới khi item cuối cùng hết hạn; item không có deadline thì không giới hạn."""
+        if any(item.deadline is None for item in batch):
+            return None
+        return max(item.deadline for item in batch)
+
+    @staticmethod
+    def _fail(batch: List[_PendingItem], error: BaseException):
+        for item in batch:
+            if not item.future.done():
+                item.future.set_exception(error)
+
+    def _run_batch(self, batch: List[_PendingItem]):
+        # Item bị huỷ trong lúc batch chờ trên executor
+        batch = [item for item in batch if not self._drop_if_cancelled(item)]
+        if not batch:
+            return
+        started = time.perf_counter()
+        try:
+            kwargs = {}
+            if any(item.cancel_event is not None for item in batch):
+                kwargs["cancel_event"] = _BatchCancelEvent(batch)
+            results = self.handler(batch[0].key, [item.payload for item in batch], **kwargs)
+            if len(results) != len(batch):
+                raise RuntimeError(f"Batch handler returned {len(results)} results for {len(batch)} items")
+            for item, result in zip(batch, results):
+                # Item huỷ giữa chừng có thể nhận output bị cắt ngắn, không trả về
+                if not self._drop_if_cancelled(item):
+                    item.future.set_result(result)
+        except Exception as e:
+            logger.error(f"Batch of {len(batch)} failed: {str(e)}")
+            self._fail(batch, e)
+        finished = time.perf_counter()
+        self._record(batch, started, finished)
+
+    def _record(self, batch: List[_PendingItem], started: float, finished: float):
+        with self._stats_lock:
+            self._total_batches += 1
+            self._total_items += len(batch)
+            self._batch_sizes.append(len(batch))
+            self._run_ms.append((finished - started) * 1000)
+            for item in batch:
+                self._wait_ms.append((started - item.enqueued_at) * 1000)
+
+    def stats(self) -> Dict:
+        """Thống kê batch size và thời gian chờ trên cửa sổ gần nhất."""
+        with self._stats_lock:
+            sizes = list(self._batch_sizes)
+            waits = list(self._wait_ms)
+            runs = list(self._run_ms)
+            total_batches = self._total_batches
+            total_items = self._total_items
+
+        def summary(values):
+            if not values:
+                return {"avg": 0.0, "p50": 0.0, "p99": 0.0, "max": 0.0}
+            return {
+                "avg": round(float(np.mean(values)), 2),
+                "p50": round(float(np.percentile(values, 50)), 2),
+                "p99": round(float(np.percentile(values, 99)), 2),
+                "max": round(float(np.max(values)), 2),
+            }
+
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "queue_depth": self._queue.qsize() + len(self._carry),
+            "total_batches": total_batches,
+            "total_items": total_items,
+            "batch_size": summary(sizes),
+            "batch_size_histogram": {str(k): sizes.count(k) for k in sorted(set(sizes))},
+            "wait_ms": summary(waits),
+            "generate_ms": summary(runs),
+        }
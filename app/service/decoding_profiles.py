@@ -0,0 +1,159 @@
+"""Profile decoding (fast/balanced/quality): số beam, độ dài output dự đoán theo độ dài input và ngân sách latency"""
+import math
+import threading
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional
+
+from constant.constants import (
+    DECODING_PROFILE,
+    DECODING_STEP_MS,
+    TITLE_MAX_NEW_TOKENS,
+    SUMMARY_MAX_NEW_TOKENS,
+)
+
+PROFILE_FAST = "fast"
+PROFILE_BALANCED = "balanced"
+PROFILE_QUALITY = "quality"
+
+
+@dataclass(frozen=True)
+class DecodingProfile:
+    name: str
+    num_beams: int
+    # Trần số token sinh ra của mỗi task
+    title_max_new_tokens: int
+    summary_max_new_tokens: int
+    # Độ dài dự đoán = ratio * số token input, kẹp trong [min, trần]
+    title_ratio: float
+    title_min_new_tokens: int
+    summary_ratio: float
+    summary_min_new_tokens: int
+
+
+DECODING_PROFILES: Dict[str, DecodingProfile] = {
+    PROFILE_FAST: DecodingProfile(
+        name=PROFILE_FAST, num_beams=1,
+        title_max_new_tokens=min(24, TITLE_MAX_NEW_TOKENS), summary_max_new_tokens=min(96, SUMMARY_MAX_NEW_TOKENS),
+        title_ratio=0.05, title_min_new_tokens=8, summary_ratio=0.2, summary_min_new_tokens=16,
+    ),
+    PROFILE_BALANCED: DecodingProfile(
+        name=PROFILE_BALANCED, num_beams=2,
+        title_max_new_tokens=min(32, TITLE_MAX_NEW_TOKENS), summary_max_new_tokens=min(160, SUMMARY_MAX_NEW_TOKENS),
+        title_ratio=0.08, title_min_new_tokens=12, summary_ratio=0.3, summary_min_new_tokens=24,
+    ),
+    PROFILE_QUALITY: DecodingProfile(
+        name=PROFILE_QUALITY, num_beams=4,
+        title_max_new_tokens=TITLE_MAX_NEW_TOKENS, summary_max_new_tokens=SUMMARY_MAX_NEW_TOKENS,
+        title_ratio=0.1, title_min_new_tokens=16, summary_ratio=0.5, summary_min_new_tokens=32,
+    ),
+}
+
+
+@dataclass(frozen=True)
+class DecodingPlan:
+    """Tham số decode đã chốt cho một input cụ thể."""
+    profile: str
+    num_beams: int
+    title_max_new_tokens: int
+    summary_max_new_tokens: int
+    input_tokens: int
+    estimated_ms: float = 0.0
+    # True khi đã giảm beam / độ dài để vừa latency budget
+    budget_limited: bool = False
+
+    def cache_params(self) -> Dict:
+        """Các tham số quyết định output (không gồm ước tính thời gian)."""
+        return {
+            "profile": self.profile,
+            "num_beams": self.num_beams,
+            "title_max_new_tokens": self.title_max_new_tokens,
+            "summary_max_new_tokens": self.summary_max_new_tokens,
+        }
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def get_profile(name: Optional[str] = None) -> DecodingProfile:
+    name = name or DECODING_PROFILE
+    if name not in DECODING_PROFILES:
+        raise ValueError(f"Unknown decoding profile '{name}', expected one of {list(DECODING_PROFILES)}")
+    return DECODING_PROFILES[name]
+
+
+def _predict_length(input_tokens: int, ratio: float, minimum: int, maximum: int) -> int:
+    return max(min(minimum, maximum), min(maximum, math.ceil(input_tokens * ratio)))
+
+
+class DecodingCostModel:
+    """
+    Ước tính thời gian generate: `ms_per_step` là thời gian một bước decode của
+    một sequence (dòng x beam), cập nhật bằng EWMA từ các lần generate thực tế.
+    """
+
+    def __init__(self, ms_per_step: float):
+        self._lock = threading.Lock()
+        self.ms_per_step = ms_per_step
+        self.observations = 0
+
+    def observe(self, elapsed_ms: float, steps: int, sequences: int):
+        if steps <= 0 or sequences <= 0:
+            return
+        sample = elapsed_ms / (steps * sequences)
+        with self._lock:
+            self.ms_per_step = 0.8 * self.ms_per_step + 0.2 * sample
+            self.observations += 1
+
+    def estimate(self, num_beams: int, title_max_new_tokens: int, summary_max_new_tokens: int) -> float:
+        # Title và summary decode chung một batch: số bước theo dòng dài nhất, 2 dòng x num_beams
+        steps = max(title_max_new_tokens, summary_max_new_tokens)
+        return steps * 2 * num_beams * self.ms_per_step
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "default_profile": DECODING_PROFILE,
+                "ms_per_step": round(self.ms_per_step, 4),
+                "observations": self.observations,
+            }
+
+
+decoding_cost_model = DecodingCostModel(DECODING_STEP_MS)
+
+
+def plan_decoding(input_tokens: int, profile_name: Optional[str] = None,
+                  latency_budget_ms: Optional[float] = None) -> DecodingPlan:
+    """
+    Dự đoán độ dài title/summary theo số token input rồi, nếu có `latency_budget_ms`,
+    giảm dần số beam (4 -> 2 -> 1) và sau cùng rút ngắn độ dài cho tới khi ước tính vừa budget.
+    """
+    profile = get_profile(profile_name)
+    num_beams = profile.num_beams
+    title = _predict_length(input_tokens, profile.title_ratio, profile.title_min_new_tokens,
+                            profile.title_max_new_tokens)
+    summary = _predict_length(input_tokens, profile.summary_ratio, profile.summary_min_new_tokens,
+                              profile.summary_max_new_tokens)
+    estimated = decoding_cost_model.estimate(num_beams, title, summary)
+    limited = False
+
+    if latency_budget_ms is not None:
+        while num_beams > 1 and estimated > latency_budget_ms:
+            num_beams = max(1, num_beams // 2)
+            estimated = decoding_cost_model.estimate(num_beams, title, summary)
+            limited = True
+        if estimated > latency_budget_ms:
+            scale = latency_budget_ms / estimated
+            title = max(min(profile.title_min_new_tokens, title), math.floor(title * scale))
+            summary = max(min(profile.summary_min_new_tokens, summary), math.floor(summary * scale))
+            estimated = decoding_cost_model.estimate(num_beams, title, summary)
+            limited = True
+
+    return DecodingPlan(
+        profile=profile.name,
+        num_beams=num_beams,
+        title_max_new_tokens=title,
+        summary_max_new_tokens=summary,
+        input_tokens=input_tokens,
+        estimated_ms=round(estimated, 2),
+        budget_limited=limited,
+    )
@@ -0,0 +1,137 @@
+"""
+Train data-parallel trên nhiều process CPU (torch.distributed, backend gloo), một hoặc nhiều máy.
+
+Module chỉ import thư viện chuẩn: process worker phải đặt RANK/WORLD_SIZE/MASTER_* và
+số thread trước khi import torch/transformers, nên hàm chạy trong worker được truyền
+bằng tên `module:function` và chỉ import sau khi đã đặt biến môi trường.
+"""
+import importlib
+import logging
+import multiprocessing
+import os
+import socket
+import time
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class WorkerLayout:
+    nproc_per_node: int
+    threads_per_worker: int
+    master_addr: str = "127.0.0.1"
+    master_port: int = 0
+    nnodes: int = 1
+    node_rank: int = 0
+
+    @property
+    def world_size(self) -> int:
+        return self.nproc_per_node * self.nnodes
+
+    def to_dict(self) -> Dict:
+        return {**asdict(self), "world_size": self.world_size}
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("", 0))
+        return sock.getsockname()[1]
+
+
+def plan_workers(nproc_per_node: int, total_threads: int, master_addr: str = "127.0.0.1",
+                 master_port: int = 0, nnodes: int = 1, node_rank: int = 0) -> WorkerLayout:
+    """
+    Chia `total_threads` CPU thread của máy cho `nproc_per_node` worker để các worker
+    không tranh thread. Train trên nhiều máy cần chỉ định `master_port` (cùng giá trị ở
+    mọi máy); một máy thì tự chọn port trống.
+    """
+    if nproc_per_node < 1:
+        raise ValueError("nproc_per_node must be >= 1")
+    if not 0 <= node_rank < nnodes:
+        raise ValueError(f"node_rank must be in [0, {nnodes})")
+    if nnodes > 1 and not master_port:
+        raise ValueError("master_port is required when training across machines")
+    return WorkerLayout(
+        nproc_per_node=nproc_per_node,
+        threads_per_worker=max(1, total_threads // nproc_per_node),
+        master_addr=master_addr,
+        master_port=master_port or free_port(),
+        nnodes=nnodes,
+        node_rank=node_rank,
+    )
+
+
+def worker_env(layout: WorkerLayout, local_rank: int) -> Dict[str, str]:
+    threads = str(layout.threads_per_worker)
+    env = {"OMP_NUM_THREADS": threads, "MKL_NUM_THREADS": threads}
+    if layout.world_size > 1:
+        env.update({
+            "RANK": str(layout.node_rank * layout.nproc_per_node + local_rank),
+            "LOCAL_RANK": str(local_rank),
+            "WORLD_SIZE": str(layout.world_size),
+            "LOCAL_WORLD_SIZE": str(layout.nproc_per_node),
+            "MASTER_ADDR": layout.master_addr,
+            "MASTER_PORT": str(layout.master_port),
+        })
+    return env
+
+
+def is_main_process() -> bool:
+    """Rank 0 của cả nhóm (chỉ process này ghi trạng thái job, lưu model, tính metrics)."""
+    return int(os.environ.get("RANK", "0")) == 0
+
+
+def _worker_entry(env: Dict[str, str], target: str, args: Sequence):
+    os.environ.update(env)
+    module_name, func_name = target.split(":")
+    getattr(importlib.import_module(module_name), func_name)(*args)
+
+
+def start_workers(layout: WorkerLayout, target: str, args: Sequence, name: str) -> List:
+    """Spawn `nproc_per_node` worker của máy này; phần tử đầu là local rank 0."""
+    ctx = multiprocessing.get_context("spawn")
+    processes = []
+    for local_rank in range(layout.nproc_per_node):
+        process = ctx.Process(
+            target=_worker_entry,
+            args=(worker_env(layout, local_rank), target, tuple(args)),
+            name=f"{name}-{local_rank}",
+        )
+        process.start()
+        processes.append(process)
+    return processes
+
+
+def wait_workers(processes: List, poll_seconds: float = 1.0, grace_seconds: float = 30.0) -> int:
+    """
+    Chờ các worker kết thúc. Một worker lỗi làm các worker còn lại treo ở collective,
+    nên khi có worker thoát với mã khác 0 (hoặc rank 0 đã xong mà worker khác còn chạy
+    quá `grace_seconds`) thì dừng các worker còn lại. Trả về mã lỗi của worker lỗi đầu
+    tiên (không phải mã của worker bị dừng theo), hoặc 0.
+    """
+    main_done_at = None
+    while True:
+        failed = [p.exitcode for p in processes if p.exitcode not in (None, 0)]
+        alive = [p for p in processes if p.is_alive()]
+        if not alive:
+            break
+        if processes[0].exitcode is not None and main_done_at is None:
+            main_done_at = time.monotonic()
+        if failed or (main_done_at is not None and time.monotonic() - main_done_at > grace_seconds):
+            logger.warning(f"Stopping {len(alive)} remaining training worker(s)")
+            terminate_workers(alive)
+            break
+        time.sleep(poll_seconds)
+    if failed:
+        return failed[0]
+    return next((p.exitcode for p in processes if p.exitcode), 0)
+
+
+def terminate_workers(processes: List, timeout: float = 10.0):
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    for process in processes:
+        process.join(timeout)
@@ -0,0 +1,119 @@
+"""Sinh prediction cho tập eval theo batch đã sắp theo độ dài, có thể chia cho nhiều process CPU"""
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence
+
+import numpy as np
+import torch
+from transformers import AutoModelForSeq2SeqLM, LogitsProcessorList
+
+from app.service.decoding_profiles import plan_decoding
+from app.service.generation_utils import RowMaxNewTokensLogitsProcessor
+
+logger = logging.getLogger(__name__)
+
+# Số token đầu của input đủ để decode ra prefix task ("title:" / "summarize:")
+TASK_PREFIX_TOKENS = 8
+
+
+def unpadded_input_ids(example) -> List[int]:
+    """Bỏ phần pad bên phải (nếu dataset đã pad tới max_length)."""
+    input_ids = list(example["input_ids"])
+    attention_mask = example.get("attention_mask")
+    if attention_mask is None:
+        return input_ids
+    return input_ids[:int(sum(attention_mask))]
+
+
+def row_max_new_tokens(tokenizer, input_ids: List[int], profile: Optional[str] = None) -> int:
+    """Giới hạn token sinh ra của một dòng eval theo task của nó (prompt "title: ..." hay "summarize: ...")."""
+    plan = plan_decoding(len(input_ids), profile)
+    prefix = tokenizer.decode(input_ids[:TASK_PREFIX_TOKENS], skip_special_tokens=True).lstrip()
+    return plan.title_max_new_tokens if prefix.startswith("title:") else plan.summary_max_new_tokens
+
+
+def length_sorted_batches(lengths: Sequence[int], batch_size: int) -> List[List[int]]:
+    order = np.argsort(np.asarray(lengths), kind="stable").tolist()
+    return [order[i:i + batch_size] for i in range(0, len(order), max(1, batch_size))]
+
+
+def generate_rows(model, inputs: List[List[int]], row_limits: List[int], num_beams: int,
+                  pad_token_id: int, device) -> List[List[int]]:
+    """
+    Generate một batch đã pad phải. Greedy: decode tới giới hạn lớn nhất rồi cắt từng
+    dòng về giới hạn của nó, kết quả trùng với generate từng câu vì các dòng decode độc
+    lập. Beam search: ép EOS theo giới hạn từng dòng.
+    """
+    max_len = max(len(ids) for ids in inputs)
+    input_ids = torch.full((len(inputs), max_len), pad_token_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(inputs), max_len), dtype=torch.long)
+    for row, ids in enumerate(inputs):
+        input_ids[row, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+        attention_mask[row, :len(ids)] = 1
+
+    kwargs = {}
+    if num_beams > 1:
+        kwargs["logits_processor"] = LogitsProcessorList([
+            RowMaxNewTokensLogitsProcessor(row_limits, eos_token_id=model.config.eos_token_id)
+        ])
+    with torch.no_grad():
+        outputs = model.generate(
+            input_ids=input_ids.to(device),
+            attention_mask=attention_mask.to(device),
+            max_new_tokens=max(row_limits),
+            num_beams=num_beams,
+            early_stopping=num_beams > 1,
+            **kwargs,
+        )
+
+    # Token đầu là decoder_start_token
+    return [ids[:1 + limit] for ids, limit in zip(outputs.tolist(), row_limits)]
+
+
+def _generate_shard(model_path: str, batches, num_beams: int, pad_token_id: int, num_threads: int):
+    """Entry point của process worker: nạp model từ đĩa và generate các batch được giao."""
+    torch.set_num_threads(num_threads)
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_path).eval()
+    cpu = torch.device("cpu")
+    return [
+        (indices, generate_rows(model, inputs, limits, num_beams, pad_token_id, cpu))
+        for indices, inputs, limits in batches
+    ]
+
+
+def generate_predictions(model, inputs: List[List[int]], row_limits: List[int], num_beams: int,
+                         pad_token_id: int, device, batch_size: int, num_workers: int = 1,
+                         model_path: Optional[str] = None) -> List[List[int]]:
+    """
+    Trả về output ids theo đúng thứ tự `inputs`. Khi `num_workers > 1`, chạy trên CPU
+    và có `model_path`, các batch được chia xen kẽ (cân bằng độ dài) cho các process
+    spawn, mỗi process nạp model riêng và dùng một phần số CPU thread.
+    """
+    batches = [
+        (indices, [inputs[i] for i in indices], [row_limits[i] for i in indices])
+        for indices in length_sorted_batches([len(ids) for ids in inputs], batch_size)
+    ]
+    predictions: List[Optional[List[int]]] = [None] * len(inputs)
+
+    if num_workers > 1 and model_path and torch.device(device).type == "cpu" and len(batches) > 1:
+        num_workers = min(num_workers, len(batches))
+        num_threads = max(1, torch.get_num_threads() // num_workers)
+        shards = [batches[w::num_workers] for w in range(num_workers)]
+        logger.info(f"Evaluating {len(inputs)} examples on {num_workers} worker processes x {num_threads} threads")
+        with ProcessPoolExecutor(max_workers=num_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [
+                pool.submit(_generate_shard, model_path, shard, num_beams, pad_token_id, num_threads)
+                for shard in shards
+            ]
+            results = [item for future in futures for item in future.result()]
+    else:
+        results = (
+            (indices, generate_rows(model, batch_inputs, limits, num_beams, pad_token_id, device))
+            for indices, batch_inputs, limits in batches
+        )
+
+    for indices, outputs in results:
+        for i, output in zip(indices, outputs):
+            predictions[i] = output
+    return predictions
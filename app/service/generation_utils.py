@@ -0,0 +1,47 @@
+"""Helpers cho model.generate dùng chung giữa các service"""
+import threading
+from typing import List
+
+import torch
+from transformers import LogitsProcessor, StoppingCriteria
+
+
+class RowMaxNewTokensLogitsProcessor(LogitsProcessor):
+    """
+    Giới hạn số token sinh ra cho từng dòng của batch.
+
+    `model.generate` chỉ nhận một `max_new_tokens` cho cả batch; processor này ép
+    EOS cho dòng đã chạm giới hạn của nó để beam của dòng đó kết thúc sớm, trong
+    khi các dòng dài hơn (ví dụ summary) vẫn tiếp tục decode.
+    """
+
+    def __init__(self, max_new_tokens: List[int], eos_token_id: int, prompt_length: int = 1):
+        self.max_new_tokens = torch.tensor(max_new_tokens, dtype=torch.long)
+        self.eos_token_id = eos_token_id
+        # Với encoder-decoder, input_ids của decoder bắt đầu bằng decoder_start_token
+        self.prompt_length = prompt_length
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        num_beams = input_ids.shape[0] // self.max_new_tokens.shape[0]
+        limits = self.max_new_tokens.to(input_ids.device).repeat_interleave(num_beams)
+        generated = input_ids.shape[-1] - self.prompt_length
+        # Token kế tiếp là token cuối cùng được phép -> chỉ cho phép EOS
+        force_eos = generated >= limits - 1
+        if force_eos.any():
+            eos_scores = scores[force_eos, self.eos_token_id].clone()
+            scores[force_eos] = -float("inf")
+            scores[force_eos, self.eos_token_id] = eos_scores
+        return scores
+
+
+class CancelStoppingCriteria(StoppingCriteria):
+    """
+    Dừng generate khi `cancel_event` được set (ví dụ client đã ngắt kết nối hoặc hết deadline).
+    Chỉ cần `is_set()`, nên dùng được cả tín hiệu huỷ của cả batch trong BatchScheduler.
+    """
+
+    def __init__(self, cancel_event: threading.Event):
+        self.cancel_event = cancel_event
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        return torch.full((input_ids.shape[0],), self.cancel_event.is_set(), dtype=torch.bool, device=input_ids.device)
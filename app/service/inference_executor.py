@@ -0,0 +1,190 @@
+"""Executor riêng cho inference: giới hạn concurrency, hàng đợi có giới hạn theo lane ưu tiên và deadline"""
+import heapq
+import itertools
+import logging
+import math
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional
+
+from fastapi import HTTPException
+
+from constant.constants import (
+    INFERENCE_MAX_CONCURRENCY,
+    INFERENCE_MAX_QUEUE,
+    INFERENCE_MAX_BULK_QUEUE,
+)
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+_LANE_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BULK: "bulk"}
+
+
+class InferenceRejectedError(HTTPException):
+    """Request bị từ chối ngay (429 khi hàng đợi đầy, 503 khi không kịp deadline) kèm Retry-After."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(
+            status_code=status_code,
+            detail=detail,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+
+@dataclass(order=True)
+class _Task:
+    priority: int
+    seq: int
+    fn: Callable = field(compare=False)
+    deadline: Optional[float] = field(compare=False, default=None)
+    future: Future = field(compare=False, default_factory=Future)
+
+
+class InferenceExecutor:
+    """
+    Chạy các tác vụ inference trên `max_concurrency` worker thread riêng.
+
+    Mỗi lane ưu tiên có giới hạn hàng đợi riêng; lane interactive luôn được lấy
+    trước lane bulk. `deadline` là thời điểm `time.monotonic()` mà sau đó kết quả
+    không còn giá trị: request bị từ chối ngay nếu thời gian chờ ước tính vượt
+    deadline, và bị bỏ nếu tới lượt chạy thì deadline đã qua.
+    """
+
+    def __init__(self, max_concurrency: int, queue_limits: Dict[int, int], name: str = "inference"):
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue_limits = queue_limits
+        self.name = name
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._queued = {lane: 0 for lane in queue_limits}
+        self._active = 0
+        self._workers = []
+        # Thời gian chạy trung bình (EWMA) của một tác vụ, dùng để ước tính thời gian chờ
+        self._avg_task_seconds = 1.0
+
+        self.completed = 0
+        self.rejected_queue_full = 0
+        self.rejected_deadline = 0
+        self.expired_in_queue = 0
+
+    def _ensure_workers(self):
+        if self._workers:
+            return
+        for i in range(self.max_concurrency):
+            worker = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def estimated_wait(self, priority: int = PRIORITY_INTERACTIVE) -> float:
+        with self._cond:
+            return self._estimated_wait_locked(priority)
+
+    def _estimated_wait_locked(self, priority: int) -> float:
+        ahead = sum(count for lane, count in self._queued.items() if lane <= priority)
+        busy = self._active + ahead
+        if busy < self.max_concurrency:
+            return 0.0
+        return (busy - self.max_concurrency + 1) / self.max_concurrency * self._avg_task_seconds
+
+    def check_admission(self, priority: int = PRIORITY_INTERACTIVE, deadline: Optional[float] = None):
+        """Fail fast trước khi bắt đầu một response streaming."""
+        with self._cond:
+            self._check_admission_locked(priority, deadline)
+
+    def _check_admission_locked(self, priority: int, deadline: Optional[float]):
+        estimate = self._estimated_wait_locked(priority)
+        if self._queued[priority] >= self.queue_limits[priority]:
+            self.rejected_queue_full += 1
+            raise InferenceRejectedError(429, "Inference queue is full, retry later", estimate or self._avg_task_seconds)
+        if deadline is not None and time.monotonic() + estimate > deadline:
+            self.rejected_deadline += 1
+            raise InferenceRejectedError(503, "Deadline cannot be met at current load", estimate)
+
+    def submit(self, fn: Callable, priority: int = PRIORITY_INTERACTIVE,
+               deadline: Optional[float] = None, block: bool = False) -> Future:
+        """
+        Đưa tác vụ vào hàng đợi. Khi lane đầy: `block=False` ném InferenceRejectedError,
+        `block=True` chờ tới khi có chỗ (dùng cho bulk để tạo backpressure lên input).
+        """
+        self._ensure_workers()
+        with self._cond:
+            if block:
+                while self._queued[priority] >= self.queue_limits[priority]:
+                    self._cond.wait()
+            self._check_admission_locked(priority, deadline)
+            task = _Task(priority=priority, seq=next(self._seq), fn=fn, deadline=deadline)
+            heapq.heappush(self._heap, task)
+            self._queued[priority] += 1
+            self._cond.notify_all()
+        return task.future
+
+    def run(self, fn: Callable, priority: int = PRIORITY_INTERACTIVE,
+            deadline: Optional[float] = None, block: bool = False):
+        return self.submit(fn, priority=priority, deadline=deadline, block=block).result()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                task = heapq.heappop(self._heap)
+                self._queued[task.priority] -= 1
+                self._active += 1
+                self._cond.notify_all()
+
+            try:
+                if not task.future.set_running_or_notify_cancel():
+                    continue
+                if task.deadline is not None and time.monotonic() > task.deadline:
+                    with self._cond:
+                        self.expired_in_queue += 1
+                    task.future.set_exception(
+                        InferenceRejectedError(503, "Deadline exceeded while queued", self._avg_task_seconds)
+                    )
+                    continue
+
+                started = time.monotonic()
+                try:
+                    result = task.fn()
+                except BaseException as e:
+                    task.future.set_exception(e)
+                else:
+                    task.future.set_result(result)
+                elapsed = time.monotonic() - started
+                with self._cond:
+                    self._avg_task_seconds = 0.8 * self._avg_task_seconds + 0.2 * elapsed
+                    self.completed += 1
+            finally:
+                with self._cond:
+                    self._active -= 1
+                    self._cond.notify_all()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "active": self._active,
+                "queued": {_LANE_NAMES.get(lane, str(lane)): count for lane, count in self._queued.items()},
+                "queue_limits": {_LANE_NAMES.get(lane, str(lane)): limit for lane, limit in self.queue_limits.items()},
+                "avg_task_ms": round(self._avg_task_seconds * 1000, 2),
+                "estimated_wait_ms": round(self._estimated_wait_locked(PRIORITY_INTERACTIVE) * 1000, 2),
+                "completed": self.completed,
+                "rejected_queue_full": self.rejected_queue_full,
+                "rejected_deadline": self.rejected_deadline,
+                "expired_in_queue": self.expired_in_queue,
+            }
+
+
+inference_executor = InferenceExecutor(
+    max_concurrency=INFERENCE_MAX_CONCURRENCY,
+    queue_limits={
+        PRIORITY_INTERACTIVE: INFERENCE_MAX_QUEUE,
+        PRIORITY_BULK: INFERENCE_MAX_BULK_QUEUE,
+    },
+)
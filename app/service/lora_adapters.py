@@ -0,0 +1,229 @@
+"""LoRA adapter: train adapter low-rank trên một version gốc và serve nhiều adapter trên một model gốc"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from transformers import AutoModelForSeq2SeqLM
+
+from constant.constants import (
+    LORA_R,
+    LORA_ALPHA,
+    LORA_DROPOUT,
+    LORA_TARGET_MODULES,
+    ADAPTER_MAX_LOADED,
+)
+
+logger = logging.getLogger(__name__)
+
+ADAPTER_CONFIG_FILE = "adapter_config.json"
+
+
+def is_adapter_dir(path: str) -> bool:
+    """Version chỉ chứa weights adapter (thư mục do PeftModel.save_pretrained ghi)."""
+    return os.path.isfile(os.path.join(path, ADAPTER_CONFIG_FILE))
+
+
+def adapter_base_path(adapter_dir: str) -> str:
+    with open(os.path.join(adapter_dir, ADAPTER_CONFIG_FILE), encoding="utf-8") as f:
+        return json.load(f)["base_model_name_or_path"]
+
+
+def load_model_for_training(model_name: str, use_lora: bool):
+    """
+    Model để train từ `model_name` (tên HF hoặc thư mục version).
+
+    - Version gốc là adapter: nạp model gốc của adapter; train LoRA thì train tiếp
+      adapter đó, train full thì merge adapter vào weights rồi train.
+    - `use_lora`: bọc model bằng adapter LoRA mới, chỉ weights adapter được train.
+    """
+    from peft import LoraConfig, PeftModel, TaskType, get_peft_model
+
+    if is_adapter_dir(model_name):
+        base = AutoModelForSeq2SeqLM.from_pretrained(adapter_base_path(model_name))
+        model = PeftModel.from_pretrained(base, model_name, is_trainable=use_lora)
+        if use_lora:
+            return model
+        # PeftModel đóng băng weights gốc, merge xong phải mở lại để train full
+        return model.merge_and_unload().requires_grad_(True)
+
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+    if use_lora:
+        model = get_peft_model(model, LoraConfig(
+            task_type=TaskType.SEQ_2_SEQ_LM,
+            r=LORA_R,
+            lora_alpha=LORA_ALPHA,
+            lora_dropout=LORA_DROPOUT,
+            target_modules=LORA_TARGET_MODULES,
+        ))
+    return model
+
+
+class AdapterHost:
+    """
+    Một model gốc nằm trong bộ nhớ cùng nhiều adapter đã nạp (tối đa `max_loaded`,
+    bỏ adapter ít dùng nhất). Đổi adapter chỉ là `set_adapter`, không nạp lại model.
+
+    Adapter đang dùng là trạng thái chung của model, nên generate với adapter khác chỉ
+    được đổi adapter khi không còn generate nào đang chạy; các generate cùng adapter
+    vẫn chạy song song.
+
+    `on_unload(host, adapter_dir)` được gọi sau khi một adapter bị bỏ khỏi model.
+    """
+
+    def __init__(self, base_path: str, max_loaded: int = ADAPTER_MAX_LOADED,
+                 on_unload: Optional[Callable[["AdapterHost", Optional[str]], None]] = None):
+        self.base_path = base_path
+        self.max_loaded = max(1, max_loaded)
+        self.on_unload = on_unload
+        self.model = None
+        # Bộ nhớ weights của model gốc, tính vào ngân sách của registry một lần cho cả host
+        self.base_bytes = 0
+        self._adapters: "OrderedDict[str, str]" = OrderedDict()  # adapter_dir -> tên adapter
+        self._load_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._active: Optional[str] = None
+        self._inflight = 0
+        self.switches = 0
+        self._next_id = 0
+
+    def load_adapter(self, adapter_dir: str) -> str:
+        """Nạp adapter (nếu chưa có) và trả về tên adapter trong model."""
+        from peft import PeftModel
+
+        with self._load_lock:
+            name = self._adapters.get(adapter_dir)
+            if name is not None:
+                self._adapters.move_to_end(adapter_dir)
+                return name
+            self._next_id += 1
+            name = f"adapter_{self._next_id}"
+            if self.model is None:
+                base = AutoModelForSeq2SeqLM.from_pretrained(self.base_path)
+                tensors = list(base.parameters()) + list(base.buffers())
+                self.base_bytes = sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+                self.model = PeftModel.from_pretrained(base, adapter_dir, adapter_name=name)
+            else:
+                self.model.load_adapter(adapter_dir, adapter_name=name)
+            self.model.eval()
+            self._adapters[adapter_dir] = name
+            self._evict(keep=name)
+            return name
+
+    def _evict(self, keep: str):
+        """Bỏ adapter dùng lâu nhất, trừ adapter vừa nạp và adapter đang có generate chạy."""
+        while len(self._adapters) > self.max_loaded:
+            with self._cond:
+                busy = {keep, self._active} if self._inflight else {keep}
+                victim = next((d for d, n in self._adapters.items() if n not in busy), None)
+                if victim is None:
+                    return
+                name = self._adapters.pop(victim)
+                self.model.delete_adapter(name)
+                if name == self._active:
+                    self._active = None
+            logger.info(f"Unloaded adapter {victim} from base {self.base_path}")
+            if self.on_unload is not None:
+                self.on_unload(self, victim)
+
+    def acquire(self, adapter_dir: str):
+        """Bật adapter của `adapter_dir` cho một generate; adapter đã bị bỏ thì nạp lại."""
+        while True:
+            name = self.load_adapter(adapter_dir)
+            with self._cond:
+                while self._active != name and self._inflight > 0:
+                    self._cond.wait()
+                if self._adapters.get(adapter_dir) != name:
+                    # Bị bỏ trong lúc chờ generate của adapter khác
+                    continue
+                if self._active != name:
+                    self.model.set_adapter(name)
+                    self._active = name
+                    self.switches += 1
+                self._inflight += 1
+                return
+
+    def release(self):
+        with self._cond:
+            self._inflight -= 1
+            self._cond.notify_all()
+
+    def stats(self) -> Dict:
+        return {
+            "base_path": self.base_path,
+            "loaded_adapters": list(self._adapters),
+            "switches": self.switches,
+        }
+
+
+class AdapterModelView:
+    """
+    Model của một adapter version trên `AdapterHost` dùng chung: `generate` bật đúng
+    adapter trước khi chạy (nạp lại nếu host đã bỏ adapter), các thuộc tính khác lấy
+    từ model gốc.
+    """
+
+    def __init__(self, host: AdapterHost, adapter_dir: str):
+        self.host = host
+        self.adapter_dir = adapter_dir
+
+    def generate(self, *args, **kwargs):
+        self.host.acquire(self.adapter_dir)
+        try:
+            return self.host.model.generate(*args, **kwargs)
+        finally:
+            self.host.release()
+
+    def __getattr__(self, item):
+        return getattr(self.host.model, item)
+
+
+class AdapterHostPool:
+    """
+    Giữ đúng một model gốc trong bộ nhớ; adapter của model gốc khác sẽ thay model gốc.
+
+    Listener `(host, adapter_dir)` được gọi khi host bỏ một adapter, và với
+    `adapter_dir=None` khi cả host bị thay, để nơi giữ view (registry) bỏ các view đó.
+    """
+
+    def __init__(self):
+        self._host: Optional[AdapterHost] = None
+        self._lock = threading.Lock()
+        self._unload_listeners: List[Callable[[AdapterHost, Optional[str]], None]] = []
+
+    def add_unload_listener(self, listener: Callable[[AdapterHost, Optional[str]], None]):
+        self._unload_listeners.append(listener)
+
+    def _notify_unload(self, host: AdapterHost, adapter_dir: Optional[str]):
+        for listener in self._unload_listeners:
+            try:
+                listener(host, adapter_dir)
+            except Exception as e:
+                logger.error(f"Adapter unload listener failed: {str(e)}")
+
+    def view(self, adapter_dir: str) -> AdapterModelView:
+        base_path = adapter_base_path(adapter_dir)
+        replaced = None
+        with self._lock:
+            if self._host is None or self._host.base_path != base_path:
+                # View cũ vẫn giữ host cũ nên request đang chạy không bị ảnh hưởng
+                replaced = self._host
+                self._host = AdapterHost(base_path, on_unload=self._notify_unload)
+            host = self._host
+        if replaced is not None:
+            self._notify_unload(replaced, None)
+        started = time.perf_counter()
+        host.load_adapter(adapter_dir)
+        logger.info(f"Adapter {adapter_dir} ready on base {base_path} in "
+                    f"{(time.perf_counter() - started) * 1000:.1f}ms")
+        return AdapterModelView(host, adapter_dir)
+
+    def stats(self) -> Optional[Dict]:
+        host = self._host
+        return host.stats() if host else None
+
+
+adapter_hosts = AdapterHostPool()
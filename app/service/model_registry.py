@@ -0,0 +1,378 @@
+"""Process-wide registry holding the active tokenizer/model and other served versions in memory"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+
+from app.models.database import Model
+from app.repositories.model_repository import ModelRepository, MODEL_ARCHIVED, MODEL_EVICTED
+from app.service.lora_adapters import AdapterModelView, adapter_hosts, is_adapter_dir
+from app.service.model_store import model_store
+from app.service.onnx_backend import load_onnx, onnx_model_dir
+from app.service.quantization import load_quantized, quantized_weights_path
+from constant.constants import (
+    BACKEND_TORCH,
+    BACKEND_TORCH_INT8,
+    BACKEND_ONNX,
+    MODEL_RESIDENT_MAX_BYTES,
+    MODEL_RESIDENT_IDLE_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(eq=False)
+class LoadedModel:
+    model_id: str
+    name: str
+    version: str
+    model_path: str
+    tokenizer: object
+    model: object
+    load_duration: float
+    backend: str = BACKEND_TORCH
+    loaded_at: float = field(default_factory=time.time)
+    # Ước lượng bộ nhớ của weights, dùng cho ngân sách bộ nhớ của registry
+    memory_bytes: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+
+
+def _dir_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def estimate_memory_bytes(model, model_path: str, backend: str) -> int:
+    """
+    Bộ nhớ weights của model đã nạp. Model PyTorch tính theo parameter/buffer; int8 và
+    ONNX lấy kích thước artifact trên đĩa; adapter chỉ tính weights adapter, model gốc
+    dùng chung được registry tính một lần cho mỗi host (`AdapterHost.base_bytes`).
+    """
+    if isinstance(model, AdapterModelView):
+        return _dir_bytes(model_path)
+    if backend == BACKEND_TORCH_INT8:
+        # Weights int8 đóng gói không nằm trong parameters()
+        return os.path.getsize(quantized_weights_path(model_path))
+    if backend == BACKEND_ONNX:
+        return _dir_bytes(onnx_model_dir(model_path))
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+
+class ModelRegistry:
+    """
+    Giữ model đang active và các version khác được gọi đích danh trong bộ nhớ.
+
+    Các version đã nạp nằm trong một LRU giới hạn bởi `max_bytes`; version không được
+    dùng quá `idle_seconds` giây bị bỏ ở lần truy cập registry kế tiếp. Model active
+    không bao giờ bị bỏ, kể cả khi một mình nó đã vượt ngân sách. Version adapter bị
+    bỏ khỏi LRU khi `adapter_hosts` bỏ adapter đó hoặc thay model gốc.
+
+    Request lấy tham chiếu `LoadedModel` một lần rồi dùng đến hết, nên khi swap hoặc
+    bỏ khỏi LRU các request đang chạy vẫn hoàn thành trên weights cũ; weights cũ được
+    giải phóng khi không còn request nào giữ tham chiếu.
+    """
+
+    def __init__(self, max_bytes: int = MODEL_RESIDENT_MAX_BYTES,
+                 idle_seconds: float = MODEL_RESIDENT_IDLE_SECONDS):
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self._current: Optional[LoadedModel] = None
+        self._resident: "OrderedDict[str, LoadedModel]" = OrderedDict()  # model_id -> model, cuối là dùng gần nhất
+        self._lock = threading.Lock()
+        self._loading_id: Optional[str] = None
+        # Mỗi version chỉ nạp một lần dù nhiều request cùng gọi
+        self._load_locks: Dict[str, threading.Lock] = {}
+
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+        self.idle_evictions = 0
+        self.adapter_invalidations = 0
+        adapter_hosts.add_unload_listener(self._on_adapter_unloaded)
+
+    @property
+    def current(self) -> Optional[LoadedModel]:
+        return self._current
+
+    @staticmethod
+    def _is_current(loaded: Optional[LoadedModel], model_db: Model) -> bool:
+        return loaded is not None \
+            and loaded.model_id == model_db.id \
+            and loaded.model_path == model_db.model_path \
+            and loaded.backend == (model_db.backend or BACKEND_TORCH)
+
+    @staticmethod
+    def load(model_db: Model) -> LoadedModel:
+        started = time.perf_counter()
+        backend = model_db.backend or BACKEND_TORCH
+        tokenizer = AutoTokenizer.from_pretrained(model_db.model_path)
+        if backend == BACKEND_TORCH_INT8:
+            model = load_quantized(model_db.model_path)
+        elif backend == BACKEND_ONNX:
+            model = load_onnx(model_db.model_path)
+        elif is_adapter_dir(model_db.model_path):
+            # Adapter LoRA: dùng chung model gốc đang nằm trong bộ nhớ, chỉ nạp/bật adapter
+            model = adapter_hosts.view(model_db.model_path)
+        else:
+            model = AutoModelForSeq2SeqLM.from_pretrained(model_db.model_path)
+            model.eval()
+        duration = time.perf_counter() - started
+        logger.info(f"Loaded model {model_db.id} ({backend}) from {model_db.model_path} in {duration:.2f}s")
+        try:
+            model_store.record_load(model_db.model_path, duration, backend)
+        except OSError as e:
+            logger.warning(f"Could not record load time for {model_db.model_path}: {str(e)}")
+        return LoadedModel(
+            model_id=model_db.id,
+            name=model_db.name,
+            version=model_db.version,
+            model_path=model_db.model_path,
+            tokenizer=tokenizer,
+            model=model,
+            load_duration=duration,
+            backend=backend,
+            memory_bytes=estimate_memory_bytes(model, model_db.model_path, backend),
+        )
+
+    def _load_counted(self, model_db: Model) -> LoadedModel:
+        loaded = self.load(model_db)
+        with self._lock:
+            self.loads += 1
+        return loaded
+
+    def _touch_locked(self, loaded: LoadedModel):
+        loaded.last_used = time.monotonic()
+        if loaded.model_id in self._resident:
+            self._resident.move_to_end(loaded.model_id)
+
+    def _admit_locked(self, loaded: LoadedModel):
+        """Đưa version vừa nạp vào LRU (thay bản cũ của cùng model) rồi bỏ bớt cho vừa ngân sách."""
+        self._resident[loaded.model_id] = loaded
+        self._touch_locked(loaded)
+        self._evict_locked(keep=loaded.model_id)
+
+    def _evict_locked(self, keep: Optional[str] = None):
+        pinned = {keep, self._current.model_id if self._current else None}
+        if self.idle_seconds > 0:
+            now = time.monotonic()
+            idle = [model_id for model_id, loaded in self._resident.items()
+                    if model_id not in pinned and now - loaded.last_used > self.idle_seconds]
+            for model_id in idle:
+                self._resident.pop(model_id)
+                self.idle_evictions += 1
+                logger.info(f"Unloaded idle model {model_id}")
+
+        while self._resident_bytes_locked() > self.max_bytes:
+            victim = next((model_id for model_id in self._resident if model_id not in pinned), None)
+            if victim is None:
+                return
+            self._resident.pop(victim)
+            self.evictions += 1
+            logger.info(f"Unloaded model {victim} to stay within the {self.max_bytes} byte budget")
+
+    def _resident_bytes_locked(self) -> int:
+        # Model gốc của các adapter tính một lần cho mỗi host còn được view trong LRU giữ
+        hosts = {id(loaded.model.host): loaded.model.host for loaded in self._resident.values()
+                 if isinstance(loaded.model, AdapterModelView)}
+        return sum(loaded.memory_bytes for loaded in self._resident.values()) \
+            + sum(host.base_bytes for host in hosts.values())
+
+    def _on_adapter_unloaded(self, host, adapter_dir: Optional[str]):
+        """
+        Bỏ các version adapter dùng `host` (chỉ `adapter_dir`, hoặc tất cả khi host bị thay).
+        Model active được giữ: view của nó nạp lại adapter ở lần generate kế tiếp.
+        """
+        with self._lock:
+            current_id = self._current.model_id if self._current else None
+            stale = [
+                model_id for model_id, loaded in self._resident.items()
+                if model_id != current_id
+                and isinstance(loaded.model, AdapterModelView)
+                and loaded.model.host is host
+                and (adapter_dir is None or loaded.model.adapter_dir == adapter_dir)
+            ]
+            for model_id in stale:
+                self._resident.pop(model_id)
+                self.adapter_invalidations += 1
+        for model_id in stale:
+            logger.info(f"Unloaded adapter model {model_id} after its adapter host dropped it")
+
+    def _resident_for(self, model_db: Model) -> Optional[LoadedModel]:
+        with self._lock:
+            loaded = self._resident.get(model_db.id)
+            if not self._is_current(loaded, model_db):
+                return None
+            self._touch_locked(loaded)
+            self.hits += 1
+            return loaded
+
+    def swap(self, loaded: LoadedModel, only_if_pending: bool = False) -> bool:
+        with self._lock:
+            if only_if_pending and self._loading_id != loaded.model_id:
+                # Trong lúc load đã có model khác được activate
+                logger.info(f"Discarding preloaded model {loaded.model_id}, superseded by a newer activation")
+                return False
+            previous = self._current
+            self._current = loaded
+            if self._loading_id == loaded.model_id:
+                self._loading_id = None
+            # Model active cũ vẫn nằm trong LRU như một version thường cho tới khi bị bỏ
+            self._admit_locked(loaded)
+        if previous is not None and previous.model_id != loaded.model_id:
+            logger.info(f"Swapped active model {previous.model_id} -> {loaded.model_id}")
+        return True
+
+    def preload_async(self, model_db: Model) -> bool:
+        """Load model ở background thread rồi swap; bỏ qua nếu đang load hoặc đã load model này."""
+        with self._lock:
+            if self._loading_id == model_db.id:
+                return False
+            if self._is_current(self._current, model_db):
+                return False
+
+        # Version đã nằm trong LRU (ví dụ vừa được gọi đích danh) thì swap ngay, không nạp lại
+        resident = self._resident_for(model_db)
+        if resident is not None:
+            return self.swap(resident)
+
+        with self._lock:
+            if self._loading_id == model_db.id:
+                return False
+            self._loading_id = model_db.id
+
+        # Copy các thuộc tính cần thiết để không dùng ORM object ngoài session của nó
+        snapshot = Model(
+            id=model_db.id,
+            name=model_db.name,
+            version=model_db.version,
+            model_path=model_db.model_path,
+            backend=model_db.backend,
+        )
+
+        def _worker():
+            try:
+                self.swap(self._load_counted(snapshot), only_if_pending=True)
+            except Exception as e:
+                logger.error(f"Preloading model {snapshot.id} failed: {str(e)}")
+                with self._lock:
+                    if self._loading_id == snapshot.id:
+                        self._loading_id = None
+
+        threading.Thread(target=_worker, name=f"model-preload-{snapshot.id}", daemon=True).start()
+        return True
+
+    def get_active(self, model_repository: ModelRepository) -> LoadedModel:
+        """
+        Trả về model active đang nằm trong bộ nhớ.
+
+        Nếu model active trong DB khác model đang load (ví dụ được activate từ
+        worker khác), request hiện tại vẫn dùng model cũ và việc load model mới
+        chạy ở background. Chỉ khi chưa có model nào trong bộ nhớ thì mới load đồng bộ.
+        """
+        model_db = model_repository.get_active_model()
+        if model_db is None:
+            raise ValueError("No active model found.")
+
+        current = self._current
+        if current is not None:
+            if not self._is_current(current, model_db):
+                self.preload_async(model_db)
+            with self._lock:
+                self._touch_locked(current)
+            return current
+
+        with self._load_lock_for(model_db.id):
+            current = self._current
+            if current is None:
+                current = self._resident_for(model_db) or self._load_counted(model_db)
+                self.swap(current)
+        return current
+
+    def _load_lock_for(self, model_id: str) -> threading.Lock:
+        with self._lock:
+            return self._load_locks.setdefault(model_id, threading.Lock())
+
+    def get(self, model_repository: ModelRepository, model_id: Optional[str] = None,
+            version: Optional[str] = None) -> LoadedModel:
+        """
+        Model theo `model_id` và/hoặc `version`; không truyền gì thì là model active.
+        Version chưa có trong bộ nhớ được nạp đồng bộ (mỗi version chỉ nạp một lần dù
+        nhiều request cùng chờ) rồi đưa vào LRU.
+        """
+        if model_id is None and version is None:
+            return self.get_active(model_repository)
+
+        if model_id is not None:
+            model_db = model_repository.get_by_id(model_id)
+        else:
+            # Version đánh số theo từng tên model nên chỉ dùng được khi khớp đúng một model
+            matches = model_repository.list_by_version(version)
+            if len(matches) > 1:
+                raise ValueError(
+                    f"Version {version} matches {len(matches)} models "
+                    f"({', '.join(model.id for model in matches)}), pass model_id."
+                )
+            model_db = matches[0] if matches else None
+        if model_db is None:
+            raise ValueError(f"Model {model_id or version} not found.")
+        if version is not None and model_db.version != version:
+            raise ValueError(f"Model {model_id} has version {model_db.version}, not {version}.")
+        if model_db.status in (MODEL_ARCHIVED, MODEL_EVICTED):
+            raise ValueError(f"Model {model_db.id} is {model_db.status} and cannot be served, activate it to restore.")
+        if model_db.is_active:
+            return self.get_active(model_repository)
+
+        loaded = self._resident_for(model_db)
+        if loaded is not None:
+            return loaded
+        with self._load_lock_for(model_db.id):
+            loaded = self._resident_for(model_db)
+            if loaded is None:
+                loaded = self._load_counted(model_db)
+                with self._lock:
+                    self._admit_locked(loaded)
+        return loaded
+
+    def resident(self) -> List[LoadedModel]:
+        with self._lock:
+            return list(self._resident.values())
+
+    def stats(self) -> Dict:
+        with self._lock:
+            # Dọn version idle cả khi không có request nào gọi tới chúng
+            self._evict_locked()
+            now = time.monotonic()
+            current_id = self._current.model_id if self._current else None
+            return {
+                "max_bytes": self.max_bytes,
+                "idle_seconds": self.idle_seconds,
+                "resident_bytes": self._resident_bytes_locked(),
+                "resident": [
+                    {
+                        "model_id": loaded.model_id,
+                        "version": loaded.version,
+                        "backend": loaded.backend,
+                        "memory_bytes": loaded.memory_bytes,
+                        "idle_seconds": round(now - loaded.last_used, 1),
+                        "active": loaded.model_id == current_id,
+                    }
+                    for loaded in reversed(self._resident.values())
+                ],
+                "loads": self.loads,
+                "hits": self.hits,
+                "evictions": self.evictions,
+                "idle_evictions": self.idle_evictions,
+                "adapter_invalidations": self.adapter_invalidations,
+            }
+
+
+model_registry = ModelRegistry()
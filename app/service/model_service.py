@@ -1,63 +1,122 @@
 from datetime import datetime
+import dataclasses
+import itertools
 import json
 import os
-import random
+import time
+import uuid
 
 import torch
 import numpy as np
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, Trainer
-from typing import Dict, Optional
+from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, DataCollatorForSeq2Seq
+from typing import Dict, Optional, Set
 from rouge_score import rouge_scorer
 
 from app.models.database import Model
 from app.repositories.sample_repository import SampleRepository
 from app.schemas.model_schemas import ModelVersionResponse
-from constant.constants import default_training_args
-from app.repositories.model_repository import ModelRepository
+from constant.constants import (
+    default_training_args,
+    SERVING_BACKENDS,
+    BACKEND_TORCH,
+    BACKEND_TORCH_INT8,
+    BACKEND_ONNX,
+    QUANTIZATION_EVAL_SAMPLES,
+    EVAL_DECODING_PROFILE,
+    TRAIN_MAX_INPUT_TOKENS,
+    TRAIN_MAX_TARGET_TOKENS,
+    TRAIN_MAX_TOKENS_PER_BATCH,
+    TRAIN_MAX_BATCH_SIZE,
+    EVAL_BATCH_SIZE,
+    EVAL_NUM_WORKERS,
+    LORA_LEARNING_RATE,
+    MODEL_STORE_DIR,
+    MODEL_RETENTION_KEEP_RECENT,
+    MODEL_RETENTION_MODE,
+    MODEL_RETENTION_AUTO,
+    MODEL_RETENTION_ORPHAN_HOURS,
+)
+from app.repositories.model_repository import ModelRepository, MODEL_COMPLETED, MODEL_ARCHIVED, MODEL_EVICTED
+from app.repositories.training_job_repository import TrainingJobRepository, JOB_COMPLETED
+from app.service.decoding_profiles import get_profile
+from app.service.eval_generation import generate_predictions, row_max_new_tokens, unpadded_input_ids
+from app.service.model_registry import model_registry
+from app.service.onnx_backend import ONNX_SUBDIR, export_onnx, onnx_model_dir
+from app.service.quantization import quantize_dynamic_int8, save_quantized, quantized_weights_path
+from app.service.tokenized_sample_store import TokenizedSampleStore
+from app.service.lora_adapters import adapter_base_path, is_adapter_dir, load_model_for_training
+from app.service.model_store import model_store
+from app.service.shadow_traffic import shadow_traffic
+from app.service.training_checkpoints import (
+    checkpoint_dir_for_run,
+    early_stopping_callbacks,
+    latest_checkpoint,
+    remove_checkpoints,
+    training_args_for_run,
+)
+from app.service.training_batching import (
+    TokenBudgetBatchSampler,
+    TokenBudgetTrainer,
+    StepTimer,
+    padding_report,
+    throughput_report,
+)
 from app.schemas import TrainRequest, ModelMetrics
 import logging
-from datasets import load_dataset
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+ROUGE_METRIC_KEYS = ("accuracy", "precision", "recall", "f1_score")
+# Thư mục version do train_model tạo: model_<tên>_<version>
+VERSION_DIR_PREFIX = "model_"
+RETENTION_MODES = ("compress", "evict")
+
 
 class ModelService:
     def __init__(self, repository: ModelRepository, sample_repository: SampleRepository):
         self.repository = repository
         self.sample_repository = sample_repository
-        self.model_base_path = "./models_versions"
+        self.model_base_path = MODEL_STORE_DIR
         os.makedirs(self.model_base_path, exist_ok=True)
 
     @staticmethod
-    def compute_metrics(model, tokenizer, eval_dataset) -> Dict:
-        logger.info("Computing metrics...")
+    def compute_metrics(model, tokenizer, eval_dataset, device=None, profile: Optional[str] = None,
+                        batch_size: int = EVAL_BATCH_SIZE, num_workers: int = EVAL_NUM_WORKERS,
+                        model_path: Optional[str] = None) -> Dict:
+        """
+        Đánh giá với cùng profile decoding như khi serve (mặc định EVAL_DECODING_PROFILE).
+        Generate theo batch đã sắp theo độ dài; `num_workers > 1` chia batch cho các
+        process CPU, mỗi process nạp model từ `model_path`.
+        """
+        profile = profile or EVAL_DECODING_PROFILE
+        logger.info(f"Computing metrics (decoding profile: {profile}, batch size: {batch_size})...")
+        started = time.perf_counter()
         model.eval()
-        predictions = []
-        references = []
-        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        if device is None:
+            device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         model.to(device)
-        
-        # Generate predictions for eval dataset
+
+        inputs = []
+        row_limits = []
+        references = []
+        num_beams = get_profile(profile).num_beams
         for i in range(len(eval_dataset)):
             example = eval_dataset[i]
-            input_ids = torch.tensor([example['input_ids']]).to(device)
-            attention_mask = torch.tensor([example['attention_mask']]).to(device)
-            
-            with torch.no_grad():
-                outputs = model.generate(
-                    input_ids=input_ids,
-                    attention_mask=attention_mask,
-                    max_length=150,
-                    num_beams=4,
-                    early_stopping=True
-                )
-            
-            pred_text = tokenizer.decode(outputs[0], skip_special_tokens=True)
-            ref_text = tokenizer.decode(example['labels'], skip_special_tokens=True)
-            predictions.append(pred_text)
-            references.append(ref_text)
-        
+            input_ids = unpadded_input_ids(example)
+            inputs.append(input_ids)
+            # Một nửa số dòng là dòng sinh title, dùng giới hạn của title
+            row_limits.append(row_max_new_tokens(tokenizer, input_ids, profile))
+            labels = [token if token != -100 else tokenizer.pad_token_id for token in example['labels']]
+            references.append(tokenizer.decode(labels, skip_special_tokens=True))
+
+        # Generate predictions for eval dataset
+        outputs = generate_predictions(
+            model, inputs, row_limits, num_beams, tokenizer.pad_token_id, device,
+            batch_size=batch_size, num_workers=num_workers, model_path=model_path,
+        )
+        predictions = tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
         # Calculate ROUGE scores
         scorer = rouge_scorer.RougeScorer(['rouge1', 'rouge2', 'rougeL'], use_stemmer=True)
         rouge_scores = []
@@ -72,21 +131,112 @@ class ModelService:
         rouge_l_recall = np.mean([score['rougeL'].recall for score in rouge_scores])
         
         # Metrics
+        eval_seconds = time.perf_counter() - started
         metrics = {
             "accuracy": float(rouge_1_f1),         
             "f1_score": float(rouge_l_f1),
             "precision": float(rouge_l_precision),
             "recall": float(rouge_l_recall),
+            "eval_examples": len(inputs),
+            "eval_seconds": round(eval_seconds, 2),
+            "eval_examples_per_sec": round(len(inputs) / eval_seconds, 2) if eval_seconds else 0.0,
         }
 
         logger.info(f"Metrics computed - Accuracy: {metrics['accuracy']:.4f}, "
                    f"Precision: {metrics['precision']:.4f}, "
                    f"Recall: {metrics['recall']:.4f}, "
-                   f"F1: {metrics['f1_score']:.4f}")
+                   f"F1: {metrics['f1_score']:.4f}, "
+                   f"{metrics['eval_examples']} examples in {metrics['eval_seconds']}s "
+                   f"({metrics['eval_examples_per_sec']} examples/s)")
 
         return metrics
 
-    def train_model(self, train_request: TrainRequest) -> Dict:
+    @staticmethod
+    def _build_trainer(model, tokenizer, samples, training_args, callbacks: list):
+        """Dataset từ cache token, chia train/eval, batch sampler theo ngân sách token và Trainer."""
+        # Chỉ tokenize sample mới hoặc đã sửa, phần còn lại đọc từ cache memory-mapped.
+        # Nhiều process: process chính của mỗi máy cập nhật cache trước, các process khác chỉ đọc
+        with training_args.main_process_first(desc="tokenize samples"):
+            dataset, cache_stats = TokenizedSampleStore(tokenizer).build(samples, pad_to_max_length=False)
+        logger.info(f"Tokenized {cache_stats['misses']} new/edited samples, "
+                    f"reused {cache_stats['hits']} from cache in {cache_stats['total_seconds']}s")
+
+        #chia dataset thành tập train, eval (seed cố định để resume và các process dùng đúng cùng tập)
+        tokenized_train, tokenized_eval = dataset.train_test_split(test_size=0.1, seed=training_args.seed)
+
+        # Batch theo ngân sách token, pad động theo batch và label pad = -100 để không tính vào loss
+        batch_sampler = TokenBudgetBatchSampler(
+            tokenized_train.input_lengths,
+            tokenized_train.label_lengths,
+            max_tokens=TRAIN_MAX_TOKENS_PER_BATCH,
+            max_batch_size=TRAIN_MAX_BATCH_SIZE,
+            seed=training_args.seed,
+        )
+        padding_stats = padding_report(
+            tokenized_train.input_lengths,
+            tokenized_train.label_lengths,
+            batch_sampler.batches(),
+            TRAIN_MAX_INPUT_TOKENS,
+            TRAIN_MAX_TARGET_TOKENS,
+        )
+        logger.info(f"Padding report: {padding_stats}")
+
+        trainer = TokenBudgetTrainer(
+            model=model,
+            args=training_args,
+            train_dataset=tokenized_train,
+            eval_dataset=tokenized_eval,
+            data_collator=DataCollatorForSeq2Seq(tokenizer, model=model, label_pad_token_id=-100),
+            batch_sampler=batch_sampler,
+            callbacks=callbacks,
+        )
+        return trainer, tokenized_eval, padding_stats
+
+    def benchmark_training(self, model_path: str, max_steps: int, sample_limit: Optional[int] = None) -> Optional[Dict]:
+        """
+        Train `max_steps` step (không eval, không checkpoint) để đo samples/s của cấu hình
+        process hiện tại. Batch có kích thước thay đổi theo ngân sách token nên số sample
+        được ước tính bằng batch size trung bình; step đầu (khởi tạo) không được tính.
+        Chỉ process chính trả về kết quả.
+        """
+        tokenizer = AutoTokenizer.from_pretrained(model_path)
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_path)
+        output_dir = checkpoint_dir_for_run(f"benchmark_{uuid.uuid4().hex[:8]}")
+        training_args = dataclasses.replace(
+            training_args_for_run(output_dir),
+            max_steps=max_steps,
+            eval_strategy="no",
+            save_strategy="no",
+            load_best_model_at_end=False,
+            logging_steps=max_steps,
+            report_to=[],
+        )
+        samples = self.sample_repository.iter_training_rows([], True)
+        if sample_limit:
+            samples = itertools.islice(samples, sample_limit)
+        timer = StepTimer()
+        trainer, _, padding_stats = self._build_trainer(model, tokenizer, samples, training_args, [timer])
+        trainer.train()
+        if not trainer.is_world_process_zero():
+            return None
+        remove_checkpoints(output_dir)
+
+        samples_per_step = (padding_stats["avg_batch_size"] * training_args.gradient_accumulation_steps
+                            * training_args.world_size)
+        timed_steps = max(0, len(timer.step_times) - 1)
+        elapsed = timer.step_times[-1] - timer.step_times[0] if timed_steps else 0.0
+        samples_per_sec = samples_per_step * timed_steps / elapsed if elapsed > 0 else 0.0
+        return {
+            "world_size": training_args.world_size,
+            "threads_per_worker": torch.get_num_threads(),
+            "steps": timed_steps,
+            "seconds": round(elapsed, 3),
+            "samples_per_step": round(samples_per_step, 2),
+            "samples_per_sec": round(samples_per_sec, 3),
+        }
+
+    def train_model(self, train_request: TrainRequest, callbacks: Optional[list] = None,
+                    checkpoint_dir: Optional[str] = None) -> Dict:
         model_name = "VietAI/vit5-base"
 
         version = 1
@@ -96,6 +246,7 @@ class ModelService:
             if not base_model:
                 raise ValueError(f"Base model {train_request.id} not found for retraining.")
     
+            self._ensure_on_disk(base_model)
             version = base_model.version + 1
             model_name = base_model.model_path
             logger.info(f"Retraining model version: {train_request.id}, new version: {version}")
@@ -106,66 +257,64 @@ class ModelService:
             if not base_model:
                 raise ValueError(f"Base model {train_request.base_model_id} not found for training.")
             logger.info(f"Training from base model: {train_request.base_model_id}")
+            self._ensure_on_disk(base_model)
             model_name = base_model.model_path
 
         
 
         logger.info(f"Starting traininG")
 
-        # Load tokenizer và model model
+        # Load tokenizer và model model (LoRA: model gốc bọc adapter, chỉ adapter được train)
         tokenizer = AutoTokenizer.from_pretrained(model_name)
-        model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
-
-
-        dataset_file_path = self.build_dataset_from_samples(train_request.sample_ids, is_select_all=train_request.is_select_all)
-
-        dataset = load_dataset("json", data_files={"train": dataset_file_path})["train"]
-
-        #chia dataset thành tập train, eval
-        split_dataset = dataset.train_test_split(test_size=0.1)
-        train_dataset = split_dataset["train"]
-        eval_dataset = split_dataset["test"]
-
-        # hàm tiền xử lý dữ liệu
-        def preprocess(examples):
-            inputs = examples['text']
-            model_inputs = tokenizer(inputs, max_length=512, truncation=True, padding="max_length")
-
-            with tokenizer.as_target_tokenizer():
-                labels = tokenizer(examples['target'], max_length=256, truncation=True, padding="max_length")
-
-            model_inputs["labels"] = labels["input_ids"]
-            return model_inputs
-
-        tokenized_train = train_dataset.map(preprocess, batched=True)
-        tokenized_eval = eval_dataset.map(preprocess, batched=True)
-
-        # Training
-        trainer = Trainer(
-            model=model,
-            args=default_training_args,
-            train_dataset=tokenized_train,
-            eval_dataset=tokenized_eval,
+        model = load_model_for_training(model_name, train_request.use_lora)
+        if train_request.use_lora:
+            trainable, total = model.get_nb_trainable_parameters()
+            logger.info(f"LoRA training {trainable}/{total} parameters ({100 * trainable / total:.2f}%)")
+
+
+        # Checkpoint theo từng lần train; cùng checkpoint_dir (ví dụ job chạy lại) thì resume
+        checkpoint_dir = checkpoint_dir or checkpoint_dir_for_run(f"run_{uuid.uuid4().hex[:8]}")
+        resume_from = latest_checkpoint(checkpoint_dir)
+        # Khi chạy nhiều process (RANK/WORLD_SIZE trong env) TrainingArguments khởi tạo process group gloo
+        training_args = training_args_for_run(checkpoint_dir)
+        if train_request.use_lora:
+            training_args = dataclasses.replace(training_args, learning_rate=LORA_LEARNING_RATE)
+
+        samples = self.sample_repository.iter_training_rows(train_request.sample_ids, train_request.is_select_all)
+        trainer, tokenized_eval, padding_stats = self._build_trainer(
+            model, tokenizer, samples, training_args, early_stopping_callbacks() + list(callbacks or []),
         )
 
-        logger.info("Starting training...")
-        trainer.train()
+        if resume_from:
+            logger.info(f"Resuming training from {resume_from}")
+        else:
+            logger.info(f"Starting training on {training_args.world_size} process(es)...")
+        train_output = trainer.train(resume_from_checkpoint=resume_from)
+        logger.info(f"Throughput report: "
+                    f"{throughput_report(padding_stats, train_output.metrics.get('train_runtime', 0.0), trainer.state.epoch or 0.0)}")
+        if trainer.state.global_step < trainer.state.max_steps:
+            logger.info(f"Early stopped at step {trainer.state.global_step}/{trainer.state.max_steps}, "
+                        f"best checkpoint {trainer.state.best_model_checkpoint} "
+                        f"(eval_loss={trainer.state.best_metric})")
         logger.info("Training completed. Saving model...")
 
-        # Save model vào server
-        model_save_path = os.path.join(self.model_base_path, f"model_{train_request.model_name}_{version}")
-        os.makedirs(model_save_path, exist_ok=True)
-        trainer.save_model(model_save_path)
-        tokenizer.save_pretrained(model_save_path)
+        # Save model vào server (Trainer chỉ ghi ở process chính; LoRA chỉ ghi weights adapter).
+        # Ghi vào staging rồi commit vào kho artifact: file trùng với version khác chỉ lưu một lần
+        model_save_path = os.path.join(self.model_base_path, f"{VERSION_DIR_PREFIX}{train_request.model_name}_{version}")
+        staging_dir = model_store.staging_dir() if trainer.is_world_process_zero() else None
+        trainer.save_model(staging_dir)
+        if not trainer.is_world_process_zero():
+            return None
+        tokenizer.save_pretrained(staging_dir)
+        model_store.commit(staging_dir, model_save_path)
         logger.info(f"Model saved to {model_save_path}")
+        remove_checkpoints(checkpoint_dir)
 
         # tính metrics
         logger.info("Computing metrics on evaluation dataset...")
-        metrics = self.compute_metrics(model, tokenizer, tokenized_eval)
+        metrics = self.compute_metrics(model, tokenizer, tokenized_eval, model_path=model_save_path)
 
         logger.info(f"Training completed for version: {version}")
-        # clear file dataset tạm
-        os.remove(dataset_file_path)
         if not train_request.is_retrain:
             return ModelVersionResponse(
                 id=None,
@@ -180,7 +329,10 @@ class ModelService:
                 base_model_id=None,
                 sample_ids=train_request.sample_ids,
                 is_select_all=train_request.is_select_all,
-                is_retrain=False
+                is_retrain=False,
+                eval_seconds=metrics["eval_seconds"],
+                eval_examples_per_sec=metrics["eval_examples_per_sec"],
+                use_lora=train_request.use_lora,
             )
         else:
             return ModelVersionResponse(
@@ -196,7 +348,10 @@ class ModelService:
                 base_model_id=base_model.base_model_id,
                 sample_ids=train_request.sample_ids,
                 is_select_all=train_request.is_select_all,
-                is_retrain=True
+                is_retrain=True,
+                eval_seconds=metrics["eval_seconds"],
+                eval_examples_per_sec=metrics["eval_examples_per_sec"],
+                use_lora=train_request.use_lora,
             )
 
         # # set active nếu là model đầu tiên
@@ -223,35 +378,142 @@ class ModelService:
         model = self.repository.get_by_id(model_id)
         if not model:
             raise ValueError(f"Model with ID {model_id} not found.")
-        
+        self._ensure_on_disk(model)
+
         self.repository.set_active(model)
+        # Load trước ở background, swap khi xong để request đang chạy không bị ảnh hưởng
+        model_registry.preload_async(model)
         return True
 
-    def build_dataset_from_samples(self, sample_ids: list[str], is_select_all: bool) -> str:
-        sample = []
-        if is_select_all:
-            samples = self.sample_repository.get_if_not_in_ids(sample_ids)
-        else:
-            samples = self.sample_repository.get_by_ids(sample_ids)
-        dataset_path = f"./temp_dataset_{random.randint(1000, 9999)}.json"
+    def set_backend(self, model_id: str, backend: str) -> bool:
+        """Chọn backend serve cho một version; reload ngay nếu đó là model active."""
+        if backend not in SERVING_BACKENDS:
+            raise ValueError(f"Unsupported backend {backend}, expected one of {SERVING_BACKENDS}.")
+        model = self.repository.get_by_id(model_id)
+        if not model:
+            raise ValueError(f"Model with ID {model_id} not found.")
+        self._ensure_on_disk(model)
+        if backend != BACKEND_TORCH and is_adapter_dir(model.model_path):
+            raise ValueError(f"Model {model_id} is a LoRA adapter version and is served on the torch backend only.")
+        if backend == BACKEND_TORCH_INT8 and not os.path.exists(quantized_weights_path(model.model_path)):
+            raise ValueError(f"Model {model_id} has no int8 artifact, run quantization first.")
+        if backend == BACKEND_ONNX and not os.path.isdir(onnx_model_dir(model.model_path)):
+            raise ValueError(f"Model {model_id} has no ONNX export, run the export first.")
+
+        model.backend = backend
+        self.repository.save(model)
+        if model.is_active:
+            model_registry.preload_async(model)
+        return True
 
+    def start_shadow(self, model_id: str, fraction: float) -> Dict:
+        """Mirror `fraction` request /summarize sang version `model_id` để so với model active trước khi activate."""
+        model = self.repository.get_by_id(model_id)
+        if not model:
+            raise ValueError(f"Model with ID {model_id} not found.")
+        if model.is_active:
+            raise ValueError(f"Model {model_id} is already active.")
+        self._ensure_on_disk(model)
+        shadow_traffic.configure(model.id, fraction)
+        return shadow_traffic.stats()
+
+    def export_onnx(self, model_id: str) -> Dict:
+        """Export version sang ONNX để có thể chọn backend `onnx` khi serve."""
+        model_db = self.repository.get_by_id(model_id)
+        if not model_db:
+            raise ValueError(f"Model with ID {model_id} not found.")
+        self._ensure_on_disk(model_db)
+        if is_adapter_dir(model_db.model_path):
+            raise ValueError(f"Model {model_id} is a LoRA adapter version, ONNX export needs a full model.")
+
+        started = time.perf_counter()
+        # Export vào staging rồi commit lại version: tokenizer/config của bản ONNX trùng với version
+        exported = export_onnx(model_db.model_path, model_store.staging_dir())
+        model_store.replace_subdir(model_db.model_path, ONNX_SUBDIR, exported)
+        output_dir = onnx_model_dir(model_db.model_path)
+        return {
+            "model_id": model_id,
+            "onnx_path": output_dir,
+            "files": sorted(name for name in os.listdir(output_dir) if name.endswith(".onnx")),
+            "export_seconds": round(time.perf_counter() - started, 2),
+        }
 
-        with open(dataset_path, "w", encoding="utf-8") as f:
-            for sample in samples:
-                record1 = {
-                    "text": f"title: {sample.input_text}",
-                    "target": sample.title,
-                }
-                record2 = {
-                    "text": f"summarize: {sample.input_text}",
-                    "target": sample.target_summary,
-                }
-                f.write(json.dumps(record1, ensure_ascii=False) + "\n")
-                f.write(json.dumps(record2, ensure_ascii=False) + "\n")
+    def quantize_model(self, model_id: str) -> Dict:
+        """
+        Quantize dynamic int8 các lớp Linear, lưu artifact cạnh model fp32 và ghi lại
+        chênh lệch ROUGE và latency so với fp32 trên các sample của chính version đó.
+        """
+        model_db = self.repository.get_by_id(model_id)
+        if not model_db:
+            raise ValueError(f"Model with ID {model_id} not found.")
+        self._ensure_on_disk(model_db)
+        if is_adapter_dir(model_db.model_path):
+            raise ValueError(f"Model {model_id} is a LoRA adapter version, int8 quantization needs a full model.")
+
+        tokenizer = AutoTokenizer.from_pretrained(model_db.model_path)
+        fp32_model = AutoModelForSeq2SeqLM.from_pretrained(model_db.model_path)
+        eval_dataset = self.build_eval_examples(model_id, tokenizer, QUANTIZATION_EVAL_SAMPLES)
+        if not eval_dataset:
+            raise ValueError(f"Model {model_id} has no samples to evaluate quantization on.")
+
+        # int8 dynamic quantization chỉ chạy trên CPU, đo cả hai bản trên CPU để so sánh công bằng
+        cpu = torch.device("cpu")
+        fp32_metrics, fp32_seconds = self._timed_metrics(fp32_model, tokenizer, eval_dataset, cpu)
+
+        int8_model = quantize_dynamic_int8(fp32_model)
+        artifact_path = save_quantized(int8_model, model_db.model_path)
+        model_store.ingest(model_db.model_path)
+        int8_metrics, int8_seconds = self._timed_metrics(int8_model, tokenizer, eval_dataset, cpu)
+
+        fp32_size = sum(
+            os.path.getsize(os.path.join(model_db.model_path, name))
+            for name in os.listdir(model_db.model_path)
+            if name.endswith((".bin", ".safetensors")) and os.path.isfile(os.path.join(model_db.model_path, name))
+        )
+        report = {
+            "eval_examples": len(eval_dataset),
+            "artifact_path": artifact_path,
+            "fp32": {**fp32_metrics, "latency_ms_per_example": round(fp32_seconds * 1000 / len(eval_dataset), 2)},
+            "int8": {**int8_metrics, "latency_ms_per_example": round(int8_seconds * 1000 / len(eval_dataset), 2)},
+            "rouge_delta": {key: int8_metrics[key] - fp32_metrics[key] for key in ROUGE_METRIC_KEYS},
+            "latency_speedup": round(fp32_seconds / int8_seconds, 3) if int8_seconds else None,
+            "fp32_size_mb": round(fp32_size / 1024 / 1024, 2),
+            "int8_size_mb": round(os.path.getsize(artifact_path) / 1024 / 1024, 2),
+            "created_at": datetime.now().isoformat(),
+        }
 
-        return dataset_path
+        model_db.quantization_report = json.dumps(report)
+        self.repository.save(model_db)
+        logger.info(f"Quantized model {model_id}: speedup {report['latency_speedup']}x, "
+                    f"ROUGE-L F1 delta {report['rouge_delta']['f1_score']:.4f}")
+        return report
+
+    def _timed_metrics(self, model, tokenizer, eval_dataset, device):
+        started = time.perf_counter()
+        metrics = self.compute_metrics(model, tokenizer, eval_dataset, device=device)
+        return metrics, time.perf_counter() - started
+
+    def build_eval_examples(self, model_id: str, tokenizer, limit: int) -> list:
+        """Tokenize các sample của một version theo đúng format lúc train (title/summarize)."""
+        examples = []
+        for sample in self.sample_repository.get_by_model(model_id, limit=limit):
+            for prompt, target in (
+                (f"title: {sample.input_text}", sample.title),
+                (f"summarize: {sample.input_text}", sample.target_summary),
+            ):
+                inputs = tokenizer(prompt, max_length=512, truncation=True)
+                labels = tokenizer(text_target=target, max_length=256, truncation=True)
+                examples.append({
+                    "input_ids": inputs["input_ids"],
+                    "attention_mask": inputs["attention_mask"],
+                    "labels": labels["input_ids"],
+                })
+        return examples
 
     def save_model(self, model_data: dict) -> bool:
+        model_path = model_data.get("model_path")
+        if not model_path or not os.path.isdir(model_path):
+            raise ValueError(f"Model directory {model_path} does not exist, train the model again.")
         if not model_data.get("is_retrain"):
             model_version = self.repository.insert(
                 Model(
@@ -262,6 +524,8 @@ class ModelService:
                     precision=model_data.get("precision"),
                     recall=model_data.get("recall"),
                     f1_score=model_data.get("f1_score"),
+                    eval_seconds=model_data.get("eval_seconds"),
+                    eval_examples_per_sec=model_data.get("eval_examples_per_sec"),
                     status="completed",
                     is_active=False,
                     base_model_id=model_data.get("base_model_id"),
@@ -277,10 +541,171 @@ class ModelService:
             base_model.precision = model_data.get("precision")
             base_model.recall = model_data.get("recall")
             base_model.f1_score = model_data.get("f1_score")
+            base_model.eval_seconds = model_data.get("eval_seconds")
+            base_model.eval_examples_per_sec = model_data.get("eval_examples_per_sec")
             base_model.status = "completed"
             base_model.created_at = datetime.now()
 
             model_version = self.repository.update(
                 base_model, model_data.get("sample_ids"), is_select_all=model_data.get("is_select_all")
             )
+        if MODEL_RETENTION_AUTO:
+            try:
+                self.apply_retention()
+            except Exception as e:
+                logger.error(f"Model retention failed: {str(e)}")
         return True
+
+    def _ensure_on_disk(self, model: Model):
+        """Version đã bị retention nén thì giải nén lại trước khi dùng; đã bị xoá thì báo lỗi."""
+        if model.status == MODEL_EVICTED:
+            raise ValueError(f"Model {model.id} was evicted by the retention policy, its files no longer exist.")
+        if model.status == MODEL_ARCHIVED:
+            model_store.restore(model.model_path)
+            model.status = MODEL_COMPLETED
+            self.repository.save(model)
+
+    def list_version_dirs(self) -> Dict[str, str]:
+        """Thư mục version trên đĩa (abspath -> path), không gồm blobs/archive/staging."""
+        if not os.path.isdir(self.model_base_path):
+            return {}
+        dirs = {}
+        for name in os.listdir(self.model_base_path):
+            path = os.path.join(self.model_base_path, name)
+            if name.startswith(VERSION_DIR_PREFIX) and ".tmp-" not in name and ".old-" not in name \
+                    and os.path.isdir(path):
+                dirs[os.path.abspath(path)] = path
+        return dirs
+
+    def _retention_protection(self, models: list, version_dirs: Dict[str, str], keep_recent: int):
+        """
+        Lý do giữ lại từng version (active, làm gốc cho version khác, nằm trong `keep_recent`
+        bản mới nhất) và tập thư mục làm model gốc cho adapter LoRA.
+        """
+        adapter_bases = {
+            os.path.abspath(adapter_base_path(path)) for path in version_dirs.values() if is_adapter_dir(path)
+        }
+        referenced = {model.base_model_id for model in models if model.base_model_id}
+        recent = [model.id for model in models if model.status == MODEL_COMPLETED][:max(0, keep_recent)]
+        reasons = {}
+        for model in models:
+            reasons[model.id] = [reason for reason, matched in (
+                ("active", model.is_active),
+                ("base", model.id in referenced),
+                ("adapter_base", os.path.abspath(model.model_path) in adapter_bases),
+                ("recent", model.id in recent),
+            ) if matched]
+        return reasons, adapter_bases
+
+    def apply_retention(self, dry_run: bool = False, keep_recent: int = MODEL_RETENTION_KEEP_RECENT,
+                        mode: str = MODEL_RETENTION_MODE) -> Dict:
+        """
+        Dọn version không còn dùng. Version completed không được bảo vệ (xem
+        `_retention_protection`) được nén vào archive/ (`compress`, activate sẽ giải nén
+        lại) hoặc xoá (`evict`). Thư mục version không thuộc model nào (bản cũ sau khi
+        retrain) quá MODEL_RETENTION_ORPHAN_HOURS giờ bị xoá; kết quả của job train đã
+        xong nhưng chưa lưu qua /model/save được giữ lại.
+        Cuối cùng xoá blob không còn version nào dùng.
+        """
+        if mode not in RETENTION_MODES:
+            raise ValueError(f"Unsupported retention mode {mode}, expected one of {RETENTION_MODES}.")
+        models = self.repository.list_versions()
+        version_dirs = self.list_version_dirs()
+        protection, adapter_bases = self._retention_protection(models, version_dirs, keep_recent)
+
+        actions = []
+        for model in models:
+            if protection[model.id] or model.status != MODEL_COMPLETED or not os.path.isdir(model.model_path):
+                continue
+            actions.append({
+                "model_id": model.id,
+                "model_path": model.model_path,
+                "action": mode,
+                "freed_bytes": model_store.usage(model.model_path)["unique_bytes"],
+            })
+        known = {os.path.abspath(model.model_path) for model in models} | self._job_result_paths()
+        cutoff = time.time() - MODEL_RETENTION_ORPHAN_HOURS * 3600
+        for abs_path, path in sorted(version_dirs.items()):
+            if abs_path in known or abs_path in adapter_bases or os.path.getmtime(path) > cutoff:
+                continue
+            actions.append({
+                "model_id": None,
+                "model_path": path,
+                "action": "evict",
+                "freed_bytes": model_store.usage(path)["unique_bytes"],
+            })
+
+        gc = None
+        if not dry_run:
+            by_id = {model.id: model for model in models}
+            for action in actions:
+                model = by_id.get(action["model_id"])
+                if action["action"] == "compress":
+                    model_store.archive(action["model_path"])
+                    model.status = MODEL_ARCHIVED
+                else:
+                    model_store.evict(action["model_path"])
+                    if model is not None:
+                        model.status = MODEL_EVICTED
+                if model is not None:
+                    self.repository.save(model)
+            gc = model_store.collect_garbage()
+            logger.info(f"Retention ({mode}): {len(actions)} version(s) processed, "
+                        f"{gc['freed_bytes'] / 1024 / 1024:.1f}MB of blobs freed")
+
+        return {
+            "mode": mode,
+            "keep_recent": keep_recent,
+            "dry_run": dry_run,
+            "protected": {model_id: reasons for model_id, reasons in protection.items() if reasons},
+            "actions": actions,
+            "gc": gc,
+        }
+
+    def _job_result_paths(self) -> Set[str]:
+        """Thư mục kết quả của các job train đã xong, /model/save đăng ký version từ đây."""
+        paths = set()
+        for job in TrainingJobRepository(self.repository.db).get_by_status(JOB_COMPLETED):
+            try:
+                model_path = json.loads(job.result or "{}").get("model_path")
+            except ValueError:
+                continue
+            if model_path:
+                paths.add(os.path.abspath(model_path))
+        return paths
+
+    def storage_report(self) -> Dict:
+        """Dung lượng (tổng, riêng, dùng chung) và thời gian nạp gần nhất của từng version."""
+        models = self.repository.list_versions()
+        version_dirs = self.list_version_dirs()
+        protection, _ = self._retention_protection(models, version_dirs, MODEL_RETENTION_KEEP_RECENT)
+
+        versions = []
+        for model in models:
+            entry = {
+                "model_id": model.id,
+                "name": model.name,
+                "version": model.version,
+                "model_path": model.model_path,
+                "status": model.status,
+                "is_active": model.is_active,
+                "backend": model.backend,
+                "protected": protection[model.id],
+            }
+            if os.path.isdir(model.model_path):
+                entry.update(model_store.usage(model.model_path))
+            elif model.status == MODEL_ARCHIVED and os.path.isfile(model_store.archive_path(model.model_path)):
+                entry["archive_bytes"] = os.path.getsize(model_store.archive_path(model.model_path))
+            versions.append(entry)
+
+        known = {os.path.abspath(model.model_path) for model in models}
+        job_results = self._job_result_paths()
+        orphans = [
+            {"model_path": path, "unsaved_job_result": abs_path in job_results, **model_store.usage(path)}
+            for abs_path, path in sorted(version_dirs.items()) if abs_path not in known
+        ]
+        totals = model_store.totals()
+        logical = sum(entry.get("logical_bytes", 0) for entry in versions + orphans)
+        totals["logical_bytes"] = logical
+        totals["dedup_ratio"] = round(logical / totals["blob_bytes"], 3) if totals["blob_bytes"] else None
+        return {"totals": totals, "versions": versions, "orphans": orphans}
@@ -0,0 +1,340 @@
+"""
+Kho artifact model theo nội dung: file giống nhau giữa các version chỉ lưu một lần.
+
+Mỗi file được lưu một lần trong `blobs/<sha[:2]>/<sha256>` (chỉ đọc); thư mục version
+giữ nguyên đường dẫn (model_path trong database, loader không đổi) nhưng các file
+trong đó là hardlink tới blob. Tokenizer, config và weights không đổi giữa các
+version chỉ chiếm dung lượng một lần, và khi nhiều version cùng được nạp thì dùng
+chung page cache của blob.
+
+Weights luôn lưu bằng safetensors: `from_pretrained` mmap file nên nạp model chỉ
+là page-in từ page cache, không đọc rồi copy. Version cũ lưu `pytorch_model.bin`
+được đổi sang safetensors khi đưa vào kho.
+
+Blob không còn version nào link tới (st_nlink == 1) bị xoá khi chạy `collect_garbage`.
+Commit, archive, evict và GC giữ `fcntl.flock` trên LOCK_FILE ở gốc kho, nên GC của
+server không chạy xen vào lúc worker train đang commit (blob mới chưa kịp link).
+"""
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+import zipfile
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, Optional, Tuple
+
+from constant.constants import MODEL_STORE_DIR
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+BLOB_SUBDIR = "blobs"
+ARCHIVE_SUBDIR = "archive"
+STAGING_SUBDIR = ".staging"
+LOCK_FILE = ".lock"
+LEGACY_WEIGHTS_PREFIX = "pytorch_model"
+SAFE_WEIGHTS_SUFFIX = ".safetensors"
+# Thư mục staging bị bỏ lại (process chết giữa lúc lưu) được dọn khi quá tuổi này
+STALE_STAGING_SECONDS = 24 * 3600
+
+_HASH_CHUNK = 8 * 1024 * 1024
+
+
+def _iter_files(root: str) -> Iterator[Tuple[str, str]]:
+    """(đường dẫn tương đối, đường dẫn đầy đủ) của mọi file trong thư mục, trừ manifest."""
+    for dirpath, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            rel = os.path.relpath(path, root)
+            if rel != MANIFEST_FILE:
+                yield rel, path
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(_HASH_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _link_or_copy(src: str, dst: str):
+    try:
+        os.link(src, dst)
+    except OSError:
+        # Filesystem không hỗ trợ hardlink (hoặc khác device): copy, mất dedup nhưng vẫn đúng
+        shutil.copy2(src, dst)
+
+
+def _dir_bytes(path: str) -> int:
+    return sum(os.path.getsize(full) for _, full in _iter_files(path))
+
+
+class ModelArtifactStore:
+    def __init__(self, root: str = MODEL_STORE_DIR):
+        self.root = root
+        self.blob_root = os.path.join(root, BLOB_SUBDIR)
+        self.archive_root = os.path.join(root, ARCHIVE_SUBDIR)
+        self.staging_root = os.path.join(root, STAGING_SUBDIR)
+        # Commit, archive và GC không chạy chồng lên nhau trong cùng process; giữa các
+        # process dùng thêm flock trong `_exclusive`
+        self._lock = threading.RLock()
+
+    @contextmanager
+    def _exclusive(self):
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            with open(os.path.join(self.root, LOCK_FILE), "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def staging_dir(self) -> str:
+        """Thư mục tạm để ghi artifact mới trước khi `commit` vào thư mục version."""
+        path = os.path.join(self.staging_root, uuid.uuid4().hex)
+        os.makedirs(path)
+        return path
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_root, digest[:2], digest)
+
+    def _store_blob(self, path: str, digest: str) -> str:
+        blob = self._blob_path(digest)
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            try:
+                # Link thẳng file nguồn nên blob vừa xuất hiện đã có st_nlink >= 2, GC không xoá nhầm
+                os.link(path, blob)
+            except FileExistsError:
+                pass
+            except OSError:
+                shutil.copy2(path, blob)
+            os.chmod(blob, 0o444)
+        return blob
+
+    def commit(self, source_dir: str, target_dir: str, remove_source: bool = True) -> Dict:
+        """
+        Đưa nội dung `source_dir` vào kho và thay `target_dir` bằng thư mục chỉ gồm
+        hardlink tới blob cùng manifest (sha256, size từng file). Thư mục mới được dựng
+        cạnh `target_dir` rồi đổi tên vào chỗ, nên loader không bao giờ thấy version ghi dở.
+        """
+        with self._exclusive():
+            tmp_dir = f"{target_dir.rstrip(os.sep)}.tmp-{uuid.uuid4().hex[:8]}"
+            known = {}
+            for manifest_dir in (target_dir, source_dir):
+                entries = (self.read_manifest(manifest_dir) or {}).get("files", {})
+                known.update({rel: entry["sha256"] for rel, entry in entries.items()})
+            files = {}
+            for rel, path in _iter_files(source_dir):
+                digest = known.get(rel)
+                if digest is None or not self._is_blob_link(path, digest):
+                    digest = _hash_file(path)
+                blob = self._store_blob(path, digest)
+                dst = os.path.join(tmp_dir, rel)
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                _link_or_copy(blob, dst)
+                files[rel] = {"sha256": digest, "size": os.path.getsize(blob)}
+            os.makedirs(tmp_dir, exist_ok=True)
+
+            manifest = {
+                "files": files,
+                "logical_bytes": sum(entry["size"] for entry in files.values()),
+                "committed_at": datetime.now().isoformat(),
+            }
+            with open(os.path.join(tmp_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
+
+            if os.path.exists(target_dir):
+                old_dir = f"{target_dir.rstrip(os.sep)}.old-{uuid.uuid4().hex[:8]}"
+                os.rename(target_dir, old_dir)
+                os.rename(tmp_dir, target_dir)
+                shutil.rmtree(old_dir, ignore_errors=True)
+            else:
+                os.makedirs(os.path.dirname(os.path.abspath(target_dir)), exist_ok=True)
+                os.rename(tmp_dir, target_dir)
+            if remove_source and os.path.abspath(source_dir) != os.path.abspath(target_dir):
+                shutil.rmtree(source_dir, ignore_errors=True)
+
+        logger.info(f"Committed {len(files)} file(s) ({manifest['logical_bytes'] / 1024 / 1024:.1f}MB) to {target_dir}")
+        return manifest
+
+    def _is_blob_link(self, path: str, digest: str) -> bool:
+        """File đã là hardlink tới blob `digest` thì không cần hash lại."""
+        blob = self._blob_path(digest)
+        return os.path.exists(blob) and os.path.samefile(path, blob)
+
+    def is_ingested(self, version_dir: str) -> bool:
+        manifest = self.read_manifest(version_dir)
+        if manifest is None:
+            return False
+        for rel, path in _iter_files(version_dir):
+            entry = manifest["files"].get(rel)
+            if entry is None or not self._is_blob_link(path, entry["sha256"]):
+                return False
+        return True
+
+    def replace_subdir(self, version_dir: str, subdir: str, source_dir: str) -> Dict:
+        """
+        Thay thư mục con `subdir` của version (artifact sinh ra từ version như ONNX) bằng
+        `source_dir` và commit lại version; file cũ của version đã ở trong kho nên không hash lại.
+        """
+        staging = self.staging_dir()
+        for rel, path in _iter_files(version_dir):
+            if rel.split(os.sep)[0] == subdir:
+                continue
+            dst = os.path.join(staging, rel)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            _link_or_copy(path, dst)
+        shutil.move(source_dir, os.path.join(staging, subdir))
+        return self.commit(staging, version_dir)
+
+    def ingest(self, version_dir: str) -> Dict:
+        """
+        Đưa một thư mục version thường (lưu trước khi có kho, hoặc vừa thêm file như
+        artifact int8) vào kho tại chỗ. Weights `pytorch_model*.bin` được đổi sang
+        safetensors để nạp bằng mmap.
+        """
+        if self.is_ingested(version_dir):
+            return self.read_manifest(version_dir)
+
+        names = os.listdir(version_dir)
+        has_legacy = any(name.startswith(LEGACY_WEIGHTS_PREFIX) and name.endswith(".bin") for name in names)
+        has_safe = any(name.endswith(SAFE_WEIGHTS_SUFFIX) for name in names)
+        if not (has_legacy and not has_safe):
+            return self.commit(version_dir, version_dir, remove_source=False)
+
+        from transformers import AutoModelForSeq2SeqLM
+
+        staging = self.staging_dir()
+        # save_pretrained ghi trước (config mới), các file còn lại mới link sang để
+        # không ghi đè lên inode đang dùng chung với thư mục version
+        AutoModelForSeq2SeqLM.from_pretrained(version_dir).save_pretrained(staging, safe_serialization=True)
+        for rel, path in _iter_files(version_dir):
+            dst = os.path.join(staging, rel)
+            if os.path.basename(rel).startswith(LEGACY_WEIGHTS_PREFIX) or os.path.exists(dst):
+                continue
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            _link_or_copy(path, dst)
+        logger.info(f"Converted {version_dir} weights to safetensors")
+        return self.commit(staging, version_dir)
+
+    def read_manifest(self, version_dir: str) -> Optional[Dict]:
+        path = os.path.join(version_dir, MANIFEST_FILE)
+        if not os.path.isfile(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def record_load(self, version_dir: str, seconds: float, backend: str):
+        """Ghi thời gian nạp gần nhất của version (theo backend) vào manifest."""
+        manifest = self.read_manifest(version_dir)
+        if manifest is None:
+            return
+        manifest.setdefault("loads", {})[backend] = {
+            "seconds": round(seconds, 4),
+            "loaded_at": datetime.now().isoformat(),
+        }
+        path = os.path.join(version_dir, MANIFEST_FILE)
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def usage(self, version_dir: str) -> Dict:
+        """
+        Dung lượng của một version: `logical_bytes` là tổng kích thước file, `unique_bytes`
+        là phần chỉ version này dùng (xoá version sẽ giải phóng), `shared_bytes` là phần
+        dùng chung blob với version khác.
+        """
+        logical = unique = shared = 0
+        for _, path in _iter_files(version_dir):
+            stat = os.stat(path)
+            logical += stat.st_size
+            # Một link ở thư mục version + một link ở blobs; nhiều hơn là dùng chung
+            if stat.st_nlink > 2:
+                shared += stat.st_size
+            else:
+                unique += stat.st_size
+        manifest = self.read_manifest(version_dir) or {}
+        return {
+            "logical_bytes": logical,
+            "unique_bytes": unique,
+            "shared_bytes": shared,
+            "in_store": bool(manifest),
+            "loads": manifest.get("loads", {}),
+        }
+
+    def totals(self) -> Dict:
+        blob_bytes = blob_count = 0
+        if os.path.isdir(self.blob_root):
+            for _, path in _iter_files(self.blob_root):
+                blob_bytes += os.path.getsize(path)
+                blob_count += 1
+        archive_bytes = _dir_bytes(self.archive_root) if os.path.isdir(self.archive_root) else 0
+        return {"blob_count": blob_count, "blob_bytes": blob_bytes, "archive_bytes": archive_bytes}
+
+    def archive_path(self, version_dir: str) -> str:
+        return os.path.join(self.archive_root, f"{os.path.basename(version_dir.rstrip(os.sep))}.zip")
+
+    def archive(self, version_dir: str) -> str:
+        """Nén version vào `archive/` rồi xoá thư mục version; `restore` để dùng lại."""
+        with self._exclusive():
+            os.makedirs(self.archive_root, exist_ok=True)
+            path = self.archive_path(version_dir)
+            tmp_path = f"{path}.{uuid.uuid4().hex[:8]}"
+            with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+                for rel, full in _iter_files(version_dir):
+                    archive.write(full, rel)
+            os.replace(tmp_path, path)
+            shutil.rmtree(version_dir)
+        logger.info(f"Archived {version_dir} to {path}")
+        return path
+
+    def restore(self, version_dir: str) -> Dict:
+        path = self.archive_path(version_dir)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"No archive for {version_dir} at {path}")
+        staging = self.staging_dir()
+        with zipfile.ZipFile(path) as archive:
+            archive.extractall(staging)
+        manifest = self.commit(staging, version_dir)
+        os.remove(path)
+        logger.info(f"Restored {version_dir} from {path}")
+        return manifest
+
+    def evict(self, version_dir: str):
+        with self._exclusive():
+            shutil.rmtree(version_dir, ignore_errors=True)
+        logger.info(f"Evicted {version_dir}")
+
+    def collect_garbage(self) -> Dict:
+        """Xoá blob không còn version nào dùng và thư mục staging bị bỏ lại."""
+        removed = freed = 0
+        with self._exclusive():
+            if os.path.isdir(self.blob_root):
+                for _, path in list(_iter_files(self.blob_root)):
+                    stat = os.stat(path)
+                    if stat.st_nlink == 1:
+                        os.remove(path)
+                        removed += 1
+                        freed += stat.st_size
+            if os.path.isdir(self.staging_root):
+                cutoff = time.time() - STALE_STAGING_SECONDS
+                for name in os.listdir(self.staging_root):
+                    path = os.path.join(self.staging_root, name)
+                    if os.path.getmtime(path) < cutoff:
+                        shutil.rmtree(path, ignore_errors=True)
+        if removed:
+            logger.info(f"Removed {removed} unused blob(s), freed {freed / 1024 / 1024:.1f}MB")
+        return {"removed_blobs": removed, "freed_bytes": freed}
+
+
+model_store = ModelArtifactStore()
@@ -0,0 +1,116 @@
+"""Nạp model active lúc khởi động và generate thử một lần; trạng thái dùng cho readiness probe"""
+import logging
+import sys
+import threading
+import time
+from typing import Dict
+
+from constant.constants import MODEL_WARMUP_MAX_NEW_TOKENS
+
+logger = logging.getLogger(__name__)
+
+PRELOAD_BACKGROUND = "background"
+PRELOAD_BLOCKING = "blocking"
+
+WARMUP_PENDING = "pending"
+WARMUP_LOADING = "loading"
+WARMUP_READY = "ready"
+WARMUP_NO_ACTIVE_MODEL = "no_active_model"
+WARMUP_FAILED = "failed"
+WARMUP_DISABLED = "disabled"
+# Không có model active thì không có gì để nạp; tắt preload thì model nạp ở request đầu tiên
+READY_STATUSES = (WARMUP_READY, WARMUP_NO_ACTIVE_MODEL, WARMUP_DISABLED)
+
+WARMUP_TEXT = "summarize: Mô hình được nạp và chạy thử trước khi nhận request."
+
+_REGISTRY_MODULE = "app.service.model_registry"
+
+
+class ModelWarmup:
+    """
+    Chạy một lần khi khởi động: import torch/transformers, nạp model active vào model
+    registry rồi generate thử một input ngắn (khởi tạo kernel, cấp phát bộ nhớ, page-in
+    weights) để request đầu tiên không phải chịu các chi phí này.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state: Dict = {"status": WARMUP_PENDING}
+        self._thread = None
+
+    def _update(self, **fields):
+        with self._lock:
+            self._state.update(fields)
+
+    def disable(self):
+        self._update(status=WARMUP_DISABLED)
+
+    def start(self):
+        """Warm-up ở background thread: server nhận request ngay, /ready báo chưa sẵn sàng tới khi xong."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self.run, name="model-warmup", daemon=True)
+        self._thread.start()
+
+    def run(self):
+        started = time.perf_counter()
+        self._update(status=WARMUP_LOADING, error=None)
+        try:
+            import torch
+            from app.models import SessionLocal
+            from app.repositories.model_repository import ModelRepository
+            from app.service.model_registry import model_registry
+            import_seconds = time.perf_counter() - started
+
+            db = SessionLocal()
+            try:
+                repository = ModelRepository(db)
+                if repository.get_active_model() is None:
+                    logger.info("No active model to preload")
+                    self._update(status=WARMUP_NO_ACTIVE_MODEL, import_seconds=round(import_seconds, 3))
+                    return
+                loaded = model_registry.get_active(repository)
+            finally:
+                db.close()
+
+            warmup_started = time.perf_counter()
+            inputs = loaded.tokenizer([WARMUP_TEXT], return_tensors="pt")
+            with torch.inference_mode():
+                loaded.model.generate(**inputs, max_new_tokens=MODEL_WARMUP_MAX_NEW_TOKENS)
+            warmup_seconds = time.perf_counter() - warmup_started
+        except Exception as e:
+            logger.exception("Model warm-up failed")
+            self._update(status=WARMUP_FAILED, error=str(e))
+            return
+
+        total_seconds = time.perf_counter() - started
+        self._update(
+            status=WARMUP_READY,
+            import_seconds=round(import_seconds, 3),
+            warmup_seconds=round(warmup_seconds, 3),
+            startup_seconds=round(total_seconds, 3),
+        )
+        logger.info(f"Model {loaded.model_id} ready in {total_seconds:.2f}s "
+                    f"(imports {import_seconds:.2f}s, load {loaded.load_duration:.2f}s, warm-up {warmup_seconds:.2f}s)")
+
+    def readiness(self) -> Dict:
+        with self._lock:
+            state = dict(self._state)
+        state["ready"] = state["status"] in READY_STATUSES
+
+        # Chỉ đọc registry khi module đã được import (có thể đang import dở ở thread warm-up),
+        # probe không kéo theo torch/transformers
+        registry = getattr(sys.modules.get(_REGISTRY_MODULE), "model_registry", None)
+        current = registry.current if registry is not None else None
+        state["model_loaded"] = current is not None
+        if current is not None:
+            state.update(
+                model_id=current.model_id,
+                model_version=current.version,
+                backend=current.backend,
+                load_seconds=round(current.load_duration, 3),
+            )
+        return state
+
+
+model_warmup = ModelWarmup()
@@ -0,0 +1,51 @@
+"""Export model version sang ONNX (encoder, decoder, decoder with past) và serve bằng ONNX Runtime"""
+import logging
+import os
+import time
+from typing import Optional
+
+from transformers import AutoTokenizer
+
+logger = logging.getLogger(__name__)
+
+ONNX_SUBDIR = "onnx"
+
+
+def onnx_model_dir(model_path: str) -> str:
+    """Artifact ONNX nằm trong thư mục con của version."""
+    return os.path.join(model_path, ONNX_SUBDIR)
+
+
+def export_onnx(model_path: str, output_dir: Optional[str] = None) -> str:
+    """
+    Export encoder, decoder và decoder_with_past (tái sử dụng past key values giữa
+    các bước decode). Giữ decoder tách rời thay vì merge để ONNX Runtime không phải
+    rẽ nhánh trong graph ở mỗi bước. `output_dir` mặc định là `onnx_model_dir(model_path)`.
+    """
+    from optimum.exporters.onnx import main_export
+
+    output_dir = output_dir or onnx_model_dir(model_path)
+    started = time.perf_counter()
+    main_export(
+        model_path,
+        output=output_dir,
+        task="text2text-generation-with-past",
+        no_post_process=True,
+    )
+    AutoTokenizer.from_pretrained(model_path).save_pretrained(output_dir)
+    logger.info(f"Exported ONNX model to {output_dir} in {time.perf_counter() - started:.2f}s")
+    return output_dir
+
+
+def load_onnx(model_path: str):
+    """Model ONNX Runtime (CPU) có cùng API `generate` với model PyTorch."""
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+
+    onnx_dir = onnx_model_dir(model_path)
+    if not os.path.isdir(onnx_dir):
+        raise FileNotFoundError(f"ONNX model not found at {onnx_dir}, run the export step first.")
+    return ORTModelForSeq2SeqLM.from_pretrained(
+        onnx_dir,
+        provider="CPUExecutionProvider",
+        use_cache=True,
+    )
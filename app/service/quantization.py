@@ -0,0 +1,44 @@
+"""Dynamic int8 quantization (Linear layers) cho inference trên CPU"""
+import logging
+import os
+
+import torch
+from transformers import AutoModelForSeq2SeqLM
+
+logger = logging.getLogger(__name__)
+
+QUANTIZED_WEIGHTS_FILE = "quantized_int8.pt"
+
+
+def quantized_weights_path(model_path: str) -> str:
+    """Artifact int8 nằm cạnh weights fp32 trong thư mục của version."""
+    return os.path.join(model_path, QUANTIZED_WEIGHTS_FILE)
+
+
+def quantize_dynamic_int8(model):
+    model.eval()
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def save_quantized(model, model_path: str) -> str:
+    """
+    Quantized module không dùng được save_pretrained nên lưu state_dict. Ghi ra file tạm
+    rồi thay thế: file cũ có thể là hardlink tới blob dùng chung trong kho artifact.
+    """
+    path = quantized_weights_path(model_path)
+    tmp_path = f"{path}.tmp"
+    torch.save(model.state_dict(), tmp_path)
+    os.replace(tmp_path, path)
+    logger.info(f"Saved int8 weights to {path}")
+    return path
+
+
+def load_quantized(model_path: str):
+    """Dựng lại cấu trúc quantized từ model fp32 rồi nạp state_dict int8 đã lưu."""
+    path = quantized_weights_path(model_path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Quantized weights not found at {path}, run the quantize step first.")
+    model = quantize_dynamic_int8(AutoModelForSeq2SeqLM.from_pretrained(model_path))
+    model.load_state_dict(torch.load(path, map_location="cpu"))
+    model.eval()
+    return model
@@ -0,0 +1,212 @@
+"""Shadow traffic: mirror một phần request /summarize sang version ứng viên để so với model active"""
+import logging
+import random
+import threading
+from collections import deque
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from app.service.inference_executor import InferenceRejectedError
+from constant.constants import SHADOW_MODEL_ID, SHADOW_FRACTION, SHADOW_MAX_INFLIGHT, SHADOW_STATS_WINDOW
+
+logger = logging.getLogger(__name__)
+
+
+class _WhitespaceTokenizer:
+    """Tokenizer mặc định của rouge_score bỏ ký tự ngoài a-z0-9 (mất dấu tiếng Việt), tách theo khoảng trắng."""
+
+    @staticmethod
+    def tokenize(text):
+        return text.lower().split()
+
+
+def _summary(values):
+    if not values:
+        return {"avg": 0.0, "p50": 0.0, "p99": 0.0}
+    return {
+        "avg": round(float(np.mean(values)), 2),
+        "p50": round(float(np.percentile(values, 50)), 2),
+        "p99": round(float(np.percentile(values, 99)), 2),
+    }
+
+
+class _ShadowBucket:
+    """Kết quả so sánh của một cặp (version ứng viên, model active) trên cửa sổ gần nhất."""
+
+    def __init__(self, candidate, primary, window: int):
+        self.candidate_model_id = candidate.model_id
+        self.candidate_version = candidate.version
+        self.primary_model_id = primary.model_id
+        self.primary_version = primary.version
+        self.candidate_ms = deque(maxlen=window)
+        # Chỉ có khi request chính thực sự generate (không lấy từ cache)
+        self.primary_ms = deque(maxlen=window)
+        self.candidate_words = deque(maxlen=window)
+        self.primary_words = deque(maxlen=window)
+        self.rouge_l = deque(maxlen=window)
+        self.title_match = deque(maxlen=window)
+        self.completed = 0
+
+    def to_dict(self) -> Dict:
+        candidate_ms = _summary(list(self.candidate_ms))
+        primary_ms = _summary(list(self.primary_ms))
+        primary_words = float(np.mean(self.primary_words)) if self.primary_words else 0.0
+        candidate_words = float(np.mean(self.candidate_words)) if self.candidate_words else 0.0
+        return {
+            "candidate_model_id": self.candidate_model_id,
+            "candidate_version": self.candidate_version,
+            "primary_model_id": self.primary_model_id,
+            "primary_version": self.primary_version,
+            "completed": self.completed,
+            "samples": len(self.candidate_ms),
+            "latency_ms": {
+                "primary": primary_ms,
+                "candidate": candidate_ms,
+                # Dương: ứng viên chậm hơn model active
+                "delta_p50": round(candidate_ms["p50"] - primary_ms["p50"], 2) if self.primary_ms else None,
+                "delta_p99": round(candidate_ms["p99"] - primary_ms["p99"], 2) if self.primary_ms else None,
+            },
+            "summary_words": {
+                "primary": round(primary_words, 2),
+                "candidate": round(candidate_words, 2),
+                "ratio": round(candidate_words / primary_words, 3) if primary_words else None,
+            },
+            "agreement": {
+                "summary_rouge_l": _summary(list(self.rouge_l)),
+                "title_exact_match": round(float(np.mean(self.title_match)), 3) if self.title_match else None,
+            },
+        }
+
+
+class ShadowTraffic:
+    """
+    Mirror ngẫu nhiên `fraction` request /summarize (dùng model active) sang version
+    `model_id`. Request mirror chờ kết quả trên thread riêng, còn generate chạy ở lane bulk
+    của inference executor sau khi response chính đã có kết quả, nên không làm chậm response;
+    tối đa `max_inflight` request mirror cùng lúc, vượt quá hoặc hàng đợi bulk đầy thì bỏ qua
+    (`dropped`).
+
+    Cấu hình chỉ có hiệu lực trong process hiện tại; giá trị mặc định lấy từ
+    SHADOW_MODEL_ID/SHADOW_FRACTION.
+    """
+
+    def __init__(self, model_id: Optional[str] = SHADOW_MODEL_ID, fraction: float = SHADOW_FRACTION,
+                 max_inflight: int = SHADOW_MAX_INFLIGHT, stats_window: int = SHADOW_STATS_WINDOW):
+        self.model_id = model_id or None
+        self.fraction = min(max(fraction, 0.0), 1.0)
+        self.max_inflight = max(1, max_inflight)
+        self.stats_window = stats_window
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._buckets: Dict[Tuple[str, str], _ShadowBucket] = {}
+        self._scorer = None
+
+        self.mirrored = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def configure(self, model_id: str, fraction: float):
+        if not 0.0 <= fraction <= 1.0:
+            raise ValueError("Shadow fraction must be between 0 and 1.")
+        with self._lock:
+            self.model_id = model_id
+            self.fraction = fraction
+        logger.info(f"Shadow traffic: mirroring {fraction:.0%} of requests to model {model_id}")
+
+    def disable(self):
+        with self._lock:
+            self.model_id = None
+
+    def _acquire(self, primary_model_id: str) -> Optional[str]:
+        """Chọn request để mirror; trả về model id ứng viên và giữ một slot inflight."""
+        with self._lock:
+            candidate_id = self.model_id
+            if candidate_id is None or candidate_id == primary_model_id or random.random() >= self.fraction:
+                return None
+            if self._inflight >= self.max_inflight:
+                self.dropped += 1
+                return None
+            self._inflight += 1
+            self.mirrored += 1
+            return candidate_id
+
+    def _release(self):
+        with self._lock:
+            self._inflight -= 1
+
+    def mirror(self, primary, primary_result: Dict, primary_ms: Optional[float],
+               run_candidate: Callable[[str], Tuple[object, Dict, float]]):
+        """
+        `primary` là LoadedModel đã trả response, `primary_ms` là thời gian generate của nó
+        (None khi lấy từ cache). `run_candidate(model_id)` chạy cùng input trên ứng viên và
+        trả về (LoadedModel, kết quả, thời gian generate ms).
+        """
+        candidate_id = self._acquire(primary.model_id)
+        if candidate_id is None:
+            return
+
+        def _task():
+            try:
+                candidate, result, candidate_ms = run_candidate(candidate_id)
+                self._record(primary, primary_result, primary_ms, candidate, result, candidate_ms)
+            except InferenceRejectedError:
+                with self._lock:
+                    self.dropped += 1
+            except Exception as e:
+                logger.warning(f"Shadow request to model {candidate_id} failed: {str(e)}")
+                with self._lock:
+                    self.failed += 1
+            finally:
+                self._release()
+
+        # Không chờ trên worker của executor: worker đó sẽ chặn chính batch mà nó đang chờ
+        threading.Thread(target=_task, name="shadow-traffic", daemon=True).start()
+
+    def _agreement(self, reference: str, candidate: str) -> float:
+        if self._scorer is None:
+            from rouge_score import rouge_scorer
+            self._scorer = rouge_scorer.RougeScorer(["rougeL"], tokenizer=_WhitespaceTokenizer())
+        return self._scorer.score(reference, candidate)["rougeL"].fmeasure
+
+    def _record(self, primary, primary_result: Dict, primary_ms: Optional[float],
+                candidate, result: Dict, candidate_ms: float):
+        rouge_l = self._agreement(primary_result["summary"], result["summary"])
+        title_match = primary_result["title"].strip().lower() == result["title"].strip().lower()
+        with self._lock:
+            key = (candidate.model_id, primary.model_id)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = _ShadowBucket(candidate, primary, self.stats_window)
+            bucket.completed += 1
+            bucket.candidate_ms.append(candidate_ms)
+            if primary_ms is not None:
+                bucket.primary_ms.append(primary_ms)
+            bucket.candidate_words.append(len(result["summary"].split()))
+            bucket.primary_words.append(len(primary_result["summary"].split()))
+            bucket.rouge_l.append(rouge_l)
+            bucket.title_match.append(1.0 if title_match else 0.0)
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            buckets = list(self._buckets.values())
+            config = {
+                "enabled": self.model_id is not None,
+                "model_id": self.model_id,
+                "fraction": self.fraction,
+                "max_inflight": self.max_inflight,
+                "inflight": self._inflight,
+                "mirrored": self.mirrored,
+                "dropped": self.dropped,
+                "failed": self.failed,
+            }
+            versions = [bucket.to_dict() for bucket in buckets]
+        config["versions"] = versions
+        return config
+
+
+shadow_traffic = ShadowTraffic()
@@ -1,58 +1,414 @@
-from nltk.corpus.reader import titles
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+import logging
+import threading
+import time
+from concurrent.futures import CancelledError, wait
+from dataclasses import replace
+from typing import Dict, Optional
+
+from transformers import LogitsProcessorList, StoppingCriteriaList, TextIteratorStreamer
 
 from app.repositories.model_repository import ModelRepository
+from app.service.batch_scheduler import BatchScheduler
+from app.service.decoding_profiles import DecodingPlan, decoding_cost_model, get_profile, plan_decoding
+from app.service.inference_executor import inference_executor, PRIORITY_INTERACTIVE, PRIORITY_BULK
+from app.service.generation_utils import RowMaxNewTokensLogitsProcessor, CancelStoppingCriteria
+from app.service.lora_adapters import adapter_hosts
+from app.service.model_registry import model_registry, LoadedModel
+from app.service.shadow_traffic import shadow_traffic
+from app.service.summary_cache import summary_cache
+from app.service.text_chunking import count_tokens, split_into_chunks
+from constant.constants import (
+    SUMMARIZE_MAX_BATCH_SIZE,
+    SUMMARIZE_MAX_WAIT_MS,
+    SUMMARIZE_FUSED_GENERATE,
+    SUMMARIZE_MAX_INPUT_TOKENS,
+    BULK_BATCH_SIZE,
+    LONG_DOC_CHUNK_TOKENS,
+    LONG_DOC_FANOUT,
+    LONG_DOC_MAX_DEPTH,
+    LONG_DOC_PARTIAL_MAX_NEW_TOKENS,
+)
+
+logger = logging.getLogger(__name__)
 
 
 class SummarizeService:
     def __init__(self, model_repository : ModelRepository):
         self.model_repository = model_repository
+        self.scheduler = BatchScheduler(
+            self._generate_batch,
+            max_batch_size=SUMMARIZE_MAX_BATCH_SIZE,
+            max_wait_ms=SUMMARIZE_MAX_WAIT_MS,
+            name="summarize-scheduler",
+            executor=inference_executor,
+        )
+
+    def summarize(self, text, long_document: bool = False, profile: Optional[str] = None,
+                  latency_budget_ms: Optional[float] = None, model_id: Optional[str] = None,
+                  version: Optional[str] = None, priority: int = PRIORITY_INTERACTIVE,
+                  deadline: Optional[float] = None, cancel_event: Optional[threading.Event] = None):
+        """
+        `model_id`/`version` chọn version để serve; không truyền thì dùng model active.
+        Mọi lần generate chạy trên inference executor ở lane `priority`; thread gọi chỉ chờ kết quả.
+        Khi `cancel_event` được set, phần chưa chạy bị bỏ và generate dừng nếu không còn
+        request nào khác trong batch (CancelledError).
+        """
+        loaded = model_registry.get(self.model_repository, model_id, version)
+        timing = {}
+
+        if long_document:
+            # Plan của bước cuối phụ thuộc bản tóm tắt trung gian nên key theo tham số request
+            params = {
+                "profile": get_profile(profile).name,
+                "latency_budget_ms": latency_budget_ms,
+                "long_document": self.long_document_params(),
+            }
+            compute = lambda: self._summarize_long(text, loaded, profile, latency_budget_ms, priority, deadline,
+                                                   cancel_event)
+        else:
+            plan = self.plan(loaded.tokenizer, text, profile, latency_budget_ms)
+            params = plan.cache_params()
+            compute = self._timed(
+                lambda: self._summarize_uncached(text, loaded, plan, priority, deadline, cancel_event), timing
+            )
+        params["fused"] = SUMMARIZE_FUSED_GENERATE
+
+        key = summary_cache.make_key(
+            text, loaded.model_id, f"{loaded.model_path}:{loaded.backend}", params
+        )
+        result = summary_cache.get_or_compute(key, compute)
+
+        # Chỉ mirror request dùng model active; bài dài (map-reduce) quá tốn để chạy lại
+        if not long_document and model_id is None and version is None:
+            shadow_traffic.mirror(
+                loaded, result, timing.get("ms"),
+                lambda candidate_id: self._run_shadow(text, candidate_id, profile, latency_budget_ms),
+            )
+        return result
+
+    @staticmethod
+    def _timed(fn, timing: Dict):
+        def _run():
+            started = time.perf_counter()
+            result = fn()
+            timing["ms"] = (time.perf_counter() - started) * 1000
+            return result
+        return _run
+
+    def _run_shadow(self, text, model_id: str, profile: Optional[str] = None,
+                    latency_budget_ms: Optional[float] = None):
+        """Chạy lại input trên version ứng viên, bỏ qua cache để đo đúng thời gian generate."""
+        loaded = model_registry.get(self.model_repository, model_id=model_id)
+        plan = self.plan(loaded.tokenizer, text, profile, latency_budget_ms)
+        started = time.perf_counter()
+        result = self._summarize_uncached(text, loaded, plan, PRIORITY_BULK)
+        return loaded, result, (time.perf_counter() - started) * 1000
+
+    @staticmethod
+    def plan(tokenizer, text, profile: Optional[str] = None,
+             latency_budget_ms: Optional[float] = None) -> DecodingPlan:
+        """Chốt tham số decode cho `text` theo profile, số token input và latency budget."""
+        input_tokens = min(count_tokens(tokenizer, text), SUMMARIZE_MAX_INPUT_TOKENS)
+        return plan_decoding(input_tokens, profile, latency_budget_ms)
 
-    def summarize(self, text):
-        model_db = self.model_repository.get_active_model()
+    def _summarize_long(self, text, loaded: LoadedModel, profile: Optional[str] = None,
+                        latency_budget_ms: Optional[float] = None, priority: int = PRIORITY_INTERACTIVE,
+                        deadline: Optional[float] = None, cancel_event: Optional[threading.Event] = None):
+        """
+        Map-reduce cho bài dài hơn giới hạn 512 token: chia theo đoạn văn, tóm tắt
+        các chunk theo batch (map), nối các bản tóm tắt lại rồi lặp tới khi còn một
+        chunk hoặc chạm LONG_DOC_MAX_DEPTH; bước cuối sinh title + summary như bình thường.
+        """
+        started = time.perf_counter()
+        tokenizer = loaded.tokenizer
+        num_beams = get_profile(profile).num_beams
+        chunks = split_into_chunks(tokenizer, text, LONG_DOC_CHUNK_TOKENS)
+        stats = {
+            "input_tokens": sum(n_tokens for _, n_tokens in chunks),
+            "chunks": 0,
+            "tokens_processed": 0,
+            "depth": 0,
+            "generate_calls": 0,
+        }
+
+        while len(chunks) > 1 and stats["depth"] < LONG_DOC_MAX_DEPTH:
+            partials = []
+            for start in range(0, len(chunks), LONG_DOC_FANOUT):
+                if cancel_event is not None and cancel_event.is_set():
+                    raise CancelledError()
+                group = chunks[start:start + LONG_DOC_FANOUT]
+                partials.extend(inference_executor.run(
+                    lambda group=group: self._generate_rows(
+                        [f"summarize: {chunk}" for chunk, _ in group],
+                        tokenizer,
+                        loaded.model,
+                        [LONG_DOC_PARTIAL_MAX_NEW_TOKENS] * len(group),
+                        num_beams,
+                        cancel_event=cancel_event,
+                    ),
+                    priority=priority,
+                    deadline=deadline,
+                    block=True,
+                ))
+                stats["generate_calls"] += 1
+            stats["chunks"] += len(chunks)
+            stats["tokens_processed"] += sum(n_tokens for _, n_tokens in chunks)
+            stats["depth"] += 1
+            chunks = split_into_chunks(tokenizer, "\n".join(partials), LONG_DOC_CHUNK_TOKENS)
+
+        # Chạm giới hạn độ sâu mà vẫn nhiều chunk thì bước cuối sẽ truncate như input thường
+        reduced = "\n".join(chunk for chunk, _ in chunks)
+        stats["tokens_processed"] += sum(n_tokens for _, n_tokens in chunks)
+        plan = self.plan(tokenizer, reduced, profile, latency_budget_ms)
+        result = self._summarize_uncached(reduced, loaded, plan, priority, deadline, cancel_event)
+        stats["generate_calls"] += 1
+        stats["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        logger.info(f"Long document summarized: {stats}")
 
-        tokenizer = AutoTokenizer.from_pretrained(model_db.model_path)
-        model = AutoModelForSeq2SeqLM.from_pretrained(model_db.model_path)
+        result["long_document"] = stats
+        return result
 
-        title, summary = self.generate_summary(text, tokenizer, model)
+    def _summarize_uncached(self, text, loaded: LoadedModel, plan: DecodingPlan,
+                            priority: int = PRIORITY_INTERACTIVE, deadline: Optional[float] = None,
+                            cancel_event: Optional[threading.Event] = None):
+        # Request đồng thời trên cùng model và cùng số beam được gộp thành một batch generate,
+        # độ dài title/summary vẫn giữ riêng cho từng request
+        title, summary = self.scheduler.submit(
+            (loaded, plan.num_beams), (text, plan), priority, deadline, cancel_event
+        )
 
         return {
             "title": title,
             "summary": summary,
-            "model_version": f"{model_db.name} + {model_db.version}"
+            "model_version": f"{loaded.name} + {loaded.version}",
+            "decoding": plan.to_dict(),
+        }
+
+    def summarize_items(self, items, batch_size: int = BULK_BATCH_SIZE, profile: Optional[str] = None):
+        """
+        Tóm tắt một cửa sổ item `{"index", "id", "text"}` theo batch đã sắp theo độ dài,
+        yield list kết quả của từng batch ngay khi batch đó xong.
+        """
+        loaded = model_registry.get_active(self.model_repository)
+        model_version = f"{loaded.name} + {loaded.version}"
+        profile_name = get_profile(profile).name
+
+        # Bài có độ dài gần nhau nằm chung batch để giảm padding
+        ordered = sorted(items, key=lambda item: len(item["text"]))
+        for start in range(0, len(ordered), batch_size):
+            batch = ordered[start:start + batch_size]
+            try:
+                # Lane bulk: nhường interactive, chờ khi hàng đợi bulk đầy
+                outputs = inference_executor.run(
+                    lambda: self.generate_summary_batch(
+                        [item["text"] for item in batch], loaded.tokenizer, loaded.model, profile=profile
+                    ),
+                    priority=PRIORITY_BULK,
+                    block=True,
+                )
+            except Exception as e:
+                logger.error(f"Bulk batch failed: {str(e)}")
+                yield [{"index": item["index"], "id": item["id"], "error": str(e)} for item in batch]
+                continue
+
+            yield [
+                {
+                    "index": item["index"],
+                    "id": item["id"],
+                    "title": title,
+                    "summary": summary,
+                    "model_version": model_version,
+                    "profile": profile_name,
+                }
+                for item, (title, summary) in zip(batch, outputs)
+            ]
+
+    @staticmethod
+    def long_document_params():
+        return {
+            "chunk_tokens": LONG_DOC_CHUNK_TOKENS,
+            "fanout": LONG_DOC_FANOUT,
+            "max_depth": LONG_DOC_MAX_DEPTH,
+            "partial_max_new_tokens": LONG_DOC_PARTIAL_MAX_NEW_TOKENS,
+        }
+
+    def stats(self):
+        return {
+            "scheduler": self.scheduler.stats(),
+            "cache": summary_cache.stats(),
+            "executor": inference_executor.stats(),
+            "decoding": decoding_cost_model.stats(),
+            "adapters": adapter_hosts.stats(),
+            "models": model_registry.stats(),
+            "shadow": shadow_traffic.stats(),
         }
 
-    def generate_summary(self, text, tokenizer, model):
+    def stream_summary(self, text, cancel_event: threading.Event, profile: Optional[str] = None,
+                       latency_budget_ms: Optional[float] = None, model_id: Optional[str] = None,
+                       version: Optional[str] = None):
+        """
+        Sinh title rồi summary, yield từng đoạn text ngay khi decode được.
+
+        Streamer của transformers không hỗ trợ beam search nên chế độ này dùng
+        greedy decoding. Khi `cancel_event` được set, generate dừng ở bước kế tiếp.
+        """
+        loaded = model_registry.get(self.model_repository, model_id, version)
+        started = time.perf_counter()
+        first_token_ms = None
+        results = {}
+        # Chỉ dùng độ dài của plan, số beam luôn là 1
+        plan = replace(self.plan(loaded.tokenizer, text, profile, latency_budget_ms), num_beams=1)
+
+        tasks = (
+            ("title", f"title:{text}", plan.title_max_new_tokens),
+            ("summary", f"summarize: {text}", plan.summary_max_new_tokens),
+        )
+        for task, prompt, max_new_tokens in tasks:
+            parts = []
+            for chunk in self._stream_generate(loaded, prompt, max_new_tokens, cancel_event):
+                if first_token_ms is None:
+                    first_token_ms = round((time.perf_counter() - started) * 1000, 2)
+                parts.append(chunk)
+                yield task, {"text": chunk}
+            if cancel_event.is_set():
+                return
+            results[task] = "".join(parts).strip()
+
+        yield "done", {
+            "title": results["title"],
+            "summary": results["summary"],
+            "model_version": f"{loaded.name} + {loaded.version}",
+            "decoding": plan.to_dict(),
+            "time_to_first_token_ms": first_token_ms,
+            "total_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+    @staticmethod
+    def _stream_generate(loaded: LoadedModel, prompt, max_new_tokens, cancel_event: threading.Event):
+        tokenizer, model = loaded.tokenizer, loaded.model
         inputs = tokenizer(
-            f"title:{text}",
-            max_length=512,
+            prompt,
+            max_length=SUMMARIZE_MAX_INPUT_TOKENS,
             truncation=True,
             return_tensors="pt"
         )
+        streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        errors = []
 
-        titles = model.generate(
-            **inputs,
-            max_new_tokens=256,
-            num_beams=4,
-            early_stopping=True
+        def _run():
+            try:
+                model.generate(
+                    **inputs,
+                    max_new_tokens=max_new_tokens,
+                    num_beams=1,
+                    streamer=streamer,
+                    stopping_criteria=StoppingCriteriaList([CancelStoppingCriteria(cancel_event)]),
+                )
+            except Exception as e:
+                errors.append(e)
+                # Kết thúc streamer để vòng lặp bên dưới không bị treo
+                streamer.end()
+
+        future = inference_executor.submit(_run, priority=PRIORITY_INTERACTIVE)
+        exhausted = False
+        try:
+            for chunk in streamer:
+                if chunk:
+                    yield chunk
+            exhausted = True
+        finally:
+            # Consumer dừng sớm (client ngắt kết nối) -> dừng generate
+            if not exhausted:
+                cancel_event.set()
+                future.cancel()
+            wait([future])
+        if errors:
+            raise errors[0]
+
+    def _generate_batch(self, key, payloads, cancel_event=None):
+        loaded, _ = key
+        texts = [text for text, _ in payloads]
+        plans = [plan for _, plan in payloads]
+        return self.generate_summary_batch(texts, loaded.tokenizer, loaded.model, plans=plans,
+                                           cancel_event=cancel_event)
+
+    def generate_summary(self, text, tokenizer, model, plan: Optional[DecodingPlan] = None):
+        return self.generate_summary_batch([text], tokenizer, model, plans=[plan] if plan else None)[0]
+
+    def generate_summary_batch(self, texts, tokenizer, model, plans=None, profile: Optional[str] = None,
+                               cancel_event=None):
+        """
+        `plans` là DecodingPlan của từng text (cùng số beam); không truyền thì tự
+        chốt theo `profile` (mặc định của deployment) và độ dài input.
+        `cancel_event` được set thì generate dừng ở bước kế tiếp.
+        """
+        if plans is None:
+            plans = [self.plan(tokenizer, text, profile) for text in texts]
+        num_beams = plans[0].num_beams
+
+        if SUMMARIZE_FUSED_GENERATE:
+            return self._generate_fused(texts, tokenizer, model, plans, num_beams, cancel_event)
+
+        titles = self._generate_rows(
+            [f"title:{text}" for text in texts],
+            tokenizer,
+            model,
+            [plan.title_max_new_tokens for plan in plans],
+            num_beams,
+            cancel_event=cancel_event,
+        )
+        summaries = self._generate_rows(
+            [f"summarize: {text}" for text in texts],
+            tokenizer,
+            model,
+            [plan.summary_max_new_tokens for plan in plans],
+            num_beams,
+            cancel_event=cancel_event,
         )
 
-        title = tokenizer.decode(titles[0], skip_special_tokens=True)
+        return list(zip(titles, summaries))
 
-        summary_inputs = tokenizer(
-            f"summarize: {text}",
-            max_length=512,
+    @staticmethod
+    def _generate_rows(prompts, tokenizer, model, row_limits, num_beams, cancel_event=None):
+        """Generate một batch prompt, mỗi dòng có giới hạn token riêng; thời gian đo được cập nhật cost model."""
+        inputs = tokenizer(
+            prompts,
+            max_length=SUMMARIZE_MAX_INPUT_TOKENS,
             truncation=True,
+            padding=True,
             return_tensors="pt"
         )
 
-        summary_ids = model.generate(
-            **summary_inputs,
-            max_new_tokens=256,
-            num_beams=4,
-            early_stopping=True
+        kwargs = {}
+        if cancel_event is not None:
+            kwargs["stopping_criteria"] = StoppingCriteriaList([CancelStoppingCriteria(cancel_event)])
+
+        started = time.perf_counter()
+        output_ids = model.generate(
+            **inputs,
+            max_new_tokens=max(row_limits),
+            num_beams=num_beams,
+            early_stopping=num_beams > 1,
+            logits_processor=LogitsProcessorList([
+                RowMaxNewTokensLogitsProcessor(row_limits, eos_token_id=model.config.eos_token_id)
+            ]),
+            **kwargs,
+        )
+        decoding_cost_model.observe(
+            (time.perf_counter() - started) * 1000,
+            steps=output_ids.shape[-1] - 1,
+            sequences=len(prompts) * num_beams,
         )
 
-        summary = tokenizer.decode(summary_ids[0], skip_special_tokens=True)
+        return tokenizer.batch_decode(output_ids, skip_special_tokens=True)
+
+    def _generate_fused(self, texts, tokenizer, model, plans, num_beams, cancel_event=None):
+        """Encode prompt title và summary thành một batch, decode trong một lần generate."""
+        n = len(texts)
+        prompts = [f"title:{text}" for text in texts] + [f"summarize: {text}" for text in texts]
+
+        # Title ngắn nên dừng sớm, summary dùng giới hạn riêng
+        row_limits = [plan.title_max_new_tokens for plan in plans] + [plan.summary_max_new_tokens for plan in plans]
+        decoded = self._generate_rows(prompts, tokenizer, model, row_limits, num_beams, cancel_event)
 
-        return title, summary
+        return list(zip(decoded[:n], decoded[n:]))
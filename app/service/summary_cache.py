@@ -0,0 +1,178 @@
+"""Content-addressed cache cho kết quả tóm tắt, có gộp request trùng đang chạy (singleflight)"""
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future
+from typing import Any, Callable, Dict, Optional
+
+from app.repositories.model_repository import ModelRepository
+from constant.constants import SUMMARY_CACHE_ENABLED, SUMMARY_CACHE_MAX_BYTES, SUMMARY_CACHE_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Chuẩn hoá để các bài giống nhau chỉ khác khoảng trắng/unicode form có cùng key."""
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def _entry_size(value: Any) -> int:
+    return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+class SummaryCache:
+    """
+    LRU cache giới hạn theo bộ nhớ (xấp xỉ bằng kích thước JSON của kết quả) và TTL.
+
+    Request trùng key đang được tính sẽ chờ chung một Future thay vì sinh lại.
+    Lỗi không được cache, mọi request đang chờ đều nhận lại exception đó.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float, enabled: bool = True):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expired = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(text: str, model_id: str, model_version: str, decoding_params: Dict) -> str:
+        payload = json.dumps(
+            {
+                "text": normalize_text(text),
+                "model_id": model_id,
+                "model_version": model_version,
+                "decoding": decoding_params,
+            },
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            return self._get_locked(key)
+
+    def _get_locked(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, size, stored_at = entry
+        if self.ttl_seconds and time.monotonic() - stored_at > self.ttl_seconds:
+            self._remove_locked(key)
+            self.expired += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        size = _entry_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove_locked(key)
+            self._entries[key] = (value, size, time.monotonic())
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._remove_locked(oldest)
+                self.evictions += 1
+
+    def _remove_locked(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        if not self.enabled:
+            return compute()
+
+        with self._lock:
+            value = self._get_locked(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                owner = False
+            else:
+                self.misses += 1
+                future = Future()
+                self._inflight[key] = future
+                owner = True
+
+        if not owner:
+            try:
+                return future.result()
+            except CancelledError:
+                # Request đang tính đã bỏ (hết thời gian chờ), request này tự tính lại
+                return self.get_or_compute(key, compute)
+
+        # Bỏ khỏi inflight trước khi báo waiter, waiter tính lại sẽ không gộp vào future cũ
+        try:
+            value = compute()
+            self.put(key, value)
+        except Exception as e:
+            self._finish_inflight(key)
+            future.set_exception(e)
+            raise
+        finally:
+            self._finish_inflight(key)
+        future.set_result(value)
+        return value
+
+    def _finish_inflight(self, key: str) -> None:
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def invalidate(self, *_args) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.invalidations += 1
+        logger.info("Summary cache invalidated")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "inflight": len(self._inflight),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "invalidations": self.invalidations,
+            }
+
+
+summary_cache = SummaryCache(
+    max_bytes=SUMMARY_CACHE_MAX_BYTES,
+    ttl_seconds=SUMMARY_CACHE_TTL_SECONDS,
+    enabled=SUMMARY_CACHE_ENABLED,
+)
+# Xoá cache khi model active thay đổi
+ModelRepository.add_active_listener(summary_cache.invalidate)
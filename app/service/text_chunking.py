@@ -0,0 +1,56 @@
+"""Chia bài dài thành các đoạn không vượt quá số token cho trước, ưu tiên cắt ở ranh giới đoạn văn"""
+import re
+from typing import List, Tuple
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n|\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+")
+
+
+def count_tokens(tokenizer, text: str) -> int:
+    return len(tokenizer(text, add_special_tokens=False)["input_ids"])
+
+
+def _split_oversized(tokenizer, text: str, max_tokens: int) -> List[str]:
+    """Đoạn văn quá dài: cắt theo câu, câu vẫn quá dài thì cắt cứng theo token."""
+    pieces = []
+    for sentence in _SENTENCE_RE.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        ids = tokenizer(sentence, add_special_tokens=False)["input_ids"]
+        if len(ids) <= max_tokens:
+            pieces.append(sentence)
+            continue
+        for start in range(0, len(ids), max_tokens):
+            pieces.append(tokenizer.decode(ids[start:start + max_tokens], skip_special_tokens=True))
+    return pieces
+
+
+def split_into_chunks(tokenizer, text: str, max_tokens: int) -> List[Tuple[str, int]]:
+    """
+    Gom các đoạn văn liên tiếp vào một chunk cho tới khi chạm `max_tokens`.
+    Trả về list `(chunk_text, số token)`.
+    """
+    units = []
+    for paragraph in _PARAGRAPH_RE.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        n_tokens = count_tokens(tokenizer, paragraph)
+        if n_tokens <= max_tokens:
+            units.append((paragraph, n_tokens))
+        else:
+            units.extend((piece, count_tokens(tokenizer, piece))
+                         for piece in _split_oversized(tokenizer, paragraph, max_tokens))
+
+    chunks = []
+    current, current_tokens = [], 0
+    for unit, n_tokens in units:
+        if current and current_tokens + n_tokens > max_tokens:
+            chunks.append(("\n".join(current), current_tokens))
+            current, current_tokens = [], 0
+        current.append(unit)
+        current_tokens += n_tokens
+    if current:
+        chunks.append(("\n".join(current), current_tokens))
+    return chunks
@@ -0,0 +1,391 @@
+"""Cache token của sample trên đĩa (memory-mapped), dùng lại giữa các lần train"""
+import fcntl
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+from constant.constants import (
+    TOKENIZED_CACHE_DIR,
+    TOKENIZE_NUM_PROC,
+    TOKENIZE_CHUNK_SIZE,
+    TRAIN_MAX_INPUT_TOKENS,
+    TRAIN_MAX_TARGET_TOKENS,
+)
+
+logger = logging.getLogger(__name__)
+
+TOKENS_FILE = "tokens.bin"
+INDEX_FILE = "index.json"
+LOCK_FILE = ".lock"
+_TOKEN_DTYPE = np.int32
+_TOKEN_BYTES = np.dtype(_TOKEN_DTYPE).itemsize
+
+
+def sample_records(input_text: str, title: str, target_summary: str) -> List[Tuple[str, str]]:
+    """Mỗi sample sinh hai dòng train: sinh title và sinh summary."""
+    return [
+        (f"title: {input_text}", title),
+        (f"summarize: {input_text}", target_summary),
+    ]
+
+
+def content_hash(sample) -> str:
+    digest = hashlib.sha256()
+    for value in (sample.input_text, sample.title, sample.target_summary):
+        digest.update((value or "").encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def tokenizer_fingerprint(tokenizer, max_input_tokens: int, max_target_tokens: int) -> str:
+    """Định danh tokenizer theo nội dung vocab/cấu hình chứ không theo đường dẫn."""
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    if backend is not None:
+        config = json.loads(backend.to_str())
+        # Truncation/padding là trạng thái runtime, thay đổi theo lần gọi gần nhất
+        config.pop("truncation", None)
+        config.pop("padding", None)
+        vocab = json.dumps(config, sort_keys=True, ensure_ascii=False)
+    else:
+        vocab = json.dumps(sorted(tokenizer.get_vocab().items()), ensure_ascii=False)
+
+    digest = hashlib.sha256()
+    digest.update(type(tokenizer).__name__.encode("utf-8"))
+    digest.update(vocab.encode("utf-8"))
+    digest.update(json.dumps(tokenizer.special_tokens_map, sort_keys=True).encode("utf-8"))
+    digest.update(f"{max_input_tokens}:{max_target_tokens}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def _tokenize_records(tokenizer, records: List[Tuple[str, str]], max_input_tokens: int,
+                      max_target_tokens: int) -> List[Tuple[List[int], List[int]]]:
+    inputs = tokenizer([prompt for prompt, _ in records], max_length=max_input_tokens, truncation=True)
+    labels = tokenizer(text_target=[target for _, target in records], max_length=max_target_tokens, truncation=True)
+    return list(zip(inputs["input_ids"], labels["input_ids"]))
+
+
+# Tokenizer của process worker, nạp một lần qua initializer
+_worker_tokenizer = None
+
+
+def _init_worker(tokenizer):
+    global _worker_tokenizer
+    _worker_tokenizer = tokenizer
+
+
+def _tokenize_chunk(args):
+    records, max_input_tokens, max_target_tokens = args
+    return _tokenize_records(_worker_tokenizer, records, max_input_tokens, max_target_tokens)
+
+
+class _LazyPool:
+    """Process pool tokenize chỉ được tạo khi có đợt đủ lớn, dùng lại cho các đợt sau."""
+
+    def __init__(self, store: "TokenizedSampleStore", stack: ExitStack):
+        self.store = store
+        self.stack = stack
+        self._pool = None
+
+    def get(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn thay vì fork: process cha có thể đang giữ lock của thread khác (server, tokenizers)
+            self._pool = self.stack.enter_context(ProcessPoolExecutor(
+                max_workers=self.store.num_proc,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.store.tokenizer,),
+            ))
+        return self._pool
+
+
+class TokenizedSampleDataset(torch.utils.data.Dataset):
+    """
+    Dataset đọc token từ file memory-mapped; mỗi dòng là `(input_offset, input_len,
+    label_offset, label_len)` trong file token.
+
+    Mỗi process đọc giữ shared lock trên file token đang mở, để compaction ở process
+    khác không xoá file đó khi còn người đọc.
+    """
+
+    def __init__(self, tokens_path: str, rows: np.ndarray, pad_token_id: int,
+                 max_input_tokens: int, max_target_tokens: int, pad_to_max_length: bool = True):
+        self.tokens_path = tokens_path
+        self.rows = rows
+        self.pad_token_id = pad_token_id
+        self.max_input_tokens = max_input_tokens
+        self.max_target_tokens = max_target_tokens
+        self.pad_to_max_length = pad_to_max_length
+        self._tokens = None
+        self._reader = None
+
+    @property
+    def tokens(self) -> np.ndarray:
+        # Mở lazy để dataset pickle được sang DataLoader worker mà không kéo theo memmap
+        if self._tokens is None:
+            reader = open(self.tokens_path, "rb")
+            fcntl.flock(reader, fcntl.LOCK_SH)
+            self._reader = reader
+            self._tokens = np.memmap(reader, dtype=_TOKEN_DTYPE, mode="r")
+        return self._tokens
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_tokens"] = None
+        state["_reader"] = None
+        return state
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def input_lengths(self) -> np.ndarray:
+        return self.rows[:, 1]
+
+    @property
+    def label_lengths(self) -> np.ndarray:
+        return self.rows[:, 3]
+
+    def __getitem__(self, i) -> Dict[str, List[int]]:
+        input_offset, input_len, label_offset, label_len = (int(v) for v in self.rows[i])
+        input_ids = self.tokens[input_offset:input_offset + input_len].tolist()
+        labels = self.tokens[label_offset:label_offset + label_len].tolist()
+        attention_mask = [1] * len(input_ids)
+        if self.pad_to_max_length:
+            input_pad = self.max_input_tokens - len(input_ids)
+            input_ids += [self.pad_token_id] * input_pad
+            attention_mask += [0] * input_pad
+            labels += [self.pad_token_id] * (self.max_target_tokens - len(labels))
+        return {"input_ids": input_ids, "attention_mask": attention_mask, "labels": labels}
+
+    def subset(self, indices) -> "TokenizedSampleDataset":
+        subset = TokenizedSampleDataset(
+            self.tokens_path, self.rows[indices], self.pad_token_id,
+            self.max_input_tokens, self.max_target_tokens, self.pad_to_max_length,
+        )
+        # Dùng chung memmap và lock đọc, không để hở lúc dataset gốc bị thu hồi
+        subset._tokens, subset._reader = self._tokens, self._reader
+        return subset
+
+    def train_test_split(self, test_size: float = 0.1, seed: Optional[int] = None):
+        order = np.random.default_rng(seed).permutation(len(self.rows))
+        n_test = max(1, int(round(len(order) * test_size))) if len(order) > 1 else 0
+        return self.subset(order[n_test:]), self.subset(order[:n_test])
+
+
+class TokenizedSampleStore:
+    """
+    Cache token theo sample id + hash nội dung, tách thư mục theo tokenizer.
+
+    Token được append vào một file int32 duy nhất; `index.json` ghi offset của từng
+    sample và chỉ được thay (atomic) sau khi token đã ghi xong, nên dừng giữa chừng
+    chỉ để lại phần token thừa. Sample bị sửa được tokenize lại; khi phần thừa lớn
+    hơn phần còn dùng thì compact sang file token của generation mới rồi mới đổi index
+    sang file đó. File của generation cũ chỉ bị xoá khi không còn process nào đọc.
+
+    Nhiều process (job train, server) dùng chung thư mục: `build` giữ exclusive lock
+    (`fcntl.flock` trên LOCK_FILE) suốt lúc đọc index, append và compact.
+    """
+
+    def __init__(self, tokenizer, base_dir: str = TOKENIZED_CACHE_DIR,
+                 max_input_tokens: int = TRAIN_MAX_INPUT_TOKENS,
+                 max_target_tokens: int = TRAIN_MAX_TARGET_TOKENS,
+                 num_proc: int = TOKENIZE_NUM_PROC, chunk_size: int = TOKENIZE_CHUNK_SIZE):
+        self.tokenizer = tokenizer
+        self.max_input_tokens = max_input_tokens
+        self.max_target_tokens = max_target_tokens
+        self.num_proc = max(1, num_proc)
+        self.chunk_size = max(1, chunk_size)
+        self.fingerprint = tokenizer_fingerprint(tokenizer, max_input_tokens, max_target_tokens)
+        self.path = os.path.join(base_dir, self.fingerprint)
+        self.index_path = os.path.join(self.path, INDEX_FILE)
+        os.makedirs(self.path, exist_ok=True)
+        self.index = self._load_index()
+
+    @property
+    def tokens_path(self) -> str:
+        return os.path.join(self.path, self.index["tokens_file"])
+
+    def _load_index(self) -> Dict:
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {
+            "tokenizer": type(self.tokenizer).__name__,
+            "tokens_file": TOKENS_FILE,
+            "generation": 0,
+            "samples": {},
+            "dead_tokens": 0,
+        }
+
+    def _save_index(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, self.index_path)
+
+    @contextmanager
+    def _exclusive(self):
+        with open(os.path.join(self.path, LOCK_FILE), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _size_in_tokens(self) -> int:
+        return os.path.getsize(self.tokens_path) // _TOKEN_BYTES if os.path.exists(self.tokens_path) else 0
+
+    def build(self, samples: Iterable, pad_to_max_length: bool = True) -> Tuple[TokenizedSampleDataset, Dict]:
+        """
+        Tokenize các sample chưa có hoặc đã sửa, trả về dataset theo thứ tự sample và
+        thống kê cache. `samples` được đọc dần (có thể là cursor phía server); sample
+        cần tokenize được xử lý theo từng đợt `chunk_size * num_proc` nên bộ nhớ không
+        tăng theo kích thước corpus.
+        """
+        started = time.perf_counter()
+        with self._exclusive():
+            # Process khác có thể đã append/compact từ lúc store được tạo
+            self.index = self._load_index()
+            result = self._build_locked(samples, pad_to_max_length, started)
+            # Cả các file cũ còn người đọc ở lần compact trước
+            self._remove_stale_generations()
+            return result
+
+    def _build_locked(self, samples: Iterable, pad_to_max_length: bool,
+                      started: float) -> Tuple[TokenizedSampleDataset, Dict]:
+        entries = self.index["samples"]
+        sample_ids = []
+        pending = []
+        misses = 0
+        tokenize_seconds = 0.0
+        flush_size = self.chunk_size * self.num_proc
+
+        with ExitStack() as stack:
+            pool = _LazyPool(self, stack)
+            for sample in samples:
+                sample_ids.append(sample.id)
+                digest = content_hash(sample)
+                entry = entries.get(sample.id)
+                if entry is None or entry["hash"] != digest:
+                    pending.append((sample.id, digest, sample_records(sample.input_text, sample.title, sample.target_summary)))
+                if len(pending) >= flush_size:
+                    tokenize_seconds += self._append(pending, pool)
+                    misses += len(pending)
+                    pending = []
+            if pending:
+                tokenize_seconds += self._append(pending, pool)
+                misses += len(pending)
+
+        if misses:
+            self._save_index()
+            self._maybe_compact()
+
+        if not sample_ids:
+            raise ValueError("No samples selected for training.")
+
+        rows = np.asarray([row for sample_id in sample_ids for row in entries[sample_id]["rows"]], dtype=np.int64)
+        dataset = TokenizedSampleDataset(
+            self.tokens_path, rows, self.tokenizer.pad_token_id,
+            self.max_input_tokens, self.max_target_tokens, pad_to_max_length,
+        )
+        # Mở file token (kèm lock đọc) trước khi nhả lock ghi để compaction không xoá mất nó
+        dataset.tokens
+        stats = {
+            "fingerprint": self.fingerprint,
+            "samples": len(sample_ids),
+            "hits": len(sample_ids) - misses,
+            "misses": misses,
+            "tokenize_seconds": round(tokenize_seconds, 2),
+            "total_seconds": round(time.perf_counter() - started, 2),
+        }
+        logger.info(f"Tokenized sample cache: {stats}")
+        return dataset, stats
+
+    def _tokenize_misses(self, misses, pool: "_LazyPool"):
+        """Yield token của từng chunk theo đúng thứ tự; nhiều chunk thì chia cho process pool."""
+        chunks = [misses[i:i + self.chunk_size] for i in range(0, len(misses), self.chunk_size)]
+        jobs = [
+            ([record for _, _, records in chunk for record in records], self.max_input_tokens, self.max_target_tokens)
+            for chunk in chunks
+        ]
+        if self.num_proc > 1 and len(chunks) > 1:
+            yield from zip(chunks, pool.get().map(_tokenize_chunk, jobs))
+        else:
+            for chunk, (records, max_input_tokens, max_target_tokens) in zip(chunks, jobs):
+                yield chunk, _tokenize_records(self.tokenizer, records, max_input_tokens, max_target_tokens)
+
+    def _append(self, misses, pool: "_LazyPool") -> float:
+        """Tokenize và append token vào file; index chỉ được ghi khi build xong."""
+        started = time.perf_counter()
+        entries = self.index["samples"]
+        offset = self._size_in_tokens()
+        with open(self.tokens_path, "ab") as f:
+            for chunk, tokenized in self._tokenize_misses(misses, pool):
+                pairs = iter(tokenized)
+                for sample_id, digest, records in chunk:
+                    rows = []
+                    for _ in records:
+                        input_ids, labels = next(pairs)
+                        f.write(np.asarray(input_ids, dtype=_TOKEN_DTYPE).tobytes())
+                        f.write(np.asarray(labels, dtype=_TOKEN_DTYPE).tobytes())
+                        rows.append([offset, len(input_ids), offset + len(input_ids), len(labels)])
+                        offset += len(input_ids) + len(labels)
+                    old = entries.get(sample_id)
+                    if old is not None:
+                        self.index["dead_tokens"] += sum(row[1] + row[3] for row in old["rows"])
+                    entries[sample_id] = {"hash": digest, "rows": rows}
+            f.flush()
+            os.fsync(f.fileno())
+        return time.perf_counter() - started
+
+    def _maybe_compact(self):
+        dead = self.index["dead_tokens"]
+        if dead <= self._size_in_tokens() - dead:
+            return
+        logger.info(f"Compacting tokenized sample cache at {self.path} ({dead} dead tokens)")
+        old_path = self.tokens_path
+        tokens = np.memmap(old_path, dtype=_TOKEN_DTYPE, mode="r")
+        generation = self.index["generation"] + 1
+        tokens_file = f"tokens.{generation}.bin"
+        offset = 0
+        new_rows = {}
+        with open(os.path.join(self.path, tokens_file), "wb") as f:
+            for sample_id, entry in self.index["samples"].items():
+                rows = []
+                for input_offset, input_len, label_offset, label_len in entry["rows"]:
+                    f.write(tokens[input_offset:input_offset + input_len].tobytes())
+                    f.write(tokens[label_offset:label_offset + label_len].tobytes())
+                    rows.append([offset, input_len, offset + input_len, label_len])
+                    offset += input_len + label_len
+                new_rows[sample_id] = rows
+            f.flush()
+            os.fsync(f.fileno())
+        del tokens
+
+        for sample_id, rows in new_rows.items():
+            self.index["samples"][sample_id]["rows"] = rows
+        self.index.update({"tokens_file": tokens_file, "generation": generation, "dead_tokens": 0})
+        self._save_index()
+
+    def _remove_stale_generations(self):
+        """Xoá file token của các generation cũ không còn process nào giữ lock đọc."""
+        for name in os.listdir(self.path):
+            if not (name.startswith("tokens") and name.endswith(".bin")) or name == self.index["tokens_file"]:
+                continue
+            path = os.path.join(self.path, name)
+            with open(path, "rb") as f:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    logger.info(f"Keeping {path}: still being read")
+                    continue
+                os.remove(path)
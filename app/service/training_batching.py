@@ -0,0 +1,156 @@
+"""Batch train theo ngân sách token: gom sample có độ dài gần nhau, pad động theo từng batch"""
+import logging
+import os
+import time
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Sampler
+from transformers import Trainer, TrainerCallback
+from transformers.trainer import OPTIMIZER_NAME, SCHEDULER_NAME
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBudgetBatchSampler(Sampler[List[int]]):
+    """
+    Sắp sample theo (độ dài input, độ dài label) rồi cắt batch sao cho
+    `batch_size * (max_input_len + max_label_len) <= max_tokens`.
+
+    Ranh giới batch chỉ phụ thuộc dãy độ dài đã sắp nên số batch cố định giữa các
+    epoch (Trainer tính số step từ `len`); mỗi epoch xáo thứ tự các sample cùng độ
+    dài và thứ tự các batch.
+    """
+
+    def __init__(self, input_lengths, label_lengths, max_tokens: int,
+                 max_batch_size: Optional[int] = None, seed: int = 0):
+        self.input_lengths = np.asarray(input_lengths, dtype=np.int64)
+        self.label_lengths = np.asarray(label_lengths, dtype=np.int64)
+        self.max_tokens = max_tokens
+        self.max_batch_size = max_batch_size
+        self.seed = seed
+        self.epoch = 0
+        self._num_batches = len(self._batches(np.random.default_rng(seed)))
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+
+    def _batches(self, rng) -> List[List[int]]:
+        order = np.lexsort((rng.random(len(self.input_lengths)), self.label_lengths, self.input_lengths))
+        batches, current = [], []
+        max_input = max_label = 0
+        for idx in order.tolist():
+            new_input = max(max_input, self.input_lengths[idx])
+            new_label = max(max_label, self.label_lengths[idx])
+            full = self.max_batch_size is not None and len(current) >= self.max_batch_size
+            if current and (full or (len(current) + 1) * (new_input + new_label) > self.max_tokens):
+                batches.append(current)
+                current = []
+                new_input, new_label = self.input_lengths[idx], self.label_lengths[idx]
+            current.append(idx)
+            max_input, max_label = new_input, new_label
+        if current:
+            batches.append(current)
+        return batches
+
+    def batches(self) -> List[List[int]]:
+        return self._batches(np.random.default_rng(self.seed))
+
+    def __iter__(self) -> Iterator[List[int]]:
+        rng = np.random.default_rng(self.seed + self.epoch)
+        batches = self._batches(rng)
+        rng.shuffle(batches)
+        self.epoch += 1
+        return iter(batches)
+
+    def __len__(self) -> int:
+        return self._num_batches
+
+
+class TokenBudgetTrainer(Trainer):
+    """Trainer dùng batch sampler theo ngân sách token cho tập train."""
+
+    def __init__(self, *args, batch_sampler: TokenBudgetBatchSampler, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batch_sampler = batch_sampler
+
+    def get_train_dataloader(self) -> DataLoader:
+        if self.train_dataset is None:
+            raise ValueError("Trainer: training requires a train_dataset.")
+        dataloader = DataLoader(
+            self.train_dataset,
+            batch_sampler=self.batch_sampler,
+            collate_fn=self.data_collator,
+            num_workers=self.args.dataloader_num_workers,
+            pin_memory=self.args.dataloader_pin_memory,
+        )
+        dataloader = self.accelerator.prepare(dataloader)
+        # Nhiều process: accelerate bọc sampler bằng BatchSamplerShard, lớp này không chuyển
+        # set_epoch xuống nên resume giữa epoch sẽ sai thứ tự batch nếu không gắn lại
+        shard = dataloader.batch_sampler
+        if shard is not self.batch_sampler and not hasattr(shard, "set_epoch"):
+            shard.set_epoch = self.batch_sampler.set_epoch
+        return dataloader
+
+    def _load_optimizer_and_scheduler(self, checkpoint):
+        # Nhiều process CPU: Trainer dùng map_location = args.device ("cpu:0"), torch.load không nhận được
+        if checkpoint is None or self.args.world_size <= 1 or self.args.device.type != "cpu":
+            return super()._load_optimizer_and_scheduler(checkpoint)
+        optimizer_path = os.path.join(checkpoint, OPTIMIZER_NAME)
+        scheduler_path = os.path.join(checkpoint, SCHEDULER_NAME)
+        if os.path.isfile(optimizer_path) and os.path.isfile(scheduler_path):
+            self.optimizer.load_state_dict(torch.load(optimizer_path, map_location="cpu", weights_only=True))
+            self.lr_scheduler.load_state_dict(torch.load(scheduler_path, weights_only=True))
+
+
+class StepTimer(TrainerCallback):
+    """Ghi thời điểm kết thúc từng optimizer step (dùng để đo throughput bỏ qua step khởi động)."""
+
+    def __init__(self):
+        self.step_times: List[float] = []
+
+    def on_step_end(self, args, state, control, **kwargs):
+        self.step_times.append(time.perf_counter())
+
+
+def padding_report(input_lengths, label_lengths, batches: List[List[int]],
+                   fixed_input_length: int, fixed_label_length: int) -> Dict:
+    """
+    So sánh tỉ lệ token thật trên token đã pad giữa cách cũ (pad cố định tới
+    max_length) và batch theo ngân sách token với pad động.
+    """
+    input_lengths = np.asarray(input_lengths, dtype=np.int64)
+    label_lengths = np.asarray(label_lengths, dtype=np.int64)
+    real_tokens = int(input_lengths.sum() + label_lengths.sum())
+    fixed_tokens = len(input_lengths) * (fixed_input_length + fixed_label_length)
+    dynamic_tokens = int(sum(
+        len(batch) * (input_lengths[batch].max() + label_lengths[batch].max()) for batch in batches
+    ))
+    return {
+        "examples": len(input_lengths),
+        "batches": len(batches),
+        "avg_batch_size": round(len(input_lengths) / len(batches), 2) if batches else 0.0,
+        "real_tokens": real_tokens,
+        "fixed_padded_tokens": fixed_tokens,
+        "dynamic_padded_tokens": dynamic_tokens,
+        "fixed_padding_efficiency": round(real_tokens / fixed_tokens, 4) if fixed_tokens else 0.0,
+        "dynamic_padding_efficiency": round(real_tokens / dynamic_tokens, 4) if dynamic_tokens else 0.0,
+    }
+
+
+def throughput_report(report: Dict, train_runtime: float, epochs: float) -> Dict:
+    """
+    Token/s của lần train này; token/s của cách pad cố định được ước tính với giả
+    định cùng số token đã pad xử lý mỗi giây.
+    """
+    if train_runtime <= 0:
+        return {}
+    padded_per_sec = report["dynamic_padded_tokens"] * epochs / train_runtime
+    real_per_sec = report["real_tokens"] * epochs / train_runtime
+    return {
+        "train_runtime": round(train_runtime, 2),
+        "padded_tokens_per_sec": round(padded_per_sec, 2),
+        "real_tokens_per_sec": round(real_per_sec, 2),
+        "estimated_fixed_padding_real_tokens_per_sec": round(padded_per_sec * report["fixed_padding_efficiency"], 2),
+    }
@@ -0,0 +1,64 @@
+"""Checkpoint theo từng lần train: thư mục riêng, tìm checkpoint hợp lệ mới nhất để resume, dừng sớm"""
+import dataclasses
+import logging
+import os
+import re
+import shutil
+from typing import List, Optional
+
+from transformers import EarlyStoppingCallback, TrainerCallback, TrainingArguments
+
+from constant.constants import (
+    default_training_args,
+    TRAIN_CHECKPOINT_DIR,
+    TRAIN_EARLY_STOPPING_PATIENCE,
+    TRAIN_EARLY_STOPPING_THRESHOLD,
+)
+
+logger = logging.getLogger(__name__)
+
+_CHECKPOINT_RE = re.compile(r"^checkpoint-(\d+)$")
+
+
+def checkpoint_dir_for_run(run_id: str) -> str:
+    """Thư mục checkpoint của một lần train; chạy lại cùng `run_id` sẽ resume từ đây."""
+    return os.path.join(TRAIN_CHECKPOINT_DIR, run_id)
+
+
+def training_args_for_run(output_dir: str) -> TrainingArguments:
+    return dataclasses.replace(default_training_args, output_dir=output_dir)
+
+
+def latest_checkpoint(output_dir: str) -> Optional[str]:
+    """
+    Checkpoint mới nhất đã ghi xong. `trainer_state.json` được ghi sau model,
+    optimizer, scheduler và RNG state, nên checkpoint thiếu file này (process bị
+    kill giữa lúc save) bị bỏ qua và dùng checkpoint trước đó.
+    """
+    if not os.path.isdir(output_dir):
+        return None
+    steps = sorted(
+        (int(match.group(1)), name)
+        for name in os.listdir(output_dir)
+        if (match := _CHECKPOINT_RE.match(name)) and os.path.isdir(os.path.join(output_dir, name))
+    )
+    for step, name in reversed(steps):
+        path = os.path.join(output_dir, name)
+        if os.path.isfile(os.path.join(path, "trainer_state.json")):
+            return path
+        logger.warning(f"Ignoring incomplete checkpoint {path}")
+    return None
+
+
+def remove_checkpoints(output_dir: str):
+    """Xoá checkpoint của lần train đã xong (model cuối đã được lưu vào models_versions)."""
+    shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def early_stopping_callbacks() -> List[TrainerCallback]:
+    if TRAIN_EARLY_STOPPING_PATIENCE <= 0:
+        return []
+    return [EarlyStoppingCallback(
+        early_stopping_patience=TRAIN_EARLY_STOPPING_PATIENCE,
+        early_stopping_threshold=TRAIN_EARLY_STOPPING_THRESHOLD,
+    )]
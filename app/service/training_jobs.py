@@ -0,0 +1,254 @@
+"""Chạy job train trong process riêng; trạng thái job lưu trong database"""
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from app.models import SessionLocal
+from app.models.database import TrainingJob
+from app.repositories.training_job_repository import (
+    TrainingJobRepository,
+    JOB_QUEUED,
+    JOB_RUNNING,
+    JOB_COMPLETED,
+    JOB_FAILED,
+)
+from app.service.distributed_training import (
+    is_main_process,
+    plan_workers,
+    start_workers,
+    terminate_workers,
+    wait_workers,
+)
+from constant.constants import (
+    TRAINING_NUM_THREADS,
+    TRAINING_JOB_POLL_SECONDS,
+    TRAINING_NUM_WORKERS,
+    TRAINING_JOB_HEARTBEAT_SECONDS,
+    TRAINING_JOB_LEASE_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def job_to_dict(job: TrainingJob) -> Dict:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "model_id": job.model_id,
+        "progress": round(job.progress or 0.0, 4),
+        "message": job.message,
+        "result": json.loads(job.result) if job.result else None,
+        "request": json.loads(job.request),
+        "worker_pid": job.worker_pid,
+        "worker_host": job.worker_host,
+        "heartbeat_at": _iso(job.heartbeat_at),
+        "created_at": _iso(job.created_at),
+        "started_at": _iso(job.started_at),
+        "finished_at": _iso(job.finished_at),
+    }
+
+
+class JobHeartbeat:
+    """Thread gia hạn lease của job mỗi `interval` giây (session DB riêng) cho tới khi `stop`."""
+
+    def __init__(self, job_id: str, interval: float = TRAINING_JOB_HEARTBEAT_SECONDS):
+        self.job_id = job_id
+        self.interval = interval
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"heartbeat-{job_id}", daemon=True)
+
+    def start(self) -> "JobHeartbeat":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        self._thread.join()
+
+    def _run(self):
+        repository = TrainingJobRepository(SessionLocal())
+        try:
+            while not self._stopping.wait(self.interval):
+                try:
+                    if not repository.heartbeat(self.job_id):
+                        # Job đã kết thúc hoặc bị requeue
+                        return
+                except Exception as e:
+                    logger.warning(f"Heartbeat for training job {self.job_id} failed: {str(e)}")
+                    repository.db.rollback()
+        finally:
+            repository.db.close()
+
+
+def run_training_job(job_id: str, num_threads: int):
+    """
+    Entry point của process train (spawn): giới hạn thread rồi chạy ModelService.train_model.
+    Checkpoint nằm trong thư mục riêng của job nên job chạy lại sẽ resume từ checkpoint mới nhất.
+
+    Khi train data-parallel, mọi worker đều chạy hàm này; chỉ rank 0 ghi trạng thái job
+    và gia hạn lease của job. Worker khác gặp lỗi thì thoát với mã lỗi để dispatcher dừng cả nhóm.
+    """
+    heartbeat = JobHeartbeat(job_id).start() if is_main_process() else None
+    try:
+        _run_training_job(job_id, num_threads)
+    finally:
+        if heartbeat is not None:
+            heartbeat.stop()
+
+
+def _run_training_job(job_id: str, num_threads: int):
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(num_threads)
+    import torch
+    torch.set_num_threads(num_threads)
+
+    from app.repositories.model_repository import ModelRepository
+    from app.repositories.sample_repository import SampleRepository
+    from app.schemas import TrainRequest
+    from app.service.model_service import ModelService
+    from app.service.training_checkpoints import checkpoint_dir_for_run
+    from app.service.training_progress import JobProgressCallback
+
+    main = is_main_process()
+    repository = TrainingJobRepository(SessionLocal())
+    job = repository.get(job_id)
+    try:
+        request = TrainRequest(**json.loads(job.request))
+        if main:
+            repository.update(job_id, message="Preparing dataset")
+        service = ModelService(ModelRepository(SessionLocal()), SampleRepository(SessionLocal()))
+        result = service.train_model(
+            request,
+            callbacks=[JobProgressCallback(job_id, repository)] if main else [],
+            checkpoint_dir=checkpoint_dir_for_run(job_id),
+        )
+        if not main:
+            return
+        repository.update(
+            job_id,
+            status=JOB_COMPLETED,
+            progress=1.0,
+            message="Completed",
+            result=json.dumps(result.dict(), ensure_ascii=False, default=str),
+            finished_at=datetime.now(timezone.utc),
+        )
+        logger.info(f"Training job {job_id} completed")
+    except Exception as e:
+        logger.exception(f"Training job {job_id} failed")
+        if not main:
+            raise
+        repository.update(job_id, status=JOB_FAILED, message=str(e), finished_at=datetime.now(timezone.utc))
+
+
+class TrainingJobRunner:
+    """
+    Dispatcher chạy trong server: lấy lần lượt job `queued` theo thứ tự tạo và chạy
+    mỗi job trong process spawn riêng với tổng cộng `num_threads` CPU thread, nên train
+    không tranh thread với inference. `num_workers > 1` chạy data-parallel (gloo) với
+    `num_workers` process, mỗi process `num_threads // num_workers` thread.
+
+    Job nằm trong database nên job queued vẫn còn sau khi restart. Process train gia hạn
+    lease (`heartbeat_at`) của job; mỗi dispatcher (trên bất kỳ máy nào) đưa job `running`
+    có lease quá `lease_seconds` về hàng đợi, job đó train tiếp từ checkpoint mới nhất.
+    """
+
+    def __init__(self, num_threads: int = TRAINING_NUM_THREADS, poll_seconds: float = TRAINING_JOB_POLL_SECONDS,
+                 num_workers: int = TRAINING_NUM_WORKERS, lease_seconds: float = TRAINING_JOB_LEASE_SECONDS):
+        self.num_threads = max(1, num_threads)
+        self.num_workers = max(1, num_workers)
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._processes: List = []
+        self._job_id: Optional[str] = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        repository = TrainingJobRepository(SessionLocal())
+        try:
+            self._recover(repository)
+        finally:
+            repository.db.close()
+        self._thread = threading.Thread(target=self._loop, name="training-job-runner", daemon=True)
+        self._thread.start()
+
+    def notify(self):
+        """Báo có job mới để không phải chờ hết chu kỳ poll."""
+        self._wake.set()
+
+    def stop(self, timeout: float = 10):
+        """Dừng dispatcher; job đang chạy bị dừng và đưa lại hàng đợi để chạy lại sau khi khởi động."""
+        self._stopping.set()
+        self._wake.set()
+        processes, job_id = self._processes, self._job_id
+        if any(process.is_alive() for process in processes):
+            terminate_workers(processes, timeout)
+            repository = TrainingJobRepository(SessionLocal())
+            try:
+                job = repository.get(job_id)
+                if job is not None and job.status == JOB_RUNNING:
+                    repository.update(job_id, status=JOB_QUEUED, progress=0.0, worker_pid=None,
+                                      worker_host=None, heartbeat_at=None,
+                                      message="Requeued after server shutdown")
+            finally:
+                repository.db.close()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _recover(self, repository: TrainingJobRepository):
+        expired_before = datetime.now(timezone.utc) - timedelta(seconds=self.lease_seconds)
+        for job_id in repository.requeue_expired(expired_before):
+            logger.info(f"Requeued training job {job_id}: no heartbeat for {self.lease_seconds:.0f}s")
+
+    def _loop(self):
+        repository = TrainingJobRepository(SessionLocal())
+        while not self._stopping.is_set():
+            try:
+                # Cả job của máy khác đã dừng mà không kịp đưa job lại hàng đợi
+                self._recover(repository)
+                job = repository.next_queued()
+                if job is not None and repository.claim(job.id):
+                    self._run(repository, job.id)
+                    continue
+            except Exception as e:
+                logger.error(f"Training job dispatcher error: {str(e)}")
+                repository.db.rollback()
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+        repository.db.close()
+
+    def _run(self, repository: TrainingJobRepository, job_id: str):
+        layout = plan_workers(self.num_workers, self.num_threads)
+        logger.info(f"Starting training job {job_id} with {layout.world_size} worker(s) "
+                    f"x {layout.threads_per_worker} threads")
+        # spawn: không kế thừa thread/lock của server; không daemon để process train được tạo pool tokenize
+        processes = start_workers(
+            layout, "app.service.training_jobs:run_training_job",
+            (job_id, layout.threads_per_worker), name=f"train-{job_id}",
+        )
+        self._processes, self._job_id = processes, job_id
+        repository.update(job_id, worker_pid=processes[0].pid)
+        exitcode = wait_workers(processes)
+        self._processes, self._job_id = [], None
+
+        if self._stopping.is_set():
+            return
+        job = repository.get(job_id)
+        if job is not None and job.status == JOB_RUNNING:
+            # Process chết mà không kịp ghi trạng thái (ví dụ bị OOM kill)
+            repository.update(job_id, status=JOB_FAILED, finished_at=datetime.now(timezone.utc),
+                              message=f"Training process exited with code {exitcode}")
+
+
+training_job_runner = TrainingJobRunner()
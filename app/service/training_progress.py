@@ -0,0 +1,40 @@
+"""Ghi tiến độ train vào job trong database (chạy trong process train)"""
+import time
+
+from transformers import TrainerCallback
+
+from app.repositories.training_job_repository import TrainingJobRepository
+
+
+class JobProgressCallback(TrainerCallback):
+    """Ghi tiến độ train (step / tổng step) vào job, tối đa một lần mỗi `min_interval` giây."""
+
+    def __init__(self, job_id: str, repository: TrainingJobRepository, min_interval: float = 5.0):
+        self.job_id = job_id
+        self.repository = repository
+        self.min_interval = min_interval
+        self._last_update = 0.0
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        if state.global_step > 0:
+            self.repository.update(
+                self.job_id,
+                progress=state.global_step / state.max_steps if state.max_steps else 0.0,
+                message=f"Resumed from checkpoint at step {state.global_step}/{state.max_steps}",
+            )
+
+    def on_step_end(self, args, state, control, **kwargs):
+        now = time.monotonic()
+        if state.max_steps and now - self._last_update >= self.min_interval:
+            self._last_update = now
+            self.repository.update(
+                self.job_id,
+                progress=state.global_step / state.max_steps,
+                message=f"Training step {state.global_step}/{state.max_steps}",
+            )
+
+    def on_train_end(self, args, state, control, **kwargs):
+        message = "Saving model and computing metrics"
+        if state.max_steps and state.global_step < state.max_steps:
+            message = f"Early stopped at step {state.global_step}/{state.max_steps}. {message}"
+        self.repository.update(self.job_id, progress=1.0, message=message)
@@ -1,18 +1,165 @@
 """Constants and default configurations"""
-from transformers import TrainingArguments
-
-default_training_args = TrainingArguments(
-    output_dir="./models_saved_checkpoints",
-    eval_strategy="steps",
-    per_device_train_batch_size=2,
-    per_device_eval_batch_size=4,
-    gradient_accumulation_steps=4,
-    num_train_epochs=3,
-    learning_rate=5e-5,
-    logging_steps=100,
-    save_steps=500,
-    save_total_limit=2,
-    fp16=True,
-    save_strategy="no",
-)
+import os
 
+# Checkpoint định kỳ (model + optimizer + scheduler + RNG) để job train bị dừng/lỗi chạy tiếp được
+TRAIN_CHECKPOINT_STEPS = int(os.getenv("TRAIN_CHECKPOINT_STEPS", "500"))
+TRAIN_CHECKPOINT_TOTAL_LIMIT = int(os.getenv("TRAIN_CHECKPOINT_TOTAL_LIMIT", "2"))
+# Dừng sớm khi eval_loss không giảm quá threshold sau `patience` lần eval liên tiếp (0 = tắt)
+TRAIN_EARLY_STOPPING_PATIENCE = int(os.getenv("TRAIN_EARLY_STOPPING_PATIENCE", "3"))
+TRAIN_EARLY_STOPPING_THRESHOLD = float(os.getenv("TRAIN_EARLY_STOPPING_THRESHOLD", "0.0"))
+# Backend torch.distributed khi train nhiều process (gloo cho CPU)
+TRAINING_DIST_BACKEND = os.getenv("TRAINING_DIST_BACKEND", "gloo")
+# Thư mục checkpoint, mỗi lần train một thư mục con
+TRAIN_CHECKPOINT_DIR = os.getenv("TRAIN_CHECKPOINT_DIR", "./models_saved_checkpoints")
+
+
+def _build_default_training_args():
+    import torch
+    from transformers import TrainingArguments
+
+    return TrainingArguments(
+        output_dir=TRAIN_CHECKPOINT_DIR,
+        eval_strategy="steps",
+        eval_steps=TRAIN_CHECKPOINT_STEPS,
+        per_device_train_batch_size=2,
+        per_device_eval_batch_size=4,
+        gradient_accumulation_steps=4,
+        num_train_epochs=3,
+        learning_rate=5e-5,
+        logging_steps=100,
+        save_steps=TRAIN_CHECKPOINT_STEPS,
+        save_total_limit=TRAIN_CHECKPOINT_TOTAL_LIMIT,
+        # fp16 chỉ có ích trên GPU; trên CPU giữ fp32 và để accelerate nhận nhiều process CPU (MULTI_CPU)
+        fp16=torch.cuda.is_available(),
+        use_cpu=not torch.cuda.is_available(),
+        # Chỉ đặt backend khi chạy nhiều process (WORLD_SIZE do launcher đặt), process đơn không có process group
+        ddp_backend=TRAINING_DIST_BACKEND if int(os.getenv("WORLD_SIZE", "1")) > 1 else None,
+        save_strategy="steps",
+        load_best_model_at_end=True,
+        metric_for_best_model="eval_loss",
+        greater_is_better=False,
+    )
+
+
+def __getattr__(name):
+    # TrainingArguments kéo theo torch/transformers nên chỉ dựng khi code train dùng tới
+    if name == "default_training_args":
+        value = globals()[name] = _build_default_training_args()
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Micro-batching cho /summarize
+SUMMARIZE_MAX_BATCH_SIZE = int(os.getenv("SUMMARIZE_MAX_BATCH_SIZE", "8"))
+SUMMARIZE_MAX_WAIT_MS = float(os.getenv("SUMMARIZE_MAX_WAIT_MS", "20"))
+
+# Sinh title + summary trong một lần generate, mỗi task có giới hạn độ dài riêng
+SUMMARIZE_FUSED_GENERATE = os.getenv("SUMMARIZE_FUSED_GENERATE", "true").lower() in ("1", "true", "yes")
+TITLE_MAX_NEW_TOKENS = int(os.getenv("TITLE_MAX_NEW_TOKENS", "256"))
+SUMMARY_MAX_NEW_TOKENS = int(os.getenv("SUMMARY_MAX_NEW_TOKENS", "256"))
+
+# Cache kết quả tóm tắt theo nội dung bài viết
+SUMMARY_CACHE_ENABLED = os.getenv("SUMMARY_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+SUMMARY_CACHE_MAX_BYTES = int(os.getenv("SUMMARY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+SUMMARY_CACHE_TTL_SECONDS = float(os.getenv("SUMMARY_CACHE_TTL_SECONDS", "3600"))
+
+# Bulk summarization: số item đọc vào mỗi cửa sổ (để sắp theo độ dài) và batch size
+BULK_WINDOW_SIZE = int(os.getenv("BULK_WINDOW_SIZE", "64"))
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "8"))
+
+# Inference executor: số tác vụ chạy đồng thời, giới hạn hàng đợi theo lane và deadline mặc định
+INFERENCE_MAX_CONCURRENCY = int(os.getenv("INFERENCE_MAX_CONCURRENCY", "4"))
+INFERENCE_MAX_QUEUE = int(os.getenv("INFERENCE_MAX_QUEUE", "32"))
+INFERENCE_MAX_BULK_QUEUE = int(os.getenv("INFERENCE_MAX_BULK_QUEUE", "4"))
+INFERENCE_DEFAULT_DEADLINE_MS = int(os.getenv("INFERENCE_DEFAULT_DEADLINE_MS", "30000"))
+
+# Backend dùng để serve một model version
+BACKEND_TORCH = "torch"
+BACKEND_TORCH_INT8 = "torch_int8"
+BACKEND_ONNX = "onnx"
+SERVING_BACKENDS = (BACKEND_TORCH, BACKEND_TORCH_INT8, BACKEND_ONNX)
+# Số sample (của chính version đó) dùng để đo ROUGE/latency khi quantize
+QUANTIZATION_EVAL_SAMPLES = int(os.getenv("QUANTIZATION_EVAL_SAMPLES", "50"))
+
+# Map-reduce cho bài dài: số token mỗi chunk, số chunk decode chung một batch, số vòng reduce tối đa
+LONG_DOC_CHUNK_TOKENS = int(os.getenv("LONG_DOC_CHUNK_TOKENS", "480"))
+LONG_DOC_FANOUT = int(os.getenv("LONG_DOC_FANOUT", "8"))
+LONG_DOC_MAX_DEPTH = int(os.getenv("LONG_DOC_MAX_DEPTH", "3"))
+LONG_DOC_PARTIAL_MAX_NEW_TOKENS = int(os.getenv("LONG_DOC_PARTIAL_MAX_NEW_TOKENS", "128"))
+
+# Profile decoding (fast, balanced, quality): mặc định của deployment và profile dùng khi đánh giá model
+DECODING_PROFILE = os.getenv("DECODING_PROFILE", "quality")
+EVAL_DECODING_PROFILE = os.getenv("EVAL_DECODING_PROFILE", "quality")
+# Số token input tối đa đưa vào encoder
+SUMMARIZE_MAX_INPUT_TOKENS = int(os.getenv("SUMMARIZE_MAX_INPUT_TOKENS", "512"))
+# Ước tính ban đầu (ms) cho một bước decode của một sequence, tự hiệu chỉnh theo thời gian generate thực tế
+DECODING_STEP_MS = float(os.getenv("DECODING_STEP_MS", "4"))
+
+# Cache token của sample cho training: thư mục, số process tokenize và số sample mỗi chunk
+TOKENIZED_CACHE_DIR = os.getenv("TOKENIZED_CACHE_DIR", "./tokenized_cache")
+TOKENIZE_NUM_PROC = int(os.getenv("TOKENIZE_NUM_PROC", str(min(4, os.cpu_count() or 1))))
+TOKENIZE_CHUNK_SIZE = int(os.getenv("TOKENIZE_CHUNK_SIZE", "2048"))
+TRAIN_MAX_INPUT_TOKENS = int(os.getenv("TRAIN_MAX_INPUT_TOKENS", "512"))
+TRAIN_MAX_TARGET_TOKENS = int(os.getenv("TRAIN_MAX_TARGET_TOKENS", "256"))
+
+# Batch train theo ngân sách token (input + label đã pad của cả batch) thay vì batch size cố định
+TRAIN_MAX_TOKENS_PER_BATCH = int(os.getenv("TRAIN_MAX_TOKENS_PER_BATCH", "1536"))
+TRAIN_MAX_BATCH_SIZE = int(os.getenv("TRAIN_MAX_BATCH_SIZE", "64"))
+
+# Job train chạy nền: số CPU thread của process train, chu kỳ quét hàng đợi, tắt dispatcher ở replica chỉ serve
+TRAINING_NUM_THREADS = int(os.getenv("TRAINING_NUM_THREADS", str(max(1, (os.cpu_count() or 2) // 2))))
+TRAINING_JOB_POLL_SECONDS = float(os.getenv("TRAINING_JOB_POLL_SECONDS", "5"))
+TRAINING_WORKER_ENABLED = os.getenv("TRAINING_WORKER_ENABLED", "true").lower() in ("1", "true", "yes")
+# Số process train data-parallel trên máy này; TRAINING_NUM_THREADS được chia đều cho các process
+TRAINING_NUM_WORKERS = int(os.getenv("TRAINING_NUM_WORKERS", "1"))
+# Process train gia hạn lease của job mỗi HEARTBEAT giây; job running quá LEASE giây không gia hạn được đưa lại hàng đợi
+TRAINING_JOB_HEARTBEAT_SECONDS = float(os.getenv("TRAINING_JOB_HEARTBEAT_SECONDS", "15"))
+TRAINING_JOB_LEASE_SECONDS = float(os.getenv("TRAINING_JOB_LEASE_SECONDS", "120"))
+
+# LoRA: chỉ train adapter low-rank (target module theo tên lớp của T5) trên một version gốc
+LORA_R = int(os.getenv("LORA_R", "8"))
+LORA_ALPHA = int(os.getenv("LORA_ALPHA", "16"))
+LORA_DROPOUT = float(os.getenv("LORA_DROPOUT", "0.05"))
+LORA_TARGET_MODULES = [name.strip() for name in os.getenv("LORA_TARGET_MODULES", "q,v").split(",") if name.strip()]
+LORA_LEARNING_RATE = float(os.getenv("LORA_LEARNING_RATE", "1e-4"))
+# Số adapter giữ trong bộ nhớ trên model gốc đang serve
+ADAPTER_MAX_LOADED = int(os.getenv("ADAPTER_MAX_LOADED", "8"))
+
+# Đánh giá model: batch size khi generate và số process CPU chia batch (1 = chạy trong process hiện tại)
+EVAL_BATCH_SIZE = int(os.getenv("EVAL_BATCH_SIZE", "16"))
+EVAL_NUM_WORKERS = int(os.getenv("EVAL_NUM_WORKERS", "1"))
+
+# Kho artifact model (dedup theo nội dung). Retention: giữ N version gần nhất, version cũ
+# không active/không làm gốc được nén (compress) hoặc xoá (evict); thư mục version không
+# thuộc model nào trong database quá ORPHAN_HOURS giờ cũng bị dọn
+MODEL_STORE_DIR = os.getenv("MODEL_STORE_DIR", "./models_versions")
+MODEL_RETENTION_KEEP_RECENT = int(os.getenv("MODEL_RETENTION_KEEP_RECENT", "3"))
+MODEL_RETENTION_MODE = os.getenv("MODEL_RETENTION_MODE", "compress")
+MODEL_RETENTION_AUTO = os.getenv("MODEL_RETENTION_AUTO", "false").lower() in ("1", "true", "yes")
+MODEL_RETENTION_ORPHAN_HOURS = float(os.getenv("MODEL_RETENTION_ORPHAN_HOURS", "24"))
+
+# Khởi động: nạp model active và generate thử trong lifespan. background: nhận request ngay,
+# /ready trả 503 tới khi xong; blocking: chỉ nhận request sau khi xong; off: nạp ở request đầu tiên
+MODEL_PRELOAD_MODE = os.getenv("MODEL_PRELOAD_MODE", "background")
+MODEL_WARMUP_MAX_NEW_TOKENS = int(os.getenv("MODEL_WARMUP_MAX_NEW_TOKENS", "8"))
+
+# Serve nhiều version trong một process: các version đã nạp nằm trong LRU giới hạn theo
+# tổng bộ nhớ weights (model active luôn được giữ); version không dùng quá IDLE_SECONDS giây
+# bị bỏ (0 = không bỏ theo thời gian)
+MODEL_RESIDENT_MAX_BYTES = int(os.getenv("MODEL_RESIDENT_MAX_BYTES", str(4 * 1024 * 1024 * 1024)))
+MODEL_RESIDENT_IDLE_SECONDS = float(os.getenv("MODEL_RESIDENT_IDLE_SECONDS", "1800"))
+
+# Shadow traffic: mirror FRACTION request /summarize sang version SHADOW_MODEL_ID (trống = tắt),
+# chạy ở lane bulk sau response chính; số liệu so sánh giữ trên STATS_WINDOW cặp gần nhất
+SHADOW_MODEL_ID = os.getenv("SHADOW_MODEL_ID", "")
+SHADOW_FRACTION = float(os.getenv("SHADOW_FRACTION", "0.05"))
+SHADOW_MAX_INFLIGHT = int(os.getenv("SHADOW_MAX_INFLIGHT", "2"))
+SHADOW_STATS_WINDOW = int(os.getenv("SHADOW_STATS_WINDOW", "1000"))
+
+# Số sample theo dataset cho /api/samples được cache, xoá khi sample được tạo/sửa/xoá
+# trong process này; TTL giới hạn độ lệch khi ghi từ process khác
+SAMPLE_COUNT_CACHE_TTL_SECONDS = float(os.getenv("SAMPLE_COUNT_CACHE_TTL_SECONDS", "60"))
+
+# Cận trên (không gồm) của các khoảng trong histogram số token của bảng dataset_stats;
+# đổi giá trị thì chạy scripts/rebuild_dataset_stats.py
+DATASET_STATS_TOKEN_BUCKETS = [int(edge) for edge in os.getenv("DATASET_STATS_TOKEN_BUCKETS", "64,128,256,512,1024").split(",") if edge.strip()]
@@ -1,3 +1,5 @@
+DROP TABLE IF EXISTS "dataset_stats" CASCADE;
+DROP TABLE IF EXISTS "training_job" CASCADE;
 DROP TABLE IF EXISTS "ModelDataset" CASCADE;
 DROP TABLE IF EXISTS "Sample" CASCADE;
 DROP TABLE IF EXISTS "Model" CASCADE;
@@ -36,6 +38,10 @@ CREATE TABLE "Model" (
     "finetune_time" TIME NOT NULL,
     "parameter" DOUBLE PRECISION NOT NULL,
     "baseModel" VARCHAR(255) NOT NULL,
+    "backend" VARCHAR(50) NOT NULL DEFAULT 'torch', -- torch, torch_int8, onnx
+    "quantization_report" TEXT NULL,  -- JSON kết quả đo khi quantize
+    "eval_seconds" DOUBLE PRECISION NULL,          -- thời gian tính metrics
+    "eval_examples_per_sec" DOUBLE PRECISION NULL, -- throughput khi tính metrics
     "Adminadmin_id" VARCHAR(255) NOT NULL 
 );
 
@@ -63,6 +69,38 @@ CREATE TABLE "ModelDataset" (
     PRIMARY KEY ("Datasetdataset_ID", "Modelmodel_id")
 );
 
+-- 6. Bảng "training_job" (job train chạy nền, lease theo heartbeat)
+CREATE TABLE "training_job" (
+    "id" VARCHAR(255) NOT NULL PRIMARY KEY,
+    "status" VARCHAR(50) NOT NULL DEFAULT 'queued', -- queued, running, completed, failed
+    "model_id" VARCHAR(255) NULL,
+    "request" TEXT NOT NULL,          -- JSON TrainRequest
+    "progress" DOUBLE PRECISION NOT NULL DEFAULT 0,
+    "message" TEXT NULL,
+    "result" TEXT NULL,               -- JSON kết quả train, dùng cho /model/save
+    "worker_pid" INTEGER NULL,
+    "worker_host" VARCHAR(255) NULL,
+    "heartbeat_at" TIMESTAMP NULL,
+    "created_at" TIMESTAMP NULL,
+    "started_at" TIMESTAMP NULL,
+    "finished_at" TIMESTAMP NULL
+);
+
+-- 7. Bảng "dataset_stats" (thống kê sample theo dataset, cập nhật tăng dần)
+CREATE TABLE "dataset_stats" (
+    "dataset_id" VARCHAR(255) NOT NULL PRIMARY KEY,
+    "sample_count" INTEGER NOT NULL DEFAULT 0,
+    "input_length_sum" BIGINT NOT NULL DEFAULT 0, -- độ dài tính theo số ký tự
+    "input_length_min" INTEGER NULL,
+    "input_length_max" INTEGER NULL,
+    "target_length_sum" BIGINT NOT NULL DEFAULT 0,
+    "target_length_min" INTEGER NULL,
+    "target_length_max" INTEGER NULL,
+    "input_token_histogram" TEXT NULL,  -- JSON: khoảng số token -> số sample
+    "target_token_histogram" TEXT NULL,
+    "updated_at" TIMESTAMP NULL
+);
+
 -- --- THÊM CÁC RÀNG BUỘC KHÓA NGOẠI (FOREIGN KEY) ---
 
 ALTER TABLE "Dataset"
@@ -84,3 +122,12 @@ FOREIGN KEY ("Datasetdataset_ID") REFERENCES "Dataset" ("dataset_ID");
 ALTER TABLE "ModelDataset"
 ADD CONSTRAINT "FK_ModelDataset_Model"
 FOREIGN KEY ("Modelmodel_id") REFERENCES "Model" ("model_id");
+
+ALTER TABLE "dataset_stats"
+ADD CONSTRAINT "FK_DatasetStats_Dataset"
+FOREIGN KEY ("dataset_id") REFERENCES "Dataset" ("dataset_ID");
+
+-- --- INDEX ---
+
+-- Keyset pagination danh sách sample theo id trong từng dataset
+CREATE INDEX "ix_sample_dataset_id_id" ON "Sample" ("Datasetdataset_ID", "sample_id");
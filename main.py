@@ -3,7 +3,10 @@ HTTM - ViT5 Text Summarization Server
 Main application entry point
 """
 
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
@@ -16,12 +19,34 @@ import uvicorn
 import os
 
 from app.router import summarize_router, model_router
+from app.service.model_warmup import model_warmup, PRELOAD_BACKGROUND, PRELOAD_BLOCKING
+from app.service.training_jobs import training_job_runner
+from constant.constants import TRAINING_WORKER_ENABLED, MODEL_PRELOAD_MODE
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Dispatcher job train: chạy lại các job còn trong hàng đợi từ lần chạy trước
+    if TRAINING_WORKER_ENABLED:
+        training_job_runner.start()
+    # Nạp model active và generate thử trước khi nhận traffic (xem /ready)
+    if MODEL_PRELOAD_MODE == PRELOAD_BLOCKING:
+        await asyncio.to_thread(model_warmup.run)
+    elif MODEL_PRELOAD_MODE == PRELOAD_BACKGROUND:
+        model_warmup.start()
+    else:
+        model_warmup.disable()
+    yield
+    if TRAINING_WORKER_ENABLED:
+        training_job_runner.stop()
+
 
 # Khởi tạo FastAPI app
 app = FastAPI(
     title="HTTM - ViT5 Text Summarization API & Sample Management",
     description="API for training ViT5 model, text summarization and sample management",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan,
 )
 app.add_middleware(
     CORSMiddleware,
@@ -57,6 +82,14 @@ def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
 
+@app.get("/ready")
+def readiness_check(response: Response):
+    """Readiness probe: 503 tới khi model active đã được nạp và generate thử xong"""
+    state = model_warmup.readiness()
+    if not state["ready"]:
+        response.status_code = 503
+    return state
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
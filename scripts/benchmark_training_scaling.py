@@ -0,0 +1,95 @@
+"""
+Đo đường cong scaling của train data-parallel trên CPU: samples/s theo số process
+
+    python scripts/benchmark_training_scaling.py --model-path VietAI/vit5-base --workers 1,2,4,8 --steps 20
+
+Mỗi cấu hình train `--steps` optimizer step trên các sample trong database (không eval,
+không checkpoint), tổng số CPU thread (`--threads`) được chia đều cho các process.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from typing import Dict, List, Optional
+
+# Thêm thư mục cha vào path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.service.distributed_training import plan_workers, start_workers, wait_workers
+
+
+def run_worker(model_path: str, max_steps: int, sample_limit: Optional[int], num_threads: int, output_path: str):
+    """Entry point của từng process benchmark; rank 0 ghi kết quả ra `output_path`."""
+    import torch
+    torch.set_num_threads(num_threads)
+
+    from app.models import SessionLocal
+    from app.repositories.model_repository import ModelRepository
+    from app.repositories.sample_repository import SampleRepository
+    from app.service.model_service import ModelService
+
+    service = ModelService(ModelRepository(SessionLocal()), SampleRepository(SessionLocal()))
+    result = service.benchmark_training(model_path, max_steps, sample_limit)
+    if result is not None:
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+
+
+def benchmark(model_path: str, workers: List[int], steps: int, sample_limit: Optional[int],
+              total_threads: int) -> List[Dict]:
+    results = []
+    for num_workers in workers:
+        layout = plan_workers(num_workers, total_threads)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_path = os.path.join(tmp_dir, "result.json")
+            processes = start_workers(
+                layout, "scripts.benchmark_training_scaling:run_worker",
+                (model_path, steps, sample_limit, layout.threads_per_worker, output_path),
+                name=f"benchmark-{num_workers}",
+            )
+            exitcode = wait_workers(processes)
+            if exitcode or not os.path.exists(output_path):
+                print(f"✗ {num_workers} worker(s): exited with code {exitcode}")
+                continue
+            with open(output_path, encoding="utf-8") as f:
+                result = json.load(f)
+        result["workers"] = num_workers
+        results.append(result)
+        print(f"  {num_workers} worker(s) x {layout.threads_per_worker} threads: "
+              f"{result['samples_per_sec']} samples/s")
+
+    if results:
+        base = results[0]
+        for result in results:
+            speedup = result["samples_per_sec"] / base["samples_per_sec"] if base["samples_per_sec"] else 0.0
+            result["speedup"] = round(speedup, 3)
+            result["efficiency"] = round(speedup * base["workers"] / result["workers"], 3)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Training throughput vs. number of data-parallel workers")
+    parser.add_argument("--model-path", required=True)
+    parser.add_argument("--workers", default="1,2,4", help="Danh sách số process, ví dụ 1,2,4,8")
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--samples", type=int, default=2000, help="Số sample tối đa lấy từ database")
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--output", help="Ghi kết quả JSON ra file")
+    args = parser.parse_args()
+
+    workers = [int(value) for value in args.workers.split(",") if value.strip()]
+    print(f"Benchmark {args.model_path}: {args.steps} steps, {args.threads} CPU threads")
+    results = benchmark(args.model_path, workers, args.steps, args.samples, args.threads)
+
+    print(f"\n{'workers':>8} {'threads':>8} {'samples/s':>10} {'speedup':>8} {'efficiency':>10}")
+    for result in results:
+        print(f"{result['workers']:>8} {result['threads_per_worker']:>8} {result['samples_per_sec']:>10} "
+              f"{result['speedup']:>8} {result['efficiency']:>10}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Đưa các thư mục version đã lưu trước khi có kho artifact vào kho (dedup theo nội dung,
+đổi weights .bin sang safetensors), rồi xoá blob không còn dùng.
+Script chạy được nhiều lần (version đã ở trong kho được bỏ qua)
+
+    python scripts/migrate_model_store.py [--dry-run]
+"""
+import argparse
+import os
+import sys
+
+# Thêm thư mục cha vào path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.service.model_store import model_store
+from constant.constants import MODEL_STORE_DIR
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move existing model versions into the content-addressed store")
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ liệt kê version chưa ở trong kho")
+    args = parser.parse_args()
+
+    from app.models import SessionLocal
+    from app.repositories.model_repository import ModelRepository
+    from app.repositories.sample_repository import SampleRepository
+    from app.service.model_service import ModelService
+
+    service = ModelService(ModelRepository(SessionLocal()), SampleRepository(SessionLocal()))
+    # Chỉ thư mục version nằm trong kho; model gốc ngoài kho (ví dụ thư mục HF) giữ nguyên
+    version_dirs = sorted(service.list_version_dirs().values())
+    pending = [path for path in version_dirs if not model_store.is_ingested(path)]
+    print(f"{len(version_dirs)} version dir(s) under {MODEL_STORE_DIR}, {len(pending)} not in the store")
+    if args.dry_run:
+        for path in pending:
+            print(f"  - {path}")
+        return
+
+    for path in pending:
+        try:
+            manifest = model_store.ingest(path)
+            print(f"  ✓ {path}: {len(manifest['files'])} file(s), {manifest['logical_bytes'] / 1024 / 1024:.1f}MB")
+        except Exception as e:
+            print(f"  ✗ {path}: {str(e)}")
+    gc = model_store.collect_garbage()
+    totals = model_store.totals()
+    print(f"\nBlobs: {totals['blob_count']} file(s), {totals['blob_bytes'] / 1024 / 1024:.1f}MB "
+          f"(removed {gc['removed_blobs']} unused)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Migration script để thêm các cột phục vụ inference vào database đã có
+Script chạy được nhiều lần (dùng IF NOT EXISTS)
+"""
+import sys
+import os
+
+# Thêm thư mục cha vào path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from app.models.database import engine
+
+MIGRATIONS = [
+    # Backend serve model (torch, torch_int8, onnx) và kết quả đo khi quantize
+    "ALTER TABLE model ADD COLUMN IF NOT EXISTS backend VARCHAR(50) NOT NULL DEFAULT 'torch'",
+    "ALTER TABLE model ADD COLUMN IF NOT EXISTS quantization_report TEXT",
+    # Thời gian đánh giá và throughput (examples/s) khi tính metrics
+    "ALTER TABLE model ADD COLUMN IF NOT EXISTS eval_seconds DOUBLE PRECISION",
+    "ALTER TABLE model ADD COLUMN IF NOT EXISTS eval_examples_per_sec DOUBLE PRECISION",
+    # Lease của job train: máy đang chạy và heartbeat gần nhất
+    "ALTER TABLE training_job ADD COLUMN IF NOT EXISTS worker_host VARCHAR(255)",
+    "ALTER TABLE training_job ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP",
+    # Keyset pagination của /api/samples theo id trong từng dataset
+    "CREATE INDEX IF NOT EXISTS ix_sample_dataset_id_id ON sample (dataset_id, id)",
+]
+
+
+def migrate_database():
+    """Chạy lần lượt các câu lệnh migration"""
+    try:
+        print("Đang cập nhật schema...")
+
+        with engine.connect() as conn:
+            for query in MIGRATIONS:
+                print(f"  - {query}")
+                conn.execute(text(query))
+            conn.commit()
+
+        print("\nDatabase đã được cập nhật!")
+
+    except Exception as e:
+        print(f"✗ Lỗi khi migration:")
+        print(f"  {str(e)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("Database Migration - Serving Schema")
+    print("=" * 50)
+    migrate_database()
@@ -10,6 +10,7 @@ import uuid
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.models.database import SessionLocal, Admin, Dataset, Sample
+from app.repositories.dataset_stats_repository import DatasetStatsChanges
 from sqlalchemy.orm import Session
 
 # --- CONFIGURATION ---
@@ -79,6 +80,7 @@ def populate_data():
                 continue
                 
             print(f"\nProcessing file: {file_name}...")
+            stats_changes = DatasetStatsChanges()
             with open(file_path, 'r', encoding='utf-8') as f:
                 for i, line in enumerate(f):
                     try:
@@ -100,13 +102,15 @@ def populate_data():
                             dataset_id=dataset.id
                         )
                         db.add(sample)
+                        stats_changes.add(dataset.id, sample.input_text, sample.target_summary)
                         
                     except json.JSONDecodeError:
                         print(f"  ✗ Error decoding JSON on line {i+1} in {file_name}")
                     except KeyError as e:
                         print(f"  ✗ Missing key {e} in record on line {i+1} in {file_name}")
 
-            # Commit changes for the current file
+            # Commit changes for the current file, cùng với thống kê của các dataset liên quan
+            stats_changes.apply(db)
             db.commit()
             print(f"✓ Finished processing {file_name}.")
 
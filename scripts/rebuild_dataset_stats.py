@@ -0,0 +1,37 @@
+"""
+Tính lại bảng dataset_stats từ bảng sample, dùng khi thống kê bị lệch (sample được ghi
+ngoài repository, đổi DATASET_STATS_TOKEN_BUCKETS, ...)
+
+    python scripts/rebuild_dataset_stats.py [--dataset-id ds_xxx ...]
+"""
+import argparse
+import os
+import sys
+
+# Thêm thư mục cha vào path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.database import SessionLocal
+from app.repositories.dataset_stats_repository import rebuild_dataset_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild per-dataset sample statistics")
+    parser.add_argument("--dataset-id", action="append", help="Chỉ tính lại dataset này (lặp lại được)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        count = rebuild_dataset_stats(db, args.dataset_id)
+        db.commit()
+        print(f"✓ Rebuilt statistics for {count} dataset(s)")
+    except Exception as e:
+        db.rollback()
+        print(f"✗ Rebuild failed: {str(e)}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
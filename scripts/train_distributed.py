@@ -0,0 +1,63 @@
+"""
+Chạy một job train data-parallel trên nhiều máy (mỗi máy chạy script này một lần)
+
+Tạo job bằng POST /api/model/train trên server đặt TRAINING_WORKER_ENABLED=false (để
+dispatcher trong server không tự nhận job), rồi trên từng máy:
+
+    python scripts/train_distributed.py --job-id job_xxx --nnodes 2 --node-rank 0 \
+        --master-addr 10.0.0.1 --master-port 29500 --nproc-per-node 4
+
+Node 0 nhận job (queued -> running), ghi trạng thái và lưu model. Các máy dùng chung
+database; để resume từ checkpoint thì thư mục models_saved_checkpoints cũng phải dùng chung.
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, timezone
+
+# Thêm thư mục cha vào path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.service.distributed_training import plan_workers, start_workers, wait_workers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-node data-parallel training for a queued job")
+    parser.add_argument("--job-id", required=True)
+    parser.add_argument("--nproc-per-node", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1,
+                        help="Tổng số CPU thread của máy này, chia đều cho các process")
+    parser.add_argument("--nnodes", type=int, default=1)
+    parser.add_argument("--node-rank", type=int, default=0)
+    parser.add_argument("--master-addr", default="127.0.0.1")
+    parser.add_argument("--master-port", type=int, default=0)
+    args = parser.parse_args()
+
+    layout = plan_workers(args.nproc_per_node, args.threads, args.master_addr, args.master_port,
+                          args.nnodes, args.node_rank)
+
+    from app.models import SessionLocal
+    from app.repositories.training_job_repository import TrainingJobRepository, JOB_RUNNING, JOB_FAILED
+    repository = TrainingJobRepository(SessionLocal())
+    if args.node_rank == 0 and not repository.claim(args.job_id):
+        print(f"✗ Job {args.job_id} không tồn tại hoặc không ở trạng thái queued")
+        sys.exit(1)
+
+    print(f"Node {args.node_rank}/{args.nnodes}: {layout.nproc_per_node} worker(s) "
+          f"x {layout.threads_per_worker} threads, world size {layout.world_size}")
+    processes = start_workers(layout, "app.service.training_jobs:run_training_job",
+                              (args.job_id, layout.threads_per_worker), name=f"train-{args.job_id}")
+    if args.node_rank == 0:
+        repository.update(args.job_id, worker_pid=processes[0].pid)
+    exitcode = wait_workers(processes)
+
+    if args.node_rank == 0:
+        job = repository.get(args.job_id)
+        if job is not None and job.status == JOB_RUNNING:
+            repository.update(args.job_id, status=JOB_FAILED, finished_at=datetime.now(timezone.utc),
+                              message=f"Training process exited with code {exitcode}")
+    sys.exit(1 if exitcode else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import threading
+from concurrent.futures import CancelledError
+
+import pytest
+
+from app.service.batch_scheduler import BatchScheduler
+
+
+class _RecordingHandler:
+    """Ghi lại (key, payloads) của từng batch; `gate` giữ batch đầu tiên cho tới khi được set."""
+
+    def __init__(self, gate: threading.Event = None):
+        self.batches = []
+        self.gate = gate
+        self.started = threading.Event()
+
+    def __call__(self, key, payloads, cancel_event=None):
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+            self.gate = None
+        self.batches.append((key, list(payloads)))
+        return [f"{key}:{payload}" for payload in payloads]
+
+
+def _submit_while_busy(scheduler, handler, gate, items):
+    """Giữ worker bận ở batch đầu để các item sau nằm sẵn trong hàng đợi khi gom batch."""
+    first = scheduler.submit_async("warmup", 0)
+    assert handler.started.wait(5)
+    futures = [scheduler.submit_async(key, payload) for key, payload in items]
+    gate.set()
+    first.result(5)
+    return [future.result(5) for future in futures]
+
+
+def test_items_with_same_key_are_batched_in_order():
+    gate = threading.Event()
+    handler = _RecordingHandler(gate)
+    scheduler = BatchScheduler(handler, max_batch_size=8, max_wait_ms=0)
+
+    results = _submit_while_busy(scheduler, handler, gate, [("a", i) for i in range(5)])
+
+    assert results == [f"a:{i}" for i in range(5)]
+    assert handler.batches[1:] == [("a", [0, 1, 2, 3, 4])]
+
+
+def test_key_change_is_carried_over_to_the_next_batch():
+    gate = threading.Event()
+    handler = _RecordingHandler(gate)
+    scheduler = BatchScheduler(handler, max_batch_size=8, max_wait_ms=0)
+
+    results = _submit_while_busy(scheduler, handler, gate, [("a", 1), ("a", 2), ("b", 3), ("a", 4), ("b", 5)])
+
+    assert results == ["a:1", "a:2", "b:3", "a:4", "b:5"]
+    # Item khác key không bị mất hay chạy nhầm batch, thứ tự đến được giữ
+    assert handler.batches[1:] == [("a", [1, 2]), ("b", [3]), ("a", [4]), ("b", [5])]
+
+
+def test_batch_is_capped_at_max_batch_size():
+    gate = threading.Event()
+    handler = _RecordingHandler(gate)
+    scheduler = BatchScheduler(handler, max_batch_size=3, max_wait_ms=0)
+
+    _submit_while_busy(scheduler, handler, gate, [("a", i) for i in range(7)])
+
+    assert [len(payloads) for _, payloads in handler.batches[1:]] == [3, 3, 1]
+    assert scheduler.stats()["total_items"] == 8
+
+
+def test_handler_error_fails_every_item_of_the_batch():
+    def handler(key, payloads):
+        raise RuntimeError("generate failed")
+
+    scheduler = BatchScheduler(handler, max_batch_size=4, max_wait_ms=50)
+    futures = [scheduler.submit_async("a", i) for i in range(3)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="generate failed"):
+            future.result(5)
+
+
+def test_wrong_result_count_is_an_error():
+    scheduler = BatchScheduler(lambda key, payloads: payloads[:-1], max_batch_size=4, max_wait_ms=50)
+    future = scheduler.submit_async("a", 1)
+    with pytest.raises(RuntimeError, match="returned 0 results for 1 items"):
+        future.result(5)
+
+
+def test_cancelled_item_is_dropped_before_its_batch_runs():
+    gate = threading.Event()
+    handler = _RecordingHandler(gate)
+    scheduler = BatchScheduler(handler, max_batch_size=8, max_wait_ms=0)
+    first = scheduler.submit_async("warmup", 0)
+    assert handler.started.wait(5)
+
+    cancelled = threading.Event()
+    dropped = scheduler.submit_async("a", 1, cancel_event=cancelled)
+    kept = scheduler.submit_async("a", 2, cancel_event=threading.Event())
+    cancelled.set()
+    gate.set()
+
+    assert first.result(5) == "warmup:0" and kept.result(5) == "a:2"
+    with pytest.raises(CancelledError):
+        dropped.result(5)
+    assert handler.batches[1:] == [("a", [2])]
+
+
+def test_batch_cancel_signal_is_set_only_when_every_item_is_cancelled():
+    started, release = threading.Event(), threading.Event()
+    signals = []
+
+    def handler(key, payloads, cancel_event=None):
+        signals.append(cancel_event)
+        started.set()
+        release.wait(5)
+        return payloads
+
+    scheduler = BatchScheduler(handler, max_batch_size=8, max_wait_ms=100)
+    events = [threading.Event(), threading.Event()]
+    futures = [scheduler.submit_async("k", i, cancel_event=event) for i, event in enumerate(events)]
+    assert started.wait(5)
+
+    events[0].set()
+    assert not signals[0].is_set()
+    events[1].set()
+    assert signals[0].is_set()
+    release.set()
+    # Output của item đã huỷ có thể bị cắt ngắn nên không được trả về
+    for future in futures:
+        with pytest.raises(CancelledError):
+            future.result(5)
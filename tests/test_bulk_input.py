@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+import pytest
+
+import app.controller.summarize_controller as summarize_controller_module
+from app.controller.summarize_controller import SummarizeController, iter_json_array, iter_ndjson
+
+
+async def _chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+def _collect(items):
+    async def _run():
+        return [item async for item in items]
+    return asyncio.run(_run())
+
+
+def _bulk_items(raw_items):
+    return [SummarizeController._to_bulk_item(index, raw) for index, raw in enumerate(raw_items)]
+
+
+def test_ndjson_lines_split_across_chunks():
+    items = _collect(iter_ndjson(_chunks(b'{"id": 1, "text": "a"}\n{"id"', b': 2, "text": "b"}\n\n"c"')))
+    assert items == [{"id": 1, "text": "a"}, {"id": 2, "text": "b"}, "c"]
+
+
+def test_ndjson_multibyte_character_split_across_chunks():
+    encoded = '{"text": "Hà Nội"}\n'.encode("utf-8")
+    split = encoded.index("à".encode("utf-8")) + 1
+    assert _collect(iter_ndjson(_chunks(encoded[:split], encoded[split:]))) == [{"text": "Hà Nội"}]
+
+
+def test_ndjson_invalid_line_becomes_item_error_and_parsing_continues():
+    raw = _collect(iter_ndjson(_chunks(b'"first"\n{not json}\n{"id": "x", "text": "third"}')))
+    items = _bulk_items(raw)
+
+    assert items[0] == {"index": 0, "id": None, "text": "first"}
+    assert items[1]["index"] == 1 and items[1]["error"].startswith("Invalid JSON")
+    assert items[2] == {"index": 2, "id": "x", "text": "third"}
+
+
+def test_bulk_item_without_text_is_rejected():
+    items = _bulk_items([{"id": 7, "text": "  "}, 42])
+    assert items[0]["id"] == 7 and "error" in items[0]
+    assert items[1]["id"] is None and "error" in items[1]
+
+
+def test_json_array_elements_across_chunks():
+    items = _collect(iter_json_array(_chunks(b' [ "a", {"id": 1, "te', b'xt": "b"}, 12', b'3 ]')))
+    assert items == ["a", {"id": 1, "text": "b"}, 123]
+
+
+def test_json_array_requires_array():
+    with pytest.raises(ValueError):
+        _collect(iter_json_array(_chunks(b'{"text": "a"}')))
+
+
+def test_json_array_truncated():
+    with pytest.raises(ValueError):
+        _collect(iter_json_array(_chunks(b'["a", "b"')))
+
+
+class _WindowService:
+    """Trả kết quả giả cho từng cửa sổ; `fail` làm cửa sổ lỗi giữa chừng như lỗi generate."""
+
+    def __init__(self, fail: bool = False):
+        self.windows = []
+        self.fail = fail
+
+    def summarize_items(self, window, profile=None):
+        self.windows.append([item["index"] for item in window])
+        if self.fail:
+            raise ValueError("Model not found")
+        yield [{"index": item["index"], "id": item["id"], "summary": item["text"]} for item in window]
+
+
+def _stream(service, *parts: bytes):
+    controller = SummarizeController(lambda: service)
+    lines = _collect(controller.stream_bulk(iter_json_array(_chunks(*parts))))
+    return [json.loads(line) for line in lines]
+
+
+def test_truncated_array_flushes_read_items_then_reports_the_error():
+    service = _WindowService()
+    rows = _stream(service, b'["a", {"id": "b", "text": "b"}')
+
+    assert [row.get("summary") for row in rows[:2]] == ["a", "b"]
+    assert rows[2]["index"] == 2 and rows[2]["error"].startswith("Invalid input")
+    assert service.windows == [[0, 1]]
+
+
+def test_summarize_error_is_not_reported_as_invalid_input(monkeypatch):
+    # Cửa sổ đầy được tóm tắt ngay trong lúc còn đọc input
+    monkeypatch.setattr(summarize_controller_module, "BULK_WINDOW_SIZE", 2)
+    service = _WindowService(fail=True)
+    with pytest.raises(ValueError, match="Model not found"):
+        _stream(service, b'["a", "b", "c"]')
+    # Cửa sổ lỗi không bị chạy lại
+    assert service.windows == [[0, 1]]
@@ -0,0 +1,118 @@
+import json
+import random
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.database import Dataset, DatasetStats, ModelSample, Sample
+from app.repositories.dataset_stats_repository import (
+    DatasetStatsChanges,
+    create_empty_stats,
+    histogram_from_json,
+    rebuild_dataset_stats,
+    token_bucket,
+)
+from app.repositories.sample_repository import SampleRepository
+from constant.constants import DATASET_STATS_TOKEN_BUCKETS
+
+_COLUMNS = (
+    "sample_count",
+    "input_length_sum", "input_length_min", "input_length_max",
+    "target_length_sum", "target_length_min", "target_length_max",
+)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    for table in (Dataset.__table__, Sample.__table__, ModelSample.__table__, DatasetStats.__table__):
+        table.create(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add(Dataset(id="ds", name="ds", status="active", description="", created_by="admin"))
+    create_empty_stats(session, "ds")
+    session.commit()
+    yield session
+    session.close()
+
+
+def _add(db, sample_id, input_text, target_summary):
+    SampleRepository.create(db, {
+        "id": sample_id, "input_text": input_text, "target_summary": target_summary,
+        "category": "c", "title": "t", "dataset_id": "ds",
+    })
+
+
+def _delete(db, sample_id):
+    assert SampleRepository.delete(db, sample_id)
+
+
+def _snapshot(db):
+    stats = db.get(DatasetStats, "ds")
+    db.refresh(stats)
+    values = {column: getattr(stats, column) for column in _COLUMNS}
+    values["input_token_histogram"] = json.loads(stats.input_token_histogram)
+    values["target_token_histogram"] = json.loads(stats.target_token_histogram)
+    return values
+
+
+def test_token_buckets_follow_configured_edges():
+    first, second = DATASET_STATS_TOKEN_BUCKETS[:2]
+    assert token_bucket(0) == f"0-{first - 1}"
+    assert token_bucket(first) == f"{first}-{second - 1}"
+    assert token_bucket(10 ** 6) == f"{DATASET_STATS_TOKEN_BUCKETS[-1]}+"
+
+
+def test_adds_update_sum_bounds_and_histogram(db):
+    _add(db, "s1", "abc", "x y")
+    _add(db, "s2", "abcdef", "x")
+    stats = _snapshot(db)
+    assert (stats["sample_count"], stats["input_length_sum"]) == (2, 9)
+    assert (stats["input_length_min"], stats["input_length_max"]) == (3, 6)
+    assert stats["target_token_histogram"] == {token_bucket(1): 2}
+
+
+def test_removing_a_bound_recomputes_it(db):
+    for sample_id, text in (("s1", "a"), ("s2", "abc"), ("s3", "abcdef")):
+        _add(db, sample_id, text, "t")
+    _delete(db, "s3")
+    stats = _snapshot(db)
+    assert (stats["input_length_min"], stats["input_length_max"]) == (1, 3)
+    _delete(db, "s1")
+    _delete(db, "s2")
+    stats = _snapshot(db)
+    assert stats["sample_count"] == 0
+    assert stats["input_length_min"] is None and stats["input_length_max"] is None
+    assert stats["input_token_histogram"] == {}
+
+
+def test_missing_stats_row_is_rebuilt_on_apply(db):
+    _add(db, "s1", "abc", "x")
+    db.query(DatasetStats).delete()
+    db.commit()
+    _add(db, "s2", "ab", "y z")
+    stats = _snapshot(db)
+    assert (stats["sample_count"], stats["input_length_sum"], stats["input_length_min"]) == (2, 5, 2)
+
+
+def test_incremental_stats_match_a_full_rebuild(db):
+    rng = random.Random(7)
+    alive = []
+    for i in range(120):
+        if alive and rng.random() < 0.4:
+            _delete(db, alive.pop(rng.randrange(len(alive))))
+        else:
+            words = " ".join("w" * rng.randint(1, 8) for _ in range(rng.randint(1, 300)))
+            _add(db, f"s{i}", words, words[:rng.randint(1, 50)])
+            alive.append(f"s{i}")
+    incremental = _snapshot(db)
+
+    rebuild_dataset_stats(db, ["ds"])
+    db.commit()
+    assert _snapshot(db) == incremental
+
+
+def test_histogram_is_ordered_by_bucket():
+    assert list(histogram_from_json('{"512-1023": 1, "0-63": 2, "1024+": 3, "64-127": 4}')) == [
+        "0-63", "64-127", "512-1023", "1024+",
+    ]
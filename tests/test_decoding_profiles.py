@@ -0,0 +1,86 @@
+import pytest
+
+import app.service.decoding_profiles as decoding_profiles
+from app.service.decoding_profiles import (
+    PROFILE_FAST,
+    PROFILE_QUALITY,
+    DecodingCostModel,
+    get_profile,
+    plan_decoding,
+)
+
+
+@pytest.fixture(autouse=True)
+def cost_model(monkeypatch):
+    # 1 ms mỗi bước của một sequence, không phụ thuộc DECODING_STEP_MS hay các lần generate trước
+    model = DecodingCostModel(1.0)
+    monkeypatch.setattr(decoding_profiles, "decoding_cost_model", model)
+    return model
+
+
+def test_lengths_follow_input_and_stay_within_profile_bounds():
+    profile = get_profile(PROFILE_QUALITY)
+    short = plan_decoding(10, PROFILE_QUALITY)
+    long = plan_decoding(100_000, PROFILE_QUALITY)
+
+    assert (short.title_max_new_tokens, short.summary_max_new_tokens) == (
+        profile.title_min_new_tokens, profile.summary_min_new_tokens,
+    )
+    assert (long.title_max_new_tokens, long.summary_max_new_tokens) == (
+        profile.title_max_new_tokens, profile.summary_max_new_tokens,
+    )
+    assert short.num_beams == long.num_beams == profile.num_beams
+    assert not short.budget_limited and not long.budget_limited
+
+
+def test_without_budget_the_estimate_is_reported_but_not_enforced():
+    plan = plan_decoding(100_000, PROFILE_QUALITY)
+    steps = max(plan.title_max_new_tokens, plan.summary_max_new_tokens)
+    assert plan.estimated_ms == steps * 2 * plan.num_beams
+
+
+def test_budget_reduces_beams_before_length():
+    full = plan_decoding(100_000, PROFILE_QUALITY)
+    # Vừa đủ cho 2 beam với độ dài đầy đủ
+    plan = plan_decoding(100_000, PROFILE_QUALITY, latency_budget_ms=full.estimated_ms / 2)
+
+    assert plan.budget_limited
+    assert plan.num_beams == full.num_beams // 2
+    assert (plan.title_max_new_tokens, plan.summary_max_new_tokens) == (
+        full.title_max_new_tokens, full.summary_max_new_tokens,
+    )
+
+
+def test_budget_shortens_length_after_greedy():
+    full = plan_decoding(100_000, PROFILE_QUALITY)
+    budget = full.estimated_ms / full.num_beams / 2
+    plan = plan_decoding(100_000, PROFILE_QUALITY, latency_budget_ms=budget)
+
+    assert plan.num_beams == 1
+    assert plan.summary_max_new_tokens < full.summary_max_new_tokens
+    assert plan.estimated_ms <= budget
+
+
+def test_length_never_drops_below_the_profile_minimum():
+    profile = get_profile(PROFILE_FAST)
+    plan = plan_decoding(100_000, PROFILE_FAST, latency_budget_ms=1)
+
+    assert plan.num_beams == 1 and plan.budget_limited
+    assert plan.title_max_new_tokens == profile.title_min_new_tokens
+    assert plan.summary_max_new_tokens == profile.summary_min_new_tokens
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError, match="Unknown decoding profile"):
+        plan_decoding(10, "turbo")
+
+
+def test_cost_model_moves_towards_observed_step_time(cost_model):
+    # 400 ms cho 50 bước x 2 sequence = 4 ms mỗi bước
+    cost_model.observe(400, steps=50, sequences=2)
+    assert cost_model.ms_per_step == pytest.approx(0.8 * 1.0 + 0.2 * 4.0)
+    cost_model.observe(100, steps=0, sequences=2)
+    assert cost_model.observations == 1
+    assert cost_model.estimate(num_beams=2, title_max_new_tokens=10, summary_max_new_tokens=30) == pytest.approx(
+        30 * 2 * 2 * cost_model.ms_per_step
+    )
@@ -0,0 +1,72 @@
+import pytest
+
+from app.service.distributed_training import is_main_process, plan_workers, wait_workers, worker_env
+
+
+class _FakeProcess:
+    def __init__(self, exitcode=None):
+        self.exitcode = exitcode
+        self.terminated = False
+
+    def is_alive(self):
+        return self.exitcode is None
+
+    def terminate(self):
+        self.terminated = True
+        self.exitcode = -15
+
+    def join(self, timeout=None):
+        pass
+
+
+def test_threads_are_split_between_workers():
+    layout = plan_workers(nproc_per_node=3, total_threads=8)
+    assert layout.threads_per_worker == 2
+    assert layout.world_size == 3 and layout.master_port > 0
+    assert plan_workers(nproc_per_node=16, total_threads=8).threads_per_worker == 1
+
+
+@pytest.mark.parametrize("kwargs, message", [
+    ({"nproc_per_node": 0}, "nproc_per_node"),
+    ({"nproc_per_node": 2, "nnodes": 2, "node_rank": 2, "master_port": 29500}, "node_rank"),
+    ({"nproc_per_node": 2, "nnodes": 2}, "master_port"),
+])
+def test_invalid_layouts_are_rejected(kwargs, message):
+    with pytest.raises(ValueError, match=message):
+        plan_workers(total_threads=8, **kwargs)
+
+
+def test_single_worker_only_pins_threads():
+    env = worker_env(plan_workers(nproc_per_node=1, total_threads=4), local_rank=0)
+    assert env == {"OMP_NUM_THREADS": "4", "MKL_NUM_THREADS": "4"}
+
+
+def test_ranks_are_global_across_machines():
+    layout = plan_workers(nproc_per_node=2, total_threads=8, master_addr="10.0.0.1",
+                          master_port=29500, nnodes=2, node_rank=1)
+    envs = [worker_env(layout, local_rank) for local_rank in range(2)]
+
+    assert [env["RANK"] for env in envs] == ["2", "3"]
+    assert [env["LOCAL_RANK"] for env in envs] == ["0", "1"]
+    assert {env["WORLD_SIZE"] for env in envs} == {"4"}
+    assert {(env["MASTER_ADDR"], env["MASTER_PORT"]) for env in envs} == {("10.0.0.1", "29500")}
+    assert envs[0]["OMP_NUM_THREADS"] == "4"
+
+
+def test_main_process_is_global_rank_zero(monkeypatch):
+    monkeypatch.delenv("RANK", raising=False)
+    assert is_main_process()
+    monkeypatch.setenv("RANK", "2")
+    assert not is_main_process()
+
+
+def test_failed_worker_stops_the_others():
+    processes = [_FakeProcess(), _FakeProcess(exitcode=3), _FakeProcess()]
+    assert wait_workers(processes, poll_seconds=0) == 3
+    assert processes[0].terminated and processes[2].terminated
+
+
+def test_workers_left_after_rank_zero_are_stopped_after_the_grace_period():
+    processes = [_FakeProcess(exitcode=0), _FakeProcess()]
+    assert wait_workers(processes, poll_seconds=0, grace_seconds=0) == -15
+    assert processes[1].terminated
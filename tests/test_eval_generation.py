@@ -0,0 +1,73 @@
+import pytest
+import torch
+from transformers import T5Config, T5ForConditionalGeneration
+
+from app.service.decoding_profiles import PROFILE_QUALITY, plan_decoding
+from app.service.eval_generation import (
+    generate_predictions,
+    generate_rows,
+    length_sorted_batches,
+    row_max_new_tokens,
+)
+
+PAD = 0
+EOS = 1
+
+
+@pytest.fixture(scope="module")
+def model():
+    torch.manual_seed(0)
+    config = T5Config(
+        vocab_size=32, d_model=16, d_kv=8, d_ff=32, num_layers=2, num_heads=2,
+        pad_token_id=PAD, eos_token_id=EOS, decoder_start_token_id=PAD,
+    )
+    return T5ForConditionalGeneration(config).eval()
+
+
+class _WordTokenizer:
+    """Mỗi id là một từ; id 0/1 là pad/eos."""
+
+    def __init__(self, words):
+        self.words = words
+
+    def decode(self, ids, skip_special_tokens=False):
+        return " ".join(self.words[i] for i in ids if not (skip_special_tokens and i in (PAD, EOS)))
+
+
+def _inputs(count, seed=1):
+    generator = torch.Generator().manual_seed(seed)
+    lengths = torch.randint(3, 20, (count,), generator=generator).tolist()
+    return [torch.randint(2, 32, (length,), generator=generator).tolist() + [EOS] for length in lengths]
+
+
+def test_length_sorted_batches_cover_every_index_once_in_length_order():
+    lengths = [5, 1, 9, 1, 7, 3, 2]
+    batches = length_sorted_batches(lengths, batch_size=3)
+
+    assert sorted(i for batch in batches for i in batch) == list(range(len(lengths)))
+    assert [len(batch) for batch in batches] == [3, 3, 1]
+    flat = [lengths[i] for batch in batches for i in batch]
+    assert flat == sorted(lengths)
+    # Sắp xếp ổn định: độ dài bằng nhau giữ thứ tự ban đầu
+    assert batches[0][:2] == [1, 3]
+
+
+def test_batched_greedy_matches_per_example_generation_in_input_order(model):
+    inputs = _inputs(11)
+    row_limits = [4 + i % 5 for i in range(len(inputs))]
+    expected = [generate_rows(model, [ids], [limit], 1, PAD, "cpu")[0] for ids, limit in zip(inputs, row_limits)]
+
+    predictions = generate_predictions(model, inputs, row_limits, 1, PAD, "cpu", batch_size=4)
+
+    assert predictions == expected
+    # Mỗi dòng bị cắt về giới hạn riêng (token đầu là decoder_start_token)
+    assert all(len(output) <= 1 + limit for output, limit in zip(predictions, row_limits))
+
+
+def test_title_rows_use_the_title_limit():
+    tokenizer = _WordTokenizer(["<pad>", "</s>", "title:", "summarize:"] + [f"w{i}" for i in range(28)])
+    body = list(range(4, 32)) * 20
+    plan = plan_decoding(len(body) + 2, PROFILE_QUALITY)
+
+    assert row_max_new_tokens(tokenizer, [2] + body + [EOS], PROFILE_QUALITY) == plan.title_max_new_tokens
+    assert row_max_new_tokens(tokenizer, [3] + body + [EOS], PROFILE_QUALITY) == plan.summary_max_new_tokens
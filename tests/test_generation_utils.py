@@ -0,0 +1,50 @@
+import torch
+
+from app.service.generation_utils import RowMaxNewTokensLogitsProcessor
+
+EOS = 1
+VOCAB = 6
+
+
+def _step(processor, rows, generated, prompt_length=1):
+    input_ids = torch.zeros((rows, prompt_length + generated), dtype=torch.long)
+    return processor(input_ids, torch.zeros((rows, VOCAB)))
+
+
+def _forced_eos(scores):
+    """Dòng chỉ còn EOS được phép."""
+    allowed = torch.isfinite(scores)
+    return [bool(row[EOS] and row.sum() == 1) for row in allowed]
+
+
+def test_rows_below_their_limit_are_untouched():
+    processor = RowMaxNewTokensLogitsProcessor([4, 10], eos_token_id=EOS)
+    scores = _step(processor, rows=2, generated=1)
+    assert torch.equal(scores, torch.zeros((2, VOCAB)))
+
+
+def test_row_reaching_its_limit_can_only_emit_eos():
+    processor = RowMaxNewTokensLogitsProcessor([4, 10], eos_token_id=EOS)
+    # Đã sinh 3 token: token kế tiếp là token thứ 4, token cuối cùng của dòng đầu
+    assert _forced_eos(_step(processor, rows=2, generated=3)) == [True, False]
+    assert _forced_eos(_step(processor, rows=2, generated=9)) == [True, True]
+
+
+def test_eos_score_is_preserved():
+    processor = RowMaxNewTokensLogitsProcessor([1], eos_token_id=EOS)
+    scores = torch.arange(VOCAB, dtype=torch.float).unsqueeze(0)
+    out = processor(torch.zeros((1, 1), dtype=torch.long), scores)
+    assert out[0, EOS] == EOS
+
+
+def test_limits_are_repeated_for_each_beam():
+    processor = RowMaxNewTokensLogitsProcessor([2, 5], eos_token_id=EOS)
+    # 2 dòng x 3 beam, beam của cùng một dòng nằm liền nhau
+    assert _forced_eos(_step(processor, rows=6, generated=1)) == [True] * 3 + [False] * 3
+
+
+def test_prompt_length_is_not_counted_as_generated():
+    processor = RowMaxNewTokensLogitsProcessor([3], eos_token_id=EOS, prompt_length=4)
+    assert _forced_eos(_step(processor, rows=1, generated=1, prompt_length=4)) == [False]
+    assert _forced_eos(_step(processor, rows=1, generated=2, prompt_length=4)) == [True]
+
@@ -0,0 +1,179 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import CancelledError
+
+import pytest
+
+from app.controller.summarize_controller import SummarizeController
+from app.service.batch_scheduler import BatchScheduler
+from app.service.inference_executor import (
+    InferenceExecutor,
+    InferenceRejectedError,
+    PRIORITY_BULK,
+    PRIORITY_INTERACTIVE,
+)
+
+
+def _executor(max_concurrency=1, interactive_queue=2, bulk_queue=1):
+    return InferenceExecutor(
+        max_concurrency=max_concurrency,
+        queue_limits={PRIORITY_INTERACTIVE: interactive_queue, PRIORITY_BULK: bulk_queue},
+        name="test-inference",
+    )
+
+
+def _fast(executor):
+    """Ước tính thời gian chờ thấp để request qua được bước admission, chỉ hết hạn khi đang chờ."""
+    executor._avg_task_seconds = 0.001
+    return executor
+
+
+def _occupy(executor):
+    """Giữ worker duy nhất bận cho tới khi set event trả về."""
+    started, release = threading.Event(), threading.Event()
+    executor.submit(lambda: (started.set(), release.wait(5)))
+    assert started.wait(5)
+    return release
+
+
+def test_full_lane_is_rejected_with_429_and_retry_after():
+    executor = _executor(interactive_queue=1)
+    release = _occupy(executor)
+    try:
+        executor.submit(lambda: None)
+        with pytest.raises(InferenceRejectedError) as error:
+            executor.submit(lambda: None)
+        assert error.value.status_code == 429
+        assert int(error.value.headers["Retry-After"]) >= 1
+        assert executor.stats()["rejected_queue_full"] == 1
+    finally:
+        release.set()
+
+
+def test_deadline_that_cannot_be_met_is_rejected_with_503():
+    executor = _executor()
+    release = _occupy(executor)
+    try:
+        executor.submit(lambda: None)
+        with pytest.raises(InferenceRejectedError) as error:
+            executor.check_admission(PRIORITY_INTERACTIVE, deadline=time.monotonic() + 0.01)
+        assert error.value.status_code == 503
+        assert "Retry-After" in error.value.headers
+    finally:
+        release.set()
+
+
+def test_task_expired_in_queue_is_not_run():
+    executor = _fast(_executor())
+    release = _occupy(executor)
+    ran = []
+    future = executor.submit(lambda: ran.append(1), deadline=time.monotonic() + 0.05)
+    time.sleep(0.1)
+    release.set()
+    with pytest.raises(InferenceRejectedError):
+        future.result(5)
+    assert ran == []
+    assert executor.stats()["expired_in_queue"] == 1
+
+
+def test_interactive_lane_runs_before_bulk():
+    executor = _executor(bulk_queue=2)
+    release = _occupy(executor)
+    order = []
+    futures = [
+        executor.submit(lambda: order.append("bulk"), priority=PRIORITY_BULK),
+        executor.submit(lambda: order.append("interactive"), priority=PRIORITY_INTERACTIVE),
+    ]
+    release.set()
+    for future in futures:
+        future.result(5)
+    assert order == ["interactive", "bulk"]
+
+
+def test_scheduler_runs_batches_on_executor_workers():
+    executor = _executor(max_concurrency=2)
+    threads = []
+
+    def handler(key, payloads):
+        threads.append(threading.current_thread().name)
+        return [payload * 2 for payload in payloads]
+
+    scheduler = BatchScheduler(handler, max_batch_size=8, max_wait_ms=50, executor=executor)
+    futures = [scheduler.submit_async("k", i) for i in range(5)]
+    assert [future.result(5) for future in futures] == [0, 2, 4, 6, 8]
+    assert threads and all(name.startswith("test-inference") for name in threads)
+
+
+def test_scheduler_batch_size_is_not_capped_by_executor_concurrency():
+    executor = _executor(max_concurrency=1)
+    sizes = []
+
+    def handler(key, payloads):
+        sizes.append(len(payloads))
+        return payloads
+
+    scheduler = BatchScheduler(handler, max_batch_size=8, max_wait_ms=200, executor=executor)
+    futures = [scheduler.submit_async("k", i) for i in range(8)]
+    [future.result(5) for future in futures]
+    assert sizes == [8]
+
+
+def test_scheduler_fails_items_when_batch_expires_in_executor_queue():
+    executor = _fast(_executor())
+    release = _occupy(executor)
+    scheduler = BatchScheduler(lambda key, payloads: payloads, max_wait_ms=0, executor=executor)
+    future = scheduler.submit_async("k", 1, deadline=time.monotonic() + 0.05)
+    time.sleep(0.1)
+    release.set()
+    with pytest.raises(InferenceRejectedError):
+        future.result(5)
+    assert executor.stats()["expired_in_queue"] == 1
+
+
+def _wait_until(condition, timeout=5):
+    stop = time.monotonic() + timeout
+    while not condition() and time.monotonic() < stop:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_cancelled_batch_stops_generating_and_frees_the_executor_slot():
+    executor = _executor()
+    started = threading.Event()
+
+    def handler(key, payloads, cancel_event=None):
+        # Như generate với CancelStoppingCriteria: dừng ở bước kế tiếp khi cả batch đã huỷ
+        started.set()
+        while not cancel_event.is_set():
+            time.sleep(0.01)
+        return payloads
+
+    scheduler = BatchScheduler(handler, max_wait_ms=0, executor=executor)
+    cancel_event = threading.Event()
+    future = scheduler.submit_async("k", 1, cancel_event=cancel_event)
+    assert started.wait(5)
+
+    cancel_event.set()
+    with pytest.raises(CancelledError):
+        future.result(5)
+    assert _wait_until(lambda: executor.stats()["active"] == 0)
+    assert executor.submit(lambda: "free").result(5) == "free"
+
+
+def test_summarize_timeout_cancels_the_request():
+    cancel_events = []
+
+    class _SlowService:
+        def summarize(self, text, cancel_event=None, **kwargs):
+            cancel_events.append(cancel_event)
+            if not cancel_event.wait(5):
+                return {}
+            raise CancelledError()
+
+    controller = SummarizeController(_SlowService)
+    with pytest.raises(InferenceRejectedError) as error:
+        asyncio.run(controller.summarize_text("bài viết", deadline_ms=50))
+
+    assert error.value.status_code == 503
+    assert cancel_events and cancel_events[0].is_set()
@@ -0,0 +1,127 @@
+import threading
+import time
+
+from app.service.lora_adapters import AdapterHost, AdapterModelView
+
+
+class _BlockingPeftModel:
+    """Giả lập PeftModel; `generate` ghi lại adapter đang bật và chờ `gate` nếu có."""
+
+    def __init__(self):
+        self.adapters = set()
+        self.active = None
+        self.gate = None
+        self.running = []
+        self.entered = threading.Event()
+
+    def load_adapter(self, adapter_dir, adapter_name):
+        self.adapters.add(adapter_name)
+
+    def delete_adapter(self, name):
+        self.adapters.remove(name)
+
+    def set_adapter(self, name):
+        assert not self.running, "adapter switched while a generate was running"
+        self.active = name
+
+    def eval(self):
+        return self
+
+    def generate(self, *args, **kwargs):
+        active = self.active
+        self.running.append(active)
+        self.entered.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.running.remove(active)
+        return active
+
+
+def _host(max_loaded=4, on_unload=None):
+    host = AdapterHost("base", max_loaded=max_loaded, on_unload=on_unload)
+    host.model = _BlockingPeftModel()
+    return host
+
+
+def _start(view, results):
+    thread = threading.Thread(target=lambda: results.append(view.generate()))
+    thread.start()
+    return thread
+
+
+def _wait_until(condition, timeout=5):
+    stop = time.monotonic() + timeout
+    while not condition() and time.monotonic() < stop:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_generates_with_the_same_adapter_run_together():
+    host = _host()
+    view = AdapterModelView(host, "/adapters/a")
+    host.model.gate = threading.Event()
+    results = []
+    threads = [_start(view, results) for _ in range(2)]
+
+    assert _wait_until(lambda: len(host.model.running) == 2)
+    host.model.gate.set()
+    [thread.join(5) for thread in threads]
+    assert len(set(results)) == 1 and host.switches == 1
+
+
+def test_other_adapter_waits_for_running_generates():
+    host = _host()
+    view_a, view_b = AdapterModelView(host, "/adapters/a"), AdapterModelView(host, "/adapters/b")
+    host.model.gate = threading.Event()
+    results = []
+    first = _start(view_a, results)
+    assert host.model.entered.wait(5)
+
+    second = _start(view_b, results)
+    time.sleep(0.1)
+    # Generate của adapter b chưa được bật adapter hay chạy khi a còn đang generate
+    assert host.model.running == [host._adapters["/adapters/a"]]
+    host.model.gate.set()
+    [thread.join(5) for thread in (first, second)]
+
+    assert sorted(results) == sorted(host._adapters.values())
+    assert host.switches == 2 and host._inflight == 0
+
+
+def test_least_recently_used_idle_adapter_is_unloaded():
+    unloaded = []
+    host = _host(max_loaded=2, on_unload=lambda _, adapter_dir: unloaded.append(adapter_dir))
+    for adapter_dir in ("/adapters/a", "/adapters/b"):
+        AdapterModelView(host, adapter_dir).generate()
+    host.load_adapter("/adapters/a")
+
+    AdapterModelView(host, "/adapters/c").generate()
+
+    assert unloaded == ["/adapters/b"]
+    assert list(host._adapters) == ["/adapters/a", "/adapters/c"]
+
+
+def test_adapter_with_a_running_generate_is_not_unloaded():
+    unloaded = []
+    host = _host(max_loaded=1, on_unload=lambda _, adapter_dir: unloaded.append(adapter_dir))
+    host.model.gate = threading.Event()
+    results = []
+    running = _start(AdapterModelView(host, "/adapters/a"), results)
+    assert host.model.entered.wait(5)
+
+    host.load_adapter("/adapters/b")
+    assert "/adapters/a" in host._adapters and unloaded == []
+    host.model.gate.set()
+    running.join(5)
+
+
+def test_view_reloads_its_adapter_after_it_was_unloaded():
+    host = _host(max_loaded=1)
+    view_a = AdapterModelView(host, "/adapters/a")
+    first = view_a.generate()
+    AdapterModelView(host, "/adapters/b").generate()
+    assert "/adapters/a" not in host._adapters
+
+    second = view_a.generate()
+
+    assert second == host._adapters["/adapters/a"] and second != first
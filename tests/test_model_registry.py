@@ -0,0 +1,117 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.service.lora_adapters import AdapterHost, AdapterModelView
+from app.service.model_registry import LoadedModel, ModelRegistry
+
+
+class _FakePeftModel:
+    """Giả lập các thao tác adapter của PeftModel."""
+
+    def __init__(self):
+        self.adapters = set()
+        self.active = None
+
+    def load_adapter(self, adapter_dir, adapter_name):
+        self.adapters.add(adapter_name)
+
+    def delete_adapter(self, name):
+        self.adapters.remove(name)
+
+    def set_adapter(self, name):
+        if name not in self.adapters:
+            raise ValueError(f"Adapter {name} not found")
+        self.active = name
+
+    def eval(self):
+        return self
+
+    def generate(self, *args, **kwargs):
+        return self.active
+
+
+def _host(max_loaded=1, base_bytes=1000, on_unload=None):
+    host = AdapterHost("base", max_loaded=max_loaded, on_unload=on_unload)
+    host.model = _FakePeftModel()
+    host.base_bytes = base_bytes
+    return host
+
+
+def _loaded(model_id, model, memory_bytes=10):
+    return LoadedModel(model_id, "n", "1", f"/models/{model_id}", None, model, 0.0, memory_bytes=memory_bytes)
+
+
+def test_base_model_bytes_are_charged_once_per_host():
+    registry = ModelRegistry(max_bytes=10 ** 9, idle_seconds=0)
+    host = _host(max_loaded=4)
+    with registry._lock:
+        registry._admit_locked(_loaded("a", AdapterModelView(host, "/adapters/a")))
+        registry._admit_locked(_loaded("b", AdapterModelView(host, "/adapters/b")))
+        registry._admit_locked(_loaded("c", object(), memory_bytes=100))
+        assert registry._resident_bytes_locked() == 10 + 10 + 100 + 1000
+
+
+def test_evicting_all_views_of_a_host_frees_its_base_bytes():
+    registry = ModelRegistry(max_bytes=500, idle_seconds=0)
+    host = _host(max_loaded=4)
+    with registry._lock:
+        registry._admit_locked(_loaded("a", AdapterModelView(host, "/adapters/a")))
+        registry._admit_locked(_loaded("c", object(), memory_bytes=100))
+        assert list(registry._resident) == ["c"]
+        assert registry._resident_bytes_locked() == 100
+        assert registry.evictions == 1
+
+
+def test_unloaded_adapter_drops_only_its_registry_entry():
+    registry = ModelRegistry(max_bytes=10 ** 9, idle_seconds=0)
+    host = _host(max_loaded=4)
+    with registry._lock:
+        registry._admit_locked(_loaded("a", AdapterModelView(host, "/adapters/a")))
+        registry._admit_locked(_loaded("b", AdapterModelView(host, "/adapters/b")))
+    registry._on_adapter_unloaded(host, "/adapters/a")
+    assert list(registry._resident) == ["b"]
+    assert registry.adapter_invalidations == 1
+
+
+def test_replaced_host_drops_all_its_views_except_the_active_model():
+    registry = ModelRegistry(max_bytes=10 ** 9, idle_seconds=0)
+    host = _host(max_loaded=4)
+    active = _loaded("a", AdapterModelView(host, "/adapters/a"))
+    registry.swap(active)
+    with registry._lock:
+        registry._admit_locked(_loaded("b", AdapterModelView(host, "/adapters/b")))
+    registry._on_adapter_unloaded(host, None)
+    assert list(registry._resident) == ["a"]
+    assert registry.current is active
+
+
+def test_view_reloads_adapter_dropped_by_its_host():
+    unloaded = []
+    host = _host(max_loaded=1, on_unload=lambda h, adapter_dir: unloaded.append(adapter_dir))
+    view_a = AdapterModelView(host, "/adapters/a")
+    view_b = AdapterModelView(host, "/adapters/b")
+
+    first = view_a.generate()
+    view_b.generate()
+    assert unloaded == ["/adapters/a"]
+
+    again = view_a.generate()
+    assert again != first and again in host.model.adapters
+    assert unloaded == ["/adapters/a", "/adapters/b"]
+
+
+def test_version_shared_by_several_models_is_rejected():
+    registry = ModelRegistry(max_bytes=10 ** 9, idle_seconds=0)
+    repository = SimpleNamespace(
+        list_by_version=lambda version: [SimpleNamespace(id="m1"), SimpleNamespace(id="m2")],
+    )
+    with pytest.raises(ValueError, match="pass model_id"):
+        registry.get(repository, version="1")
+
+
+def test_unknown_version_is_not_found():
+    registry = ModelRegistry(max_bytes=10 ** 9, idle_seconds=0)
+    repository = SimpleNamespace(list_by_version=lambda version: [])
+    with pytest.raises(ValueError, match="not found"):
+        registry.get(repository, version="9")
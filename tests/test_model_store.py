@@ -0,0 +1,157 @@
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import app.service.model_service as model_service_module
+from app.models.database import Model, TrainingJob
+from app.repositories.model_repository import MODEL_ARCHIVED, MODEL_COMPLETED, ModelRepository
+from app.repositories.training_job_repository import JOB_COMPLETED
+from app.service.model_service import ModelService
+from app.service.model_store import LOCK_FILE, ModelArtifactStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ModelArtifactStore(str(tmp_path / "store"))
+
+
+def _commit(store, name, files):
+    staging = store.staging_dir()
+    for rel, content in files.items():
+        path = os.path.join(staging, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+    target = os.path.join(store.root, name)
+    store.commit(staging, target)
+    return target
+
+
+def _read(version_dir, rel):
+    with open(os.path.join(version_dir, rel), encoding="utf-8") as f:
+        return f.read()
+
+
+def test_commit_stores_identical_files_once(store):
+    v1 = _commit(store, "model_a_1", {"config.json": "{}", "model.safetensors": "weights-1"})
+    v2 = _commit(store, "model_a_2", {"config.json": "{}", "model.safetensors": "weights-2"})
+
+    assert os.path.samefile(os.path.join(v1, "config.json"), os.path.join(v2, "config.json"))
+    assert store.totals()["blob_count"] == 3
+    assert store.usage(v1)["shared_bytes"] == 2 and store.usage(v1)["unique_bytes"] == len("weights-1")
+    manifest = store.read_manifest(v1)
+    assert manifest["files"]["config.json"]["sha256"] == hashlib.sha256(b"{}").hexdigest()
+    assert store.is_ingested(v1)
+    # Staging đã được dọn sau khi commit
+    assert os.listdir(store.staging_root) == []
+
+
+def test_recommitting_a_version_in_place_keeps_its_content(store):
+    v1 = _commit(store, "model_a_1", {"config.json": "{}", "tokenizer/vocab.txt": "a b"})
+    store.commit(v1, v1, remove_source=False)
+
+    assert _read(v1, "tokenizer/vocab.txt") == "a b"
+    assert store.totals()["blob_count"] == 2
+    assert not [name for name in os.listdir(store.root) if ".tmp-" in name or ".old-" in name]
+
+
+def test_garbage_collection_only_removes_unreferenced_blobs(store):
+    v1 = _commit(store, "model_a_1", {"config.json": "{}", "model.safetensors": "weights-1"})
+    v2 = _commit(store, "model_a_2", {"config.json": "{}", "model.safetensors": "weights-2"})
+    store.evict(v2)
+
+    gc = store.collect_garbage()
+
+    assert gc == {"removed_blobs": 1, "freed_bytes": len("weights-2")}
+    assert _read(v1, "config.json") == "{}" and _read(v1, "model.safetensors") == "weights-1"
+    assert store.totals()["blob_count"] == 2
+
+
+def test_archive_and_restore_round_trip(store):
+    files = {"config.json": "{}", "model.safetensors": "weights-1", "onnx/model.onnx": "graph"}
+    v1 = _commit(store, "model_a_1", files)
+    path = store.archive(v1)
+
+    assert not os.path.exists(v1) and os.path.isfile(path)
+    assert store.collect_garbage()["removed_blobs"] == 3
+
+    store.restore(v1)
+    assert {rel: _read(v1, rel) for rel in files} == files
+    assert store.is_ingested(v1)
+    assert not os.path.exists(path)
+
+
+def test_garbage_collection_waits_for_the_store_lock_of_another_process(store):
+    _commit(store, "model_a_1", {"config.json": "{}"})
+    # Một file description khác trên LOCK_FILE, như process train đang commit
+    with open(os.path.join(store.root, LOCK_FILE), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        done = threading.Event()
+        thread = threading.Thread(target=lambda: (store.collect_garbage(), done.set()))
+        thread.start()
+        time.sleep(0.1)
+        assert not done.is_set()
+        fcntl.flock(lock, fcntl.LOCK_UN)
+    thread.join(5)
+    assert done.is_set()
+
+
+@pytest.fixture
+def service(store, monkeypatch):
+    engine = create_engine("sqlite://")
+    for table in (Model.__table__, TrainingJob.__table__):
+        table.create(bind=engine)
+    session = sessionmaker(bind=engine)()
+    monkeypatch.setattr(model_service_module, "MODEL_STORE_DIR", store.root)
+    monkeypatch.setattr(model_service_module, "model_store", store)
+    yield ModelService(ModelRepository(session), None)
+    session.close()
+
+
+def _version(service, store, model_id, age_days, **kwargs):
+    path = _commit(store, f"model_{model_id}", {"config.json": "{}", "model.safetensors": f"weights-{model_id}"})
+    model = Model(
+        id=model_id, version=model_id, name=model_id, model_path=path, status=MODEL_COMPLETED,
+        created_by="admin", created_at=datetime.now() - timedelta(days=age_days), **kwargs,
+    )
+    service.repository.db.add(model)
+    service.repository.db.commit()
+    return path
+
+
+def _orphan(store, name):
+    path = _commit(store, name, {"model.safetensors": f"weights-{name}"})
+    old = time.time() - 7 * 24 * 3600
+    os.utime(path, (old, old))
+    return path
+
+
+def test_retention_keeps_active_referenced_and_recent_versions(service, store):
+    active = _version(service, store, "active", age_days=10, is_active=True)
+    base = _version(service, store, "base", age_days=9)
+    child = _version(service, store, "child", age_days=1, base_model_id="base")
+    old = _version(service, store, "old", age_days=5)
+    orphan = _orphan(store, "model_orphan")
+    job_result = _orphan(store, "model_unsaved")
+    service.repository.db.add(TrainingJob(
+        id="job", status=JOB_COMPLETED, request="{}", result=json.dumps({"model_path": job_result}),
+    ))
+    service.repository.db.commit()
+
+    report = service.apply_retention(keep_recent=1, mode="compress")
+
+    assert report["protected"] == {"active": ["active"], "base": ["base"], "child": ["recent"]}
+    assert all(os.path.isdir(path) for path in (active, base, child, job_result))
+    assert not os.path.exists(old) and os.path.isfile(store.archive_path(old))
+    assert not os.path.exists(orphan)
+    assert service.repository.get_by_id("old").status == MODEL_ARCHIVED
+    # Blob weights của version đã nén và thư mục mồ côi được giải phóng
+    assert report["gc"]["removed_blobs"] == 2
@@ -0,0 +1,78 @@
+import time
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.database import Sample
+from app.repositories.sample_repository import (
+    SampleCountCache,
+    SampleRepository,
+    decode_cursor,
+    encode_cursor,
+)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Sample.__table__.create(bind=engine)
+    session = sessionmaker(bind=engine)()
+    for dataset_id, count in (("ds_a", 23), ("ds_b", 5)):
+        for i in range(count):
+            session.add(Sample(
+                id=f"{dataset_id}_{i:03d}", input_text="x", target_summary="y", category="c",
+                title="t", created_at=date.today(), dataset_id=dataset_id,
+            ))
+    session.commit()
+    yield session
+    session.close()
+
+
+@pytest.mark.parametrize("sample_id", ["abc", "ds_1/2+3", "mẫu-tiếng-việt", ""])
+def test_cursor_round_trip(sample_id):
+    cursor = encode_cursor(sample_id)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == sample_id
+
+
+@pytest.mark.parametrize("cursor", ["!!!", "bm90IGpzb24", encode_cursor("x")[:-2] + "@@", "e30"])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
+
+
+def test_pages_cover_the_dataset_without_gaps_or_duplicates(db):
+    seen, cursor, pages = [], None, 0
+    while True:
+        samples, cursor = SampleRepository.list_page(db, "ds_a", cursor, limit=10)
+        seen += [sample.id for sample in samples]
+        pages += 1
+        if cursor is None:
+            break
+    assert pages == 3
+    assert seen == [f"ds_a_{i:03d}" for i in range(23)]
+
+
+def test_exact_last_page_has_no_next_cursor(db):
+    samples, cursor = SampleRepository.list_page(db, "ds_b", None, limit=5)
+    assert len(samples) == 5 and cursor is None
+
+
+def test_count_cache_invalidation_also_drops_the_total():
+    cache = SampleCountCache(ttl_seconds=60)
+    cache.set(None, 28)
+    cache.set("ds_a", 23)
+    cache.set("ds_b", 5)
+    cache.invalidate("ds_a")
+    assert cache.get("ds_a") is None and cache.get(None) is None
+    assert cache.get("ds_b") == 5
+
+
+def test_count_cache_entries_expire():
+    cache = SampleCountCache(ttl_seconds=0.01)
+    cache.set("ds_a", 1)
+    assert cache.get("ds_a") == 1
+    time.sleep(0.02)
+    assert cache.get("ds_a") is None
@@ -0,0 +1,98 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.service.inference_executor import InferenceRejectedError
+from app.service.shadow_traffic import ShadowTraffic
+
+PRIMARY = SimpleNamespace(model_id="m1", version="v1")
+CANDIDATE = SimpleNamespace(model_id="m2", version="v2")
+
+
+def _result(summary, title="Tiêu đề"):
+    return {"title": title, "summary": summary}
+
+
+def _shadow(**kwargs):
+    kwargs.setdefault("model_id", CANDIDATE.model_id)
+    kwargs.setdefault("fraction", 1.0)
+    return ShadowTraffic(**kwargs)
+
+
+def _wait_for_inflight(shadow, timeout=5):
+    stop = time.monotonic() + timeout
+    while shadow.stats()["inflight"] and time.monotonic() < stop:
+        time.sleep(0.01)
+
+
+def _agreement(stats):
+    return stats["versions"][0]["agreement"]
+
+
+def test_rouge_l_agreement_keeps_vietnamese_diacritics():
+    shadow = _shadow()
+    assert shadow._agreement("Hà Nội mưa to", "hà nội mưa to") == 1.0
+    # Tokenizer mặc định của rouge_score bỏ dấu, "Hà"/"Ha" sẽ bị coi là giống nhau
+    assert shadow._agreement("Hà Nội", "Ha Noi") == 0.0
+    assert shadow._agreement("a b c d", "a b x y") == pytest.approx(0.5)
+
+
+def test_comparisons_are_bucketed_per_candidate_and_primary_pair():
+    shadow = _shadow()
+    other_primary = SimpleNamespace(model_id="m0", version="v0")
+    shadow._record(PRIMARY, _result("a b c d"), 100.0, CANDIDATE, _result("a b c d"), 150.0)
+    shadow._record(PRIMARY, _result("a b c d"), None, CANDIDATE, _result("a b x y", title="khác"), 250.0)
+    shadow._record(other_primary, _result("a b"), 80.0, CANDIDATE, _result("a b"), 90.0)
+
+    versions = {(v["candidate_model_id"], v["primary_model_id"]): v for v in shadow.stats()["versions"]}
+    bucket = versions[("m2", "m1")]
+    assert set(versions) == {("m2", "m1"), ("m2", "m0")}
+    assert bucket["completed"] == 2 and bucket["samples"] == 2
+    assert bucket["agreement"]["summary_rouge_l"]["avg"] == pytest.approx(0.75)
+    assert bucket["agreement"]["title_exact_match"] == 0.5
+    # Request chính lấy từ cache (primary_ms None) không tính vào latency của model active
+    assert bucket["latency_ms"]["primary"]["avg"] == 100.0
+    assert bucket["latency_ms"]["candidate"]["avg"] == 200.0
+
+
+def test_mirrored_request_runs_on_the_candidate_off_the_request_thread():
+    shadow = _shadow()
+    calls = []
+
+    def run_candidate(model_id):
+        calls.append((model_id, threading.current_thread().name))
+        return CANDIDATE, _result("a b c"), 12.0
+
+    shadow.mirror(PRIMARY, _result("a b c"), 10.0, run_candidate)
+    _wait_for_inflight(shadow)
+
+    assert calls == [("m2", "shadow-traffic")]
+    stats = shadow.stats()
+    assert stats["mirrored"] == 1 and _agreement(stats)["summary_rouge_l"]["avg"] == 1.0
+
+
+def test_requests_to_the_candidate_itself_are_not_mirrored():
+    shadow = _shadow()
+    shadow.mirror(CANDIDATE, _result("a"), 10.0, lambda model_id: pytest.fail("mirrored"))
+    assert shadow.stats()["mirrored"] == 0
+
+
+def test_rejected_or_excess_mirrors_are_dropped():
+    shadow = _shadow(max_inflight=1)
+    release = threading.Event()
+
+    def blocked(model_id):
+        release.wait(5)
+        raise InferenceRejectedError(429, "Bulk lane full", 1)
+
+    shadow.mirror(PRIMARY, _result("a"), 10.0, blocked)
+    # Slot inflight duy nhất đang bận
+    shadow.mirror(PRIMARY, _result("a"), 10.0, lambda model_id: pytest.fail("mirrored"))
+    release.set()
+    _wait_for_inflight(shadow)
+
+    stats = shadow.stats()
+    assert (stats["mirrored"], stats["dropped"], stats["failed"]) == (1, 2, 0)
+    assert stats["versions"] == []
@@ -0,0 +1,122 @@
+import threading
+import time
+import unicodedata
+from concurrent.futures import CancelledError
+
+import pytest
+
+from app.service.summary_cache import SummaryCache
+
+
+def _cache(**kwargs):
+    return SummaryCache(max_bytes=kwargs.pop("max_bytes", 10_000), ttl_seconds=kwargs.pop("ttl_seconds", 60), **kwargs)
+
+
+def test_key_ignores_whitespace_and_unicode_form_but_not_model_or_params():
+    params = {"num_beams": 4}
+    key = SummaryCache.make_key("Hà  Nội\n", "m1", "v1", params)
+    # Dạng tổ hợp (NFD) và khoảng trắng khác nhau vẫn cùng key
+    assert SummaryCache.make_key(unicodedata.normalize("NFD", " Hà Nội"), "m1", "v1", params) == key
+    assert SummaryCache.make_key("Hà Nội", "m2", "v1", params) != key
+    assert SummaryCache.make_key("Hà Nội", "m1", "v2", params) != key
+    assert SummaryCache.make_key("Hà Nội", "m1", "v1", {"num_beams": 1}) != key
+
+
+def test_concurrent_requests_for_the_same_key_compute_once():
+    cache = _cache()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"summary": "s"}
+
+    results = []
+    owner = threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute)))
+    owner.start()
+    assert started.wait(5)
+    waiters = [threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute))) for _ in range(3)]
+    [waiter.start() for waiter in waiters]
+    while cache.stats()["coalesced"] < 3:
+        time.sleep(0.01)
+    release.set()
+    [thread.join(5) for thread in [owner] + waiters]
+
+    assert len(calls) == 1
+    assert results == [{"summary": "s"}] * 4
+    assert cache.get_or_compute("k", compute) == {"summary": "s"}
+    stats = cache.stats()
+    assert (stats["misses"], stats["coalesced"], stats["hits"]) == (1, 3, 1)
+
+
+def test_errors_are_shared_with_waiters_but_not_cached():
+    cache = _cache()
+
+    def failing():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute("k", failing)
+    assert cache.get_or_compute("k", lambda: "ok") == "ok"
+    assert cache.stats()["inflight"] == 0
+
+
+def test_invalidate_drops_every_entry():
+    cache = _cache()
+    cache.put("a", "x")
+    cache.put("b", "y")
+    cache.invalidate()
+    assert cache.get("a") is None and cache.get("b") is None
+    assert cache.stats()["bytes"] == 0 and cache.stats()["invalidations"] == 1
+
+
+def test_expired_entries_are_not_served():
+    cache = _cache(ttl_seconds=0.01)
+    cache.put("a", "x")
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_least_recently_used_entry_is_evicted_over_budget():
+    cache = _cache(max_bytes=20)
+    cache.put("a", "x" * 6)
+    cache.put("b", "y" * 6)
+    cache.get("a")
+    cache.put("c", "z" * 6)
+    assert cache.get("b") is None
+    assert cache.get("a") == "x" * 6 and cache.get("c") == "z" * 6
+
+
+def test_disabled_cache_always_computes():
+    cache = _cache(enabled=False)
+    calls = []
+    for _ in range(2):
+        cache.get_or_compute("k", lambda: calls.append(1) or "v")
+    assert len(calls) == 2
+
+
+def test_waiter_recomputes_when_the_owner_gives_up():
+    cache = _cache()
+    started, release = threading.Event(), threading.Event()
+
+    def abandoned():
+        started.set()
+        release.wait(5)
+        raise CancelledError()
+
+    owner = threading.Thread(target=lambda: pytest.raises(CancelledError, cache.get_or_compute, "k", abandoned))
+    owner.start()
+    assert started.wait(5)
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(cache.get_or_compute("k", lambda: "fresh")))
+    waiter.start()
+    while cache.stats()["coalesced"] < 1:
+        time.sleep(0.01)
+    release.set()
+    [thread.join(5) for thread in (owner, waiter)]
+
+    assert results == ["fresh"]
+    assert cache.get("k") == "fresh"
@@ -0,0 +1,55 @@
+from app.service.text_chunking import count_tokens, split_into_chunks
+
+
+class _WordTokenizer:
+    """Mỗi từ (tách theo khoảng trắng) là một token."""
+
+    def __init__(self):
+        self.vocab = {}
+
+    def __call__(self, text, add_special_tokens=True):
+        ids = [self.vocab.setdefault(word, len(self.vocab)) for word in text.split()]
+        return {"input_ids": ids + ([1] if add_special_tokens else [])}
+
+    def decode(self, ids, skip_special_tokens=False):
+        words = {token: word for word, token in self.vocab.items()}
+        return " ".join(words[token] for token in ids)
+
+
+def _words(prefix, count):
+    return " ".join(f"{prefix}{i}" for i in range(count))
+
+
+def test_count_tokens_excludes_special_tokens():
+    assert count_tokens(_WordTokenizer(), "một hai ba") == 3
+
+
+def test_empty_or_blank_input_has_no_chunks():
+    tokenizer = _WordTokenizer()
+    assert split_into_chunks(tokenizer, "", 10) == []
+    assert split_into_chunks(tokenizer, " \n\n \n", 10) == []
+
+
+def test_paragraphs_are_packed_without_being_split():
+    text = "\n\n".join([_words("a", 4), _words("b", 4), _words("c", 4)])
+    chunks = split_into_chunks(_WordTokenizer(), text, 10)
+
+    assert chunks == [(_words("a", 4) + "\n" + _words("b", 4), 8), (_words("c", 4), 4)]
+
+
+def test_oversized_paragraph_is_cut_at_sentence_boundaries():
+    sentences = [_words("s", 4) + ".", _words("t", 5) + "!", _words("u", 3) + "?"]
+    chunks = split_into_chunks(_WordTokenizer(), " ".join(sentences), 10)
+
+    assert [text for text, _ in chunks] == [sentences[0] + "\n" + sentences[1], sentences[2]]
+    assert [n_tokens for _, n_tokens in chunks] == [9, 3]
+
+
+def test_sentence_longer_than_the_budget_is_cut_by_tokens():
+    sentence = _words("w", 25)
+    chunks = split_into_chunks(_WordTokenizer(), sentence + ".\n\nngắn.", 10)
+
+    assert all(n_tokens <= 10 for _, n_tokens in chunks)
+    assert [n_tokens for _, n_tokens in chunks] == [10, 10, 6]
+    # Không mất hay lặp token
+    assert " ".join(text.replace("\n", " ") for text, _ in chunks) == sentence + ". ngắn."
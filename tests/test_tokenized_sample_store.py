@@ -0,0 +1,81 @@
+import gc
+import os
+import threading
+from types import SimpleNamespace
+
+from app.service.tokenized_sample_store import TokenizedSampleStore
+
+
+class _FakeTokenizer:
+    """Mỗi từ là một token (id theo độ dài từ), thêm eos = 1."""
+
+    pad_token_id = 0
+    special_tokens_map = {"pad_token": "<pad>", "eos_token": "</s>"}
+
+    def get_vocab(self):
+        return {"<pad>": 0, "</s>": 1}
+
+    def __call__(self, texts=None, text_target=None, max_length=None, truncation=False):
+        texts = texts if texts is not None else text_target
+        ids = [[len(word) + 2 for word in text.split()][:max_length - 1] + [1] for text in texts]
+        return {"input_ids": ids}
+
+
+def _sample(sample_id, text):
+    return SimpleNamespace(id=sample_id, input_text=text, title=f"t {sample_id}", target_summary=f"s {text}")
+
+
+def _store(tmp_path):
+    return TokenizedSampleStore(_FakeTokenizer(), base_dir=str(tmp_path), num_proc=1, chunk_size=4)
+
+
+def _token_files(store):
+    return sorted(name for name in os.listdir(store.path) if name.endswith(".bin"))
+
+
+def test_build_reuses_tokens_written_by_another_store(tmp_path):
+    samples = [_sample(str(i), "a bb ccc") for i in range(5)]
+    _, first = _store(tmp_path).build(samples)
+    _, second = _store(tmp_path).build(samples)
+    assert first["misses"] == 5
+    assert second["misses"] == 0 and second["hits"] == 5
+
+
+def test_concurrent_builds_keep_offsets_consistent(tmp_path):
+    errors = []
+
+    def run(offset):
+        try:
+            _store(tmp_path).build([_sample(str(offset + i), "w " * (i % 7 + 1)) for i in range(40)])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(offset,)) for offset in (0, 1000, 2000)]
+    [thread.start() for thread in threads]
+    [thread.join() for thread in threads]
+    assert errors == []
+
+    samples = [_sample(str(offset + i), "w " * (i % 7 + 1)) for offset in (0, 1000, 2000) for i in range(40)]
+    dataset, stats = _store(tmp_path).build(samples, pad_to_max_length=False)
+    assert stats["misses"] == 0
+    for i, sample in enumerate(samples):
+        expected = _FakeTokenizer()([f"summarize: {sample.input_text}"], max_length=512)["input_ids"][0]
+        assert dataset[2 * i + 1]["input_ids"] == expected
+
+
+def test_compaction_keeps_old_generation_while_it_is_read(tmp_path):
+    store = _store(tmp_path)
+    reader, _ = store.build([_sample("1", "a b c")])
+    before = reader[0]
+
+    # Sửa sample nhiều lần để phần token thừa vượt phần còn dùng
+    _store(tmp_path).build([_sample("1", "x y z w")])
+    _store(tmp_path).build([_sample("1", "x y z w v")])
+    assert len(_token_files(store)) == 2
+    assert reader[0] == before
+
+    # Lock đọc nằm trên mmap nên được nhả khi dataset bị thu hồi
+    del reader
+    gc.collect()
+    _store(tmp_path).build([_sample("1", "x y z w v")])
+    assert len(_token_files(store)) == 1
@@ -0,0 +1,57 @@
+import numpy as np
+
+from app.service.training_batching import TokenBudgetBatchSampler, padding_report
+
+
+def _lengths(count=300, seed=3):
+    rng = np.random.default_rng(seed)
+    return rng.integers(5, 500, count).tolist(), rng.integers(2, 120, count).tolist()
+
+
+def _padded_tokens(batch, input_lengths, label_lengths):
+    return len(batch) * (max(input_lengths[i] for i in batch) + max(label_lengths[i] for i in batch))
+
+
+def test_no_batch_exceeds_the_token_budget():
+    input_lengths, label_lengths = _lengths()
+    sampler = TokenBudgetBatchSampler(input_lengths, label_lengths, max_tokens=2048)
+
+    for batch in sampler:
+        assert _padded_tokens(batch, input_lengths, label_lengths) <= 2048
+
+
+def test_every_index_appears_exactly_once_per_epoch():
+    input_lengths, label_lengths = _lengths()
+    sampler = TokenBudgetBatchSampler(input_lengths, label_lengths, max_tokens=2048, max_batch_size=16)
+
+    for _ in range(3):
+        batches = list(sampler)
+        assert sorted(i for batch in batches for i in batch) == list(range(len(input_lengths)))
+        # Trainer tính số step từ len nên số batch không đổi giữa các epoch
+        assert len(batches) == len(sampler)
+        assert max(len(batch) for batch in batches) <= 16
+
+
+def test_sample_longer_than_the_budget_gets_its_own_batch():
+    sampler = TokenBudgetBatchSampler([10, 900, 12], [5, 200, 5], max_tokens=256)
+    assert sorted(sampler.batches()) == [[0, 2], [1]]
+
+
+def test_epochs_shuffle_batches_but_resume_is_deterministic():
+    input_lengths, label_lengths = _lengths()
+    sampler = TokenBudgetBatchSampler(input_lengths, label_lengths, max_tokens=2048, seed=7)
+    first, second = list(sampler), list(sampler)
+    assert first != second
+
+    resumed = TokenBudgetBatchSampler(input_lengths, label_lengths, max_tokens=2048, seed=7)
+    resumed.set_epoch(1)
+    assert list(resumed) == second
+
+
+def test_padding_report_counts_dynamic_padding_per_batch():
+    report = padding_report([3, 5, 10], [1, 2, 4], [[0, 1], [2]], fixed_input_length=16, fixed_label_length=8)
+
+    assert report["real_tokens"] == 25
+    assert report["fixed_padded_tokens"] == 72
+    assert report["dynamic_padded_tokens"] == 2 * (5 + 2) + (10 + 4)
+    assert report["avg_batch_size"] == 1.5
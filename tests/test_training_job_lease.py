@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.database import TrainingJob
+from app.repositories.training_job_repository import (
+    TrainingJobRepository,
+    JOB_COMPLETED,
+    JOB_QUEUED,
+    JOB_RUNNING,
+)
+
+
+@pytest.fixture
+def repository():
+    engine = create_engine("sqlite://")
+    TrainingJob.__table__.create(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield TrainingJobRepository(session)
+    session.close()
+
+
+def _running(repository, worker_host="host-a"):
+    job = repository.create("{}")
+    assert repository.claim(job.id, worker_host=worker_host)
+    return job.id
+
+
+def test_claim_takes_the_lease(repository):
+    job_id = _running(repository)
+    job = repository.get(job_id)
+    assert job.status == JOB_RUNNING
+    assert job.worker_host == "host-a" and job.heartbeat_at is not None
+    assert not repository.claim(job_id)
+
+
+def test_only_jobs_with_expired_lease_are_requeued(repository):
+    fresh = _running(repository, "host-a")
+    stale = _running(repository, "host-b")
+    repository.update(stale, heartbeat_at=datetime.now(timezone.utc) - timedelta(minutes=10))
+
+    requeued = repository.requeue_expired(datetime.now(timezone.utc) - timedelta(minutes=2))
+
+    assert requeued == [stale]
+    assert repository.get(fresh).status == JOB_RUNNING
+    job = repository.get(stale)
+    assert job.status == JOB_QUEUED and job.worker_host is None and job.heartbeat_at is None
+
+
+def test_heartbeat_renews_lease_only_while_running(repository):
+    job_id = _running(repository)
+    repository.update(job_id, heartbeat_at=datetime.now(timezone.utc) - timedelta(minutes=10))
+    assert repository.heartbeat(job_id)
+    assert repository.requeue_expired(datetime.now(timezone.utc) - timedelta(minutes=2)) == []
+
+    repository.update(job_id, status=JOB_COMPLETED)
+    assert not repository.heartbeat(job_id)